@@ -20,6 +20,21 @@ from boto3.dynamodb.conditions import Key
 import json
 
 
+# In[ ]:
+
+
+# import the shared trips helpers, which live in the python folder
+import sys
+sys.path.append('../python')
+
+from trips.batch import get_trips
+from trips.cache import TripCache
+from trips.deserialize import TripDeserializer
+from trips.hotkeys import HotKeyRouter, HotKeyTracker
+from trips.projection import SUMMARY_FIELDS
+from trips.session import get_client, get_resource
+
+
 # # 2) Create DynamoDB client object
 # The Python SDK supports two clients:
 # - The low level DynamoDB **service client**
@@ -30,11 +45,14 @@ import json
 # ### Create a DynamoDB resource client
 # The **resource client** will support **more intuitive** requests, with **simpler manipulation of** the **JSON** structures.
 
+# ### Use the shared client factory
+# Creating a client resolves credentials and endpoints, and every new client opens new connections to DynamoDB. The ***get_resource*** and ***get_client*** helpers create the clients **once per process** (the resource client once per thread, as it is not thread safe), with a larger **connection pool**, **keep-alive** and explicit **timeouts**, so later calls reuse warm connections.
+
 # In[ ]:
 
 
 # Creating the DynamoDB resource Client
-ddb = boto3.resource('dynamodb')
+ddb = get_resource()
 
 
 # # 3) Use DynamoDB resource client to get an item
@@ -125,7 +143,7 @@ print(f"End date: {item['end_date']}")
 
 
 # Creating the DynamoDB service Client
-ddb = boto3.client('dynamodb')
+ddb = get_client()
 
 
 # ## Retrieve specifc trip with a *get*
@@ -194,6 +212,149 @@ print(f"Start date: {db_resp['Item']['start_date']['S']}")
 print(f"End date: {db_resp['Item']['end_date']['S']}")
 
 
+# #### Convert the whole item to plain Python
+# Rather than drilling down each value by hand, the ***TripDeserializer*** helper converts a complete service client item (or a whole page of items, with ***deserialize_items***) to the same plain Python structure the resource client returns. It knows the shape of a trip in advance, which makes it several times faster than boto3's generic ***TypeDeserializer***. With ***native=True***, numbers come back as ***int*** and ***float*** instead of ***Decimal***.
+
+# In[ ]:
+
+
+# convert the item from DynamoDB JSON to plain Python
+item = TripDeserializer().deserialize_item(db_resp['Item'])
+
+# print a summary of the trip item
+print(f"Locations: {item['locations']}")
+print(f"Start date: {item['start_date']}")
+print(f"End date: {item['end_date']}")
+
+
+# # 4) Get many trips at once with batch get
+# Fetching trips one ***get_item*** at a time costs **one round trip per trip**. A ***batch_get_item*** call fetches **up to 100 items** by primary key at once.
+# 
+# The ***get_trips*** helper takes a list of *(user_id, trip_id)* pairs, drops duplicates, splits them into batches of 100 sent in parallel, and retries any ***UnprocessedKeys*** DynamoDB returns when the table is busy. Results come back in the same order as the keys, with ***None*** for trips that don't exist.
+
+# ### Specify data to be retrieved
+
+# In[ ]:
+
+
+# set the primary keys of the trips to retrieve
+keys = [
+    ("tucker", "2025/07/10_Iceland"),
+    ("lexi", "2026/10/17_Vermont"),
+    ("moose", "2026/03/17_Portugal"),
+]
+
+
+# ### Perform the batch get operation
+# The helper uses the service client we created above, which is safe to share between threads.
+
+# In[ ]:
+
+
+try:
+    # get all the trips, in as few round trips as possible, with only the
+    # attributes we print (see query-trips for more on projections)
+    trips = get_trips(ddb, keys, fields=SUMMARY_FIELDS)
+
+# catch exceptions
+except Exception as e:
+    print("Error on batch get: ")
+    print(e)
+
+
+# #### Extract just the data we want
+
+# In[ ]:
+
+
+# print a summary for each trip, in the order we asked for them
+for (user_id, trip_id), item in zip(keys, trips):
+    if item is None:
+        print(f"{user_id} - {trip_id}: not found")
+    else:
+        print(f"{user_id} - {item['locations']}: {item['start_date']} to {item['end_date']}")
+
+
+# # 5) Cache trips in memory
+# Trips are **read far more often than they change**. A ***TripCache*** keeps recently read trips in memory, so repeated reads of the same trip don't go back to DynamoDB:
+# - It holds at most ***max_size*** trips, dropping the **least recently used** one when full
+# - Each trip is forgotten ***ttl*** seconds after it was cached
+# - It counts **hits** (served from memory) and **misses** (read from the table)
+# 
+# Writes made with the ***put_trip*** and ***update_trip*** helpers refresh the cache when it is passed to them as a listener (see *put-trip* and *update-trip*).
+
+# In[ ]:
+
+
+# create a cache for up to 1024 trips, each kept for 5 minutes
+trip_cache = TripCache(max_size=1024, ttl=300)
+
+
+# ### Read the same trip a few times through the cache
+# The cache needs the resource client's table object, which returns plain Python items.
+
+# In[ ]:
+
+
+# set variables for the primary key
+user_id = "tucker"
+trip_id = "2025/07/10_Iceland"
+
+try:
+    # the first read goes to DynamoDB, the others are served from memory
+    for _ in range(3):
+        item = trip_cache.get_trip(trips_table, user_id, trip_id)
+
+# catch exceptions
+except Exception as e:
+    print("Error on get: ")
+    print(e)
+
+print(f"Locations: {item['locations']}")
+print(f"Cache stats: {trip_cache.stats()}")
+
+
+# # 6) Find hot partitions
+# The table is partitioned on ***user_id***, and each partition can only serve so many reads and writes per second. A few **very active users** (like *tucker*) can get their partition **throttled** while the rest of the table sits idle.
+# 
+# A ***HotKeyTracker*** counts the ***user_id*** of every get, query and update, in **constant memory**:
+# - A **count-min sketch** estimates how often any user was seen
+# - A **top-K** list remembers the most frequent users
+# - ***rate(user_id)*** is the estimated requests per second over the last ***window*** seconds, and users above ***hot_rate*** are **hot**
+# 
+# A ***HotKeyRouter*** records every read and serves the reads of **hot users from the cache**, and everyone else's straight from the table. Pass the router as a write listener to keep the tracker and the caches up to date.
+
+# In[ ]:
+
+
+# track rates over a 10 second window; a low hot rate so this small demo has a hot user
+tracker = HotKeyTracker(window=10, hot_rate=1)
+router = HotKeyRouter(tracker, trip_cache=TripCache(max_size=1024, ttl=300))
+
+
+# ### Read with skewed traffic
+# *tucker* reads the same trip over and over, the other users only once.
+
+# In[ ]:
+
+
+try:
+    for _ in range(20):
+        router.get_trip(trips_table, "tucker", "2025/07/10_Iceland")
+    router.get_trip(trips_table, "lexi", "2026/10/17_Vermont")
+    router.get_trip(trips_table, "moose", "2026/03/17_Portugal")
+
+# catch exceptions
+except Exception as e:
+    print("Error on get: ")
+    print(e)
+
+for user_id, rate in tracker.hot_keys():
+    print(f"Hot: {user_id} at {rate:.1f} requests/s")
+print(f"lexi: {tracker.rate('lexi'):.1f} requests/s, hot: {tracker.is_hot('lexi')}")
+print(f"Cache stats: {router.trip_cache.stats()}")
+
+
 # In[ ]:
 
 
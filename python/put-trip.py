@@ -20,6 +20,21 @@ from boto3.dynamodb.conditions import Key
 import json
 
 
+# In[ ]:
+
+
+# import the shared trips helpers, which live in the python folder
+import sys
+sys.path.append('../python')
+
+from trips.batch import batch_put_trips
+from trips.cache import TripCache, UserTripsCache
+from trips.limiter import set_budget
+from trips.location_index import LocationIndex
+from trips.session import get_client, get_resource
+from trips.writes import put_trip, write_stamp
+
+
 # # 2) Create DynamoDB client object
 # The Python SDK supports two clients:
 # - The low level DynamoDB **service client**
@@ -27,11 +42,14 @@ import json
 # 
 # **For this example we'll see both clients**.
 
+# ### Use the shared client factory
+# Creating a client resolves credentials and endpoints, and every new client opens new connections to DynamoDB. The ***get_resource*** and ***get_client*** helpers create the clients **once per process** (the resource client once per thread, as it is not thread safe), with a larger **connection pool**, **keep-alive** and explicit **timeouts**, so later calls reuse warm connections.
+
 # In[ ]:
 
 
-# Creating the DynamoDB Client
-ddb = boto3.resource('dynamodb')
+# Creating the DynamoDB resource Client
+ddb = get_resource()
 
 
 # # 3) Use DynamoDB resource client to put an item
@@ -53,6 +71,32 @@ except Exception as e:
     print("Error obtaining resource: ", e)
 
 
+# ### Get the location index table
+# Alongside the trips table, we keep a ***location index*** table with one item per location of each trip. It lets us find every trip to a location with a query instead of a full table scan (see *query-trips-by-location*). Writing the trip through the ***put_trip*** helper, with the index as a **listener**, keeps the index in sync with the trips table.
+
+# In[ ]:
+
+
+try:
+    # get a reference to the location index table, and wrap it in the index helper
+    location_index = LocationIndex(ddb.Table('travel_planner_trip_locations'))
+# catch exceptions
+except Exception as e:
+    print("Error obtaining resource: ", e)
+
+
+# ### Create the trip caches
+# Readers can keep recently read trips in an in-memory ***TripCache*** (see *get-trip*), and recently queried trip lists of each user in a ***UserTripsCache*** (see *query-trips*). Passing the caches as listeners to ***put_trip*** refreshes the cached trip, and drops the cached trip list of its user, whenever this process writes a trip, so reads stay correct. In an application, the reads and writes would share the same cache objects.
+
+# In[ ]:
+
+
+# cache of recently read trips
+trip_cache = TripCache(max_size=1024, ttl=300)
+# cache of recently queried trip lists, per user
+user_trips_cache = UserTripsCache(max_items=10000, ttl=60)
+
+
 # ## Add a new trip for user with a put operation
 # A ***put*** operation inserts or fully replaces an item on a table. At a minimum, the put operation **must include** the **partition key, and** a **sort key** (unless a sort key is not used in the table).
 # 
@@ -85,9 +129,11 @@ trip_data = {
 
 # Insert the data into the table
 try:
-    # insert the trip
-    db_resp = trips_table.put_item(
-        Item = trip_data
+    # insert the trip, and update its location index entries
+    db_resp = put_trip(
+        trips_table,
+        trip_data,
+        listeners=[location_index, trip_cache, user_trips_cache]
     )
 
 except ClientError as e:
@@ -116,7 +162,7 @@ print("Full response:\n",
 
 
 # Creating the DynamoDB service Client
-ddb = boto3.client('dynamodb')
+ddb = get_client()
 
 
 # ## Add a new trip for user with a put operation
@@ -164,16 +210,21 @@ trip_data = {
 
 
 # ### Perform put_item operation
+# The ***put_trip*** helper stamps every trip it writes with ***updated_at*** and ***updated_day***, so copies of the table can find recent changes (see *scan-trips*). Calling the service client directly, we add the stamps ourselves.
 
 # In[ ]:
 
 
+# stamp the trip with the time of this write, as DynamoDB JSON
+trip_data.update({name: {"S": value} for name, value in write_stamp().items()})
+
 # Insert the data into the table
 try:
     # insert the trip using the service client
     db_resp = ddb.put_item(
         TableName='travel_planner_trips',
-        Item = trip_data
+        Item = trip_data,
+        ReturnValues='ALL_OLD'
     )  
 
 except ClientError as e:
@@ -181,6 +232,24 @@ except ClientError as e:
     print(e)
 
 
+# ### Keep the location index in sync
+# The service client works with DynamoDB JSON, so we convert the old item (returned because of ***ReturnValues='ALL_OLD'***) and the new item to plain Python before handing them to the location index.
+
+# In[ ]:
+
+
+from trips.deserialize import TripDeserializer
+
+deserializer = TripDeserializer()
+
+# the old item is only returned if the put replaced an existing trip
+old_trip = db_resp.get('Attributes')
+if old_trip:
+    old_trip = deserializer.deserialize_item(old_trip)
+
+location_index.trip_changed(old_trip, deserializer.deserialize_item(trip_data))
+
+
 # ### Get data from response object
 # Response objects are in JSON format, which in Python will be in a dictionary. We just need to check the format, and extract the data we want from it.
 
@@ -193,6 +262,69 @@ print("Full response:\n",
       json.dumps(db_resp, indent=4))
 
 
+# # 4) Insert many trips with batch writes
+# Each ***put_item*** call inserts **one item per round trip**, so loading thousands of trips one by one is slow. A ***batch_write_item*** call takes **up to 25** put requests at once, and several batches can be sent **at the same time**.
+# 
+# When the table is busy, DynamoDB may write only part of a batch and return the rest as ***UnprocessedItems***. The ***batch_put_trips*** helper sends those again, waiting a little longer after each try, and reports the throughput of every batch.
+
+# ### Define trip data to be inserted
+# The batch helper takes plain Python items, the same format as the resource client.
+
+# In[ ]:
+
+
+trips_data = [
+    {
+        "user_id": "lexi",
+        "trip_id": f"2027/{month:02d}/01_Vermont",
+        "start_date": f"2027/{month:02d}/01",
+        "start_time": "5:30pm",
+        "end_date": f"2027/{month:02d}/03",
+        "end_time": "11:00am",
+        "locations": ["Vermont"],
+    }
+    for month in range(1, 13)
+]
+
+
+# ### Set a capacity budget for the load
+# A large batch load can use up the table's **write capacity**, and get the application's own writes throttled with it. A ***capacity limiter*** keeps the load within a budget of **WCUs per second**, shared by all the batches in flight, and slows it down further when DynamoDB leaves items unprocessed.
+
+# In[ ]:
+
+
+# let bulk loads use up to 25 WCUs per second
+load_limiter = set_budget('bulk-load', 25)
+
+
+# ### Perform the batch write operation
+# The helper works with the service client, which is safe to share between threads. The resource client already holds one, as ***trips_table.meta.client***. Passing the location index table name writes the index entries in the same batches.
+
+# In[ ]:
+
+
+try:
+    # insert the trips, four batches at a time
+    batches = batch_put_trips(
+        trips_table.meta.client,
+        trips_data,
+        max_workers=4,
+        index_table_name='travel_planner_trip_locations',
+        limiter=load_limiter
+    )
+
+    # print the throughput of each batch
+    for batch in batches:
+        print(f"{batch.requests} requests in {batch.seconds:.3f}s "
+              f"({batch.requests_per_second:.0f}/s, {batch.attempts} attempts)")
+
+    print("Load budget:", load_limiter.stats())
+
+except Exception as e:
+    print("Error on batch write: ")
+    print(e)
+
+
 # In[ ]:
 
 
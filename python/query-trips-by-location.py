@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# # <span style="color:blue">DynamoDB query on a location index
+# Finding **all trips to a location** with a ***scan*** reads **every item in the table**, and pays RCUs for all of them. Instead, we keep a separate ***location index*** table with **one item per location of each trip**, and **query** it by location. The cost of the query grows with the **number of matching trips**, not with the size of the table.
+
+# # 1) Import AWS Python SDK (Boto) Package
+
+# In[ ]:
+
+
+import boto3
+from boto3.dynamodb.conditions import Key
+
+
+# In[ ]:
+
+
+# import standard library to print nice JSON
+import json
+
+
+# In[ ]:
+
+
+# import the shared trips helpers, which live in the python folder
+import sys
+sys.path.append('../python')
+
+from trips.instrument import Instrumentation
+from trips.location_index import LocationIndex
+from trips.scan import scan_items
+from trips.session import get_resource
+
+
+# # 2) Create DynamoDB client object
+# The Python SDK supports two clients:
+# - The low level DynamoDB **service client**
+# - The higher level DynamoDB **resource client**
+# 
+# **For this example I'll be using the resource client**, which makes for simpler looking calls.
+
+# ### Use the shared client factory
+# Creating a client resolves credentials and endpoints, and every new client opens new connections to DynamoDB. The ***get_resource*** and ***get_client*** helpers create the clients **once per process** (the resource client once per thread, as it is not thread safe), with a larger **connection pool**, **keep-alive** and explicit **timeouts**, so later calls reuse warm connections.
+
+# In[ ]:
+
+
+# Creating the DynamoDB resource Client
+ddb = get_resource()
+
+
+# # 3) Use DynamoDB client to query the location index
+
+# ### Get table resource
+# The resource client follows an object-oriented style. So here I use the resource client to get an object that maps to the table specified. I will subsequently make calls on that object.
+
+# In[ ]:
+
+
+try:
+    # get a reference to the trips table
+    trips_table = ddb.Table('travel_planner_trips')
+    # get a reference to the location index table, and wrap it in the index helper
+    location_index = LocationIndex(ddb.Table('travel_planner_trip_locations'))
+# catch exceptions
+except Exception as e:
+    print("Error obtaining resource: ", e)
+
+
+# ## The location index table
+# For the *travel_planner_trip_locations* table, the partition key and sort key are:
+# - **Partition key:** *location*
+# - **Sort key:** *trip_ref*, the trip's *user_id* and *trip_id* joined with a "#"
+# 
+# Each index item also holds a copy of the trip's *user_id*, *trip_id*, *start_date*, *end_date* and *locations*, so a location lookup can be answered from the index alone.
+# 
+# The put and update examples (*put-trip* and *update-trip*) write trips through the ***put_trip*** and ***update_trip*** helpers, which keep the index in sync on every write.
+
+# ### Backfill the index for existing trips
+# Trips written before the index existed need their entries created once. This is the **only** time we need to scan the trips table.
+
+# In[ ]:
+
+
+try:
+    # read every trip and write its index entries
+    location_index.backfill(scan_items(trips_table))
+
+# catch exceptions
+except Exception as e:
+    print("Error on backfill: ")
+    print(e)
+
+
+# ## Retrieve trips for a location with *query*
+# A ***query*** on the index table uses the location as the partition key. The helper follows ***LastEvaluatedKey*** so that every matching trip is returned.
+
+# ### Specify data to be retrieved
+
+# In[ ]:
+
+
+# set variables for the filtering criteria
+location = "Iceland"
+
+
+# ### Perform query operation
+
+# In[ ]:
+
+
+try:        
+    # Perform the query against the location index
+    trips = list(location_index.query(location))
+
+# catch exceptions
+except Exception as e:
+    print("Error on query: ")
+    print(e)
+
+
+# #### Extract just the data we want
+
+# In[ ]:
+
+
+# iterate through each trip, and print a summary for each
+for item in trips:
+    user_id = item['user_id']
+    start_date = item['start_date']
+    end_date = item['end_date']
+    locations = item['locations']
+
+    print(f'User {user_id} - from: {start_date} to {end_date} - {locations}')
+
+
+# ## Compare the cost of the scan and the index query
+# Every DynamoDB call can report the **capacity units** it consumed, when asked with ***ReturnConsumedCapacity***. The ***Instrumentation*** helper hooks into the client to ask for it on every call, and keeps per operation totals of **capacity units**, **latency**, **items returned and scanned**, **retries** and **response bytes**.
+# 
+# The index table is accessed through the same resource client as the trips table, so attaching to one instruments both.
+
+# In[ ]:
+
+
+# instrument every call made through the resource client
+instrumentation = Instrumentation()
+instrumentation.attach(trips_table.meta.client)
+
+
+# ### Run the same lookup both ways
+
+# In[ ]:
+
+
+try:
+    # the location lookup with a full table scan, as in scan-trips
+    scanned_trips = list(scan_items(
+        trips_table,
+        FilterExpression="contains(locations, :location)",
+        ExpressionAttributeValues={
+            ':location': location
+        }
+    ))
+    scan_stats = instrumentation.snapshot()
+
+    # the same lookup with a query on the location index
+    instrumentation.reset()
+    indexed_trips = list(location_index.query(location))
+    query_stats = instrumentation.snapshot()
+
+# catch exceptions
+except Exception as e:
+    print("Error on lookup: ")
+    print(e)
+
+
+# #### Print the cost of each
+
+# In[ ]:
+
+
+print(f"Scan:  {len(scanned_trips)} trips, {scan_stats['read_capacity_units']} RCUs")
+print(f"Query: {len(indexed_trips)} trips, {query_stats['read_capacity_units']} RCUs")
+
+print("Scan stats:\n", json.dumps(scan_stats['operations'], indent=4))
+
+
+# In[ ]:
+
+
+
+
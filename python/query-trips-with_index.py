@@ -22,6 +22,18 @@ from boto3.dynamodb.conditions import Key
 import json
 
 
+# In[ ]:
+
+
+# import the shared trips helpers, which live in the python folder
+import sys
+sys.path.append('../python')
+
+from trips.merge import query_users_by_date
+from trips.projection import SUMMARY_FIELDS, projection
+from trips.session import get_resource
+
+
 # # 2) Create DynamoDB client object
 # The Python SDK supports two clients:
 # - The low level DynamoDB **service client**
@@ -29,11 +41,14 @@ import json
 # 
 # **For this example I'll be using the resource client**, which makes for simpler looking calls.
 
+# ### Use the shared client factory
+# Creating a client resolves credentials and endpoints, and every new client opens new connections to DynamoDB. The ***get_resource*** and ***get_client*** helpers create the clients **once per process** (the resource client once per thread, as it is not thread safe), with a larger **connection pool**, **keep-alive** and explicit **timeouts**, so later calls reuse warm connections.
+
 # In[ ]:
 
 
-# Creating the DynamoDB Client
-ddb = boto3.resource('dynamodb')
+# Creating the DynamoDB resource Client
+ddb = get_resource()
 
 
 # # 3) Use DynamoDB client to perform query against an index
@@ -72,6 +87,17 @@ from_date = "2025/07/09"
 to_date = "2026/12/31"
 
 
+# ### Only retrieve the attributes we need
+# By default DynamoDB returns **whole items**, including the potentially large *itinerary*, even though we only print a few attributes. A ***ProjectionExpression*** lists the attributes to return, which makes the responses smaller and faster to transfer and parse. The ***projection*** helper builds it for us, with ***ExpressionAttributeNames*** placeholders so that reserved words are never a problem.
+
+# In[ ]:
+
+
+# only retrieve the attributes printed in the summary
+summary_projection = projection(SUMMARY_FIELDS)
+print(summary_projection)
+
+
 # ### Perform query operation
 
 # In[ ]:
@@ -84,7 +110,9 @@ try:
         KeyConditionExpression= (
             Key('user_id').eq(user_id) & 
             Key('start_date').between(from_date, to_date)
-        )
+        ),
+        # only return the attributes we print
+        **summary_projection
     )
 
 # catch exceptions
@@ -119,6 +147,43 @@ for item in db_resp['Items']:
     print(f'From: {start_date} to {end_date} - {locations}')
 
 
+# # 4) Query the same date range for several users
+# A group calendar needs the trips of **several users** in the same date range, in a single list sorted by ***start_date***. The index can only be queried **one user at a time**, but each query already returns that user's trips **sorted by start_date**.
+# 
+# The ***query_users_by_date*** helper queries every user **at the same time**, and merges the sorted results as they come in, only ever comparing the next trip of each user. It reads the next page of a user only when it needs it, so asking for the **first few trips** of the group never reads all their trips.
+
+# ### Specify the group of users
+
+# In[ ]:
+
+
+group = ["tucker", "lexi"]
+
+
+# ### Get the first trips of the group
+
+# In[ ]:
+
+
+try:
+    # the first 10 trips of the group in the date range, by start date
+    group_trips = list(query_users_by_date(
+        group,
+        from_date,
+        to_date,
+        limit=10,
+        fields=SUMMARY_FIELDS
+    ))
+
+    for item in group_trips:
+        print(f"{item['start_date']} - {item['user_id']} - {item['locations']}")
+
+# catch exceptions
+except Exception as e:
+    print("Error on group query: ")
+    print(e)
+
+
 # In[ ]:
 
 
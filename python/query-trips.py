@@ -20,6 +20,19 @@ from boto3.dynamodb.conditions import Key
 import json
 
 
+# In[ ]:
+
+
+# import the shared trips helpers, which live in the python folder
+import sys
+sys.path.append('../python')
+
+from trips.cache import UserTripsCache
+from trips.cursor import CursorCodec, query_page
+from trips.projection import SUMMARY_FIELDS, projection
+from trips.session import get_resource
+
+
 # # 2) Create DynamoDB client object
 # The Python SDK supports two clients:
 # - The low level DynamoDB **service client**
@@ -27,11 +40,14 @@ import json
 # 
 # **For this example I'll be using the resource client**, which makes for simpler looking calls.
 
+# ### Use the shared client factory
+# Creating a client resolves credentials and endpoints, and every new client opens new connections to DynamoDB. The ***get_resource*** and ***get_client*** helpers create the clients **once per process** (the resource client once per thread, as it is not thread safe), with a larger **connection pool**, **keep-alive** and explicit **timeouts**, so later calls reuse warm connections.
+
 # In[ ]:
 
 
-# Creating the DynamoDB Client
-ddb = boto3.resource('dynamodb')
+# Creating the DynamoDB resource Client
+ddb = get_resource()
 
 
 # # 3) Use DynamoDB client to perform a query
@@ -68,6 +84,17 @@ except Exception as e:
 user_id = "tucker"
 
 
+# ### Only retrieve the attributes we need
+# By default DynamoDB returns **whole items**, including the potentially large *itinerary*, even though we only print a few attributes. A ***ProjectionExpression*** lists the attributes to return, which makes the responses smaller and faster to transfer and parse. The ***projection*** helper builds it for us, with ***ExpressionAttributeNames*** placeholders so that reserved words are never a problem.
+
+# In[ ]:
+
+
+# only retrieve the attributes printed in the summary
+summary_projection = projection(SUMMARY_FIELDS)
+print(summary_projection)
+
+
 # ### Perform query operation
 
 # In[ ]:
@@ -78,7 +105,9 @@ try:
     db_resp = trips_table.query(
         KeyConditionExpression= (
             Key('user_id').eq(user_id)
-        )
+        ),
+        # only return the attributes we print
+        **summary_projection
     )
 
 # catch exceptions
@@ -113,6 +142,83 @@ for item in db_resp['Items']:
     print(f'From: {start_date} to {end_date} - {locations}')
 
 
+# # 4) Cache trip lists in memory
+# The same user's trip list is often requested **over and over**, for example on every page load. A ***UserTripsCache*** keeps the result of the query for each user in memory:
+# - It holds at most ***max_items*** trips in total, across all users, dropping the **least recently used** users when full
+# - Each list is forgotten ***ttl*** seconds after it was cached
+# - Users with **no trips** are cached too, for a shorter ***negative_ttl***, so repeated lookups of them don't reach DynamoDB either
+# 
+# Writes made with the ***put_trip*** and ***update_trip*** helpers drop the cached list of the user whose trip changed, when the cache is passed to them as a listener (see *put-trip* and *update-trip*).
+
+# In[ ]:
+
+
+# create a cache for up to 10000 trips, each list kept for 1 minute
+user_trips_cache = UserTripsCache(max_items=10000, ttl=60, negative_ttl=10)
+
+
+# ### Query the same user a few times through the cache
+
+# In[ ]:
+
+
+try:
+    # the first query goes to DynamoDB, the others are served from memory
+    for _ in range(3):
+        trips = user_trips_cache.query_trips(trips_table, user_id)
+
+# catch exceptions
+except Exception as e:
+    print("Error on query: ")
+    print(e)
+
+print(f"{len(trips)} trips for {user_id}")
+print(f"Cache stats: {user_trips_cache.stats()}")
+
+
+# # 5) Page through a user's trips with cursors
+# A single query returns **all** of a user's trips, up to 1 MB per call, so the more trips a user has, the slower it gets. An application showing trips in an **infinite scroll** only needs a page at a time.
+# 
+# The ***query_page*** helper passes ***Limit*** to ask for one page of trips, and returns a **cursor** along with them. The cursor holds the query's ***LastEvaluatedKey***, in a compact, URL safe form, **signed** so that it can't be altered or reused for another query. An API can hand it to the browser, and pass it back as ***ExclusiveStartKey*** on the next request, without keeping any state on the server.
+
+# ### Create the cursor codec
+# The secret signs the cursors, and has to be the same on every server. In an application it would come from a secrets store, not from the code.
+
+# In[ ]:
+
+
+cursor_codec = CursorCodec("replace-with-a-long-random-secret", max_age=3600)
+
+
+# ### Read the trips one page at a time
+
+# In[ ]:
+
+
+try:
+    cursor = None
+    while True:
+        # each request reads at most 2 trips, starting after the cursor
+        page = query_page(
+            trips_table,
+            cursor_codec,
+            page_size=2,
+            cursor=cursor,
+            KeyConditionExpression=Key('user_id').eq(user_id),
+            **summary_projection
+        )
+        print(f"Page of {len(page.items)} trips, next cursor: {page.cursor}")
+
+        cursor = page.cursor
+        if cursor is None:
+            break
+
+# catch exceptions
+except Exception as e:
+    print("Error on paged query: ")
+    print(e)
+
+
 # In[ ]:
 
 
@@ -20,6 +20,21 @@ from boto3.dynamodb.conditions import Key
 import json
 
 
+# In[ ]:
+
+
+# import the shared trips helpers, which live in the python folder
+import sys
+sys.path.append('../python')
+
+from trips.limiter import set_budget
+from trips.projection import SUMMARY_FIELDS, projection
+from trips.records import TripResultSet
+from trips.replica import TripReplica
+from trips.scan import parallel_scan_items, scan_pages
+from trips.session import get_resource
+
+
 # # 2) Create DynamoDB client object
 # The Python SDK supports two clients:
 # - The low level DynamoDB **service client**
@@ -27,11 +42,14 @@ import json
 # 
 # **For this example I'll be using the resource client**, which makes for simpler looking calls.
 
+# ### Use the shared client factory
+# Creating a client resolves credentials and endpoints, and every new client opens new connections to DynamoDB. The ***get_resource*** and ***get_client*** helpers create the clients **once per process** (the resource client once per thread, as it is not thread safe), with a larger **connection pool**, **keep-alive** and explicit **timeouts**, so later calls reuse warm connections.
+
 # In[ ]:
 
 
-# Creating the DynamoDB Client
-ddb = boto3.resource('dynamodb')
+# Creating the DynamoDB resource Client
+ddb = get_resource()
 
 
 # # 3) Use DynamoDB client to perform a scan
@@ -56,6 +74,8 @@ except Exception as e:
 # However, sometimes we must perform scans for special cases. In this example, we will perform a scan for all trips for any users, based on the location (which is not a partition key).
 # 
 # A **scan** will **use** a ***FilterExpression*** parameter in the operation to specify the filtering criteria.
+# 
+# For lookups by location that run often, the *query-trips-by-location* example shows a cheaper alternative: a location index table that is queried instead of scanned.
 
 # ### Specify data to be retrieved
 
@@ -66,51 +86,174 @@ except Exception as e:
 location = "Iceland"
 
 
+# ### Only retrieve the attributes we need
+# By default DynamoDB returns **whole items**, including the potentially large *itinerary*, even though we only print a few attributes. A ***ProjectionExpression*** lists the attributes to return, which makes the responses smaller and faster to transfer and parse. The ***projection*** helper builds it for us, with ***ExpressionAttributeNames*** placeholders so that reserved words are never a problem.
+
+# In[ ]:
+
+
+# only retrieve the attributes printed in the summary
+summary_projection = projection(SUMMARY_FIELDS)
+print(summary_projection)
+
+
 # ### Perform scan operation
+# A single scan call only reads **up to 1 MB** of data. When there is more to read, the response includes a ***LastEvaluatedKey***, and the next call has to pass it back as ***ExclusiveStartKey*** to continue where the previous one stopped. Ignoring it silently drops every match past the first page.
+# 
+# The ***scan_pages*** helper follows ***LastEvaluatedKey*** for us and yields one page at a time. It also requests the next page in the background while we work on the current one, so memory stays flat however large the table gets.
 
 # In[ ]:
 
 
 try:        
-    # Perform the scan
-    db_resp = trips_table.scan(
+    # Perform the scan, one page at a time
+    pages = scan_pages(
+        trips_table,
         FilterExpression="contains(locations, :location)",
         ExpressionAttributeValues={
             ':location': location
-        }
+        },
+        # only return the attributes we print
+        **summary_projection
     )
 
+    # iterate through each page, and print a summary for each matching item
+    for db_resp in pages:
+        print(f"Page: scanned {db_resp['ScannedCount']} items, matched {db_resp['Count']}")
+
+        for item in db_resp['Items']:
+            user_id = item['user_id']
+            start_date = item['start_date']
+            end_date = item['end_date']
+            locations = item['locations']
+
+            print(f'User {user_id} - from: {start_date} to {end_date} - {locations}')
+
 # catch exceptions
 except Exception as e:
-    print("Error on query: ")
+    print("Error on scan: ")
     print(e)
 
 
 # ### Get data from response object
 # Response objects are in JSON format, which in Python will be in a dictionary. We just need to check the format, and extract the data we want from it.
 
-# #### Print the complete response object if we want to visualize it
+# #### Print the last response page if we want to visualize it
+# The last page has no ***LastEvaluatedKey***, which is how we know the scan has reached the end of the table.
 
 # In[ ]:
 
 
-print("Full response:\n",
+print("Last response page:\n",
       json.dumps(db_resp, indent=4))
 
 
+# # 4) Scan the table in parallel segments
+# Even when paginated, a scan reads the table **one page after another**. DynamoDB can split a scan into ***segments***: each call passes a ***Segment*** number and the ***TotalSegments*** count, and each segment covers a separate slice of the table, so all segments can be read **at the same time**.
+# 
+# The ***parallel_scan_items*** helper runs the segments on a pool of threads and merges their items into a single stream. Each segment retries throttled pages on its own. Items arrive in no particular order.
+
+# ### Specify the number of segments
+# More segments mean more concurrent requests, and more RCUs consumed per second. A good starting point is one segment per worker thread.
+
+# In[ ]:
+
+
+total_segments = 4
+
+
+# ### Set a capacity budget for the scan
+# A full scan on many segments can use up the table's **read capacity**, and get the application's own ***get_item*** calls throttled with it. A ***capacity limiter*** keeps the scan within a budget of **RCUs per second**: every page is charged the capacity DynamoDB reports it consumed, the scan waits whenever it gets ahead of the budget, and it slows down further if DynamoDB throttles it anyway.
+# 
+# Budgets are set per **job class**, and every job of the same class shares it.
+
+# In[ ]:
+
+
+# let background scans use up to 50 RCUs per second
+scan_limiter = set_budget('scan', 50)
+
+
+# ### Perform the parallel scan operation
+# A full table scan can return **a lot** of trips. Instead of keeping a dictionary per trip, we collect them into a ***TripResultSet***, which stores **each attribute as its own column** and shares repeated values like user ids, dates and locations. It takes a fraction of the memory, and can still give back each trip as a dictionary when needed, with ***dicts()***.
+
+# In[ ]:
+
+
+try:
+    # Perform the scan on all segments at once, collecting the trips in columns
+    trips = TripResultSet.from_items(parallel_scan_items(
+        'travel_planner_trips',
+        total_segments=total_segments,
+        limiter=scan_limiter,
+        FilterExpression="contains(locations, :location)",
+        ExpressionAttributeValues={
+            ':location': location
+        },
+        # only return the attributes we print
+        **projection(SUMMARY_FIELDS)
+    ))
+
+# catch exceptions
+except Exception as e:
+    print("Error on parallel scan: ")
+    print(e)
+
+
 # #### Extract just the data we want
 
 # In[ ]:
 
 
-# iterate through each item, and print a summary for each
-for item in db_resp['Items']:
-    user_id = item['user_id']
-    start_date = item['start_date']
-    end_date = item['end_date']
-    locations = item['locations']
+# iterate through each trip, and print a summary for each
+for trip in trips:
+    print(f'User {trip.user_id} - from: {trip.start_date} to {trip.end_date} - {list(trip.locations)}')
+
+
+# #### Print the capacity the scan consumed
+
+# In[ ]:
+
+
+print("Scan budget:\n", json.dumps(scan_limiter.stats(), indent=4))
+
+
+# # 5) Keep a local replica for reporting
+# Reporting jobs often run the same scans and queries **over and over** during the day, and each run reads, and pays for, the whole table again. A ***TripReplica*** keeps a copy of the table in a local **SQLite** file, indexed by user, start date and location, so those reads run locally and **consume no capacity** at all.
+# 
+# The replica is filled **once** with a scan. After that, ***sync()*** only copies the trips written since the last sync: the ***put_trip*** and ***update_trip*** helpers stamp every trip they write with ***updated_at*** and ***updated_day***. A global secondary index on those two attributes, ***trips_updatedday_updatedat***, finds them with a few small queries. The table doesn't have it out of the box (the ***trips.replica*** module shows how to create it); without it, ***sync()*** falls back to a scan **filtered** on ***updated_at***, which still reads, and pays for, the whole table. The stats it returns show which one was used, and what it cost.
+# 
+# Deletes, and writes that don't go through the helpers, leave no stamp behind, so run the bulk load again now and then.
+
+# ### Fill the replica
+
+# In[ ]:
+
+
+try:
+    replica = TripReplica('trips-replica.db')
+
+    # copy the whole table once
+    print("Loaded", replica.bulk_load(trips_table), "trips")
+
+    # later on, copy only what changed since then
+    sync_stats = replica.sync(trips_table)
+    print(f"Synced {sync_stats.items} trips, reading {sync_stats.scanned} items "
+          f"for {sync_stats.capacity_units} RCUs with {sync_stats.index_name or 'a scan'}")
+
+except Exception as e:
+    print("Error on replica: ")
+    print(e)
+
+
+# ### Run the location lookup locally
+
+# In[ ]:
+
 
-    print(f'User {user_id} - from: {start_date} to {end_date} - {locations}')
+# the same lookup as the scan, without reading the table
+for item in replica.trips_by_location(location):
+    print(f"User {item['user_id']} - from: {item['start_date']} to {item['end_date']} - {item['locations']}")
 
 
 # In[ ]:
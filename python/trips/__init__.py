@@ -0,0 +1,9 @@
+"""Shared helpers for the travel_planner_trips DynamoDB examples.
+
+The scripts in the python folder import from this package. Submodules import
+boto3 only when they need it, so importing ``trips`` itself stays cheap.
+"""
+
+# table and index used throughout the examples
+TABLE_NAME = 'travel_planner_trips'
+INDEX_NAME = 'trips_userid_startdate'
@@ -0,0 +1,9 @@
+import time
+
+_START = time.perf_counter()
+
+import sys  # noqa: E402
+
+from trips.cli import main  # noqa: E402
+
+sys.exit(main(started=_START))
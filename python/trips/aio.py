@@ -0,0 +1,191 @@
+"""asyncio client for the trips table.
+
+boto3 calls block the calling thread, so an asyncio application that calls
+them directly serves one request at a time. ``AsyncTripsClient`` runs each
+call on a thread pool and awaits the result, so many calls can be in flight
+at once while the event loop keeps serving other work.
+
+It uses the service client, which is safe to share between threads (the
+resource client is not), and converts items to and from plain Python
+itself. A semaphore bounds how many calls run at once; give the service
+client at least as many pooled connections (``max_pool_connections``, see
+``trips.session``), or calls will queue inside botocore instead.
+
+With a ``codec`` (see ``trips.codec``), large attributes are compressed on
+put and update and decompressed on every read.
+
+Every call takes an optional ``timeout`` in seconds. A call that times out
+or is cancelled stops being awaited right away, but the underlying HTTP
+request still runs to completion on its thread, and its result is dropped.
+
+For example, to fetch the trips of 500 users with at most 50 queries in
+flight::
+
+    configure(max_pool_connections=50)
+    async with AsyncTripsClient(get_client(), max_concurrency=50) as trips:
+        trips_by_user = await trips.query_many(user_ids, timeout=5)
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from trips import INDEX_NAME, TABLE_NAME
+from trips.deserialize import TripDeserializer
+from trips.projection import with_projection
+from trips.writes import update_expression, write_stamp
+
+
+class AsyncTripsClient:
+    """Non-blocking get, query, scan, put and update on the trips table."""
+
+    def __init__(self, client, table_name=TABLE_NAME, index_name=INDEX_NAME,
+                 max_concurrency=32, timeout=None, codec=None):
+        from boto3.dynamodb.types import TypeSerializer
+
+        self.client = client
+        self.table_name = table_name
+        self.index_name = index_name
+        self.timeout = timeout
+        self.codec = codec
+        self._serializer = TypeSerializer()
+        self._deserializer = TripDeserializer(codec=codec)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency)
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Release the thread pool, without waiting for calls in flight."""
+        self._executor.shutdown(wait=False)
+
+    async def _call(self, operation, timeout=None, **params):
+        # run one service client operation on the thread pool
+        call = partial(getattr(self.client, operation),
+                       TableName=self.table_name, **params)
+        async with self._semaphore:
+            future = asyncio.get_running_loop().run_in_executor(self._executor, call)
+            return await asyncio.wait_for(future, timeout or self.timeout)
+
+    def _serialize(self, values):
+        return {name: self._serializer.serialize(value)
+                for name, value in values.items()}
+
+    def _encode(self, values):
+        return self.codec.encode_item(values) if self.codec else values
+
+    async def _query_all(self, timeout, **params):
+        # follow LastEvaluatedKey until the whole result has been read
+        items = []
+        while True:
+            db_resp = await self._call('query', timeout, **params)
+            items.extend(self._deserializer.deserialize_items(db_resp['Items']))
+            last_key = db_resp.get('LastEvaluatedKey')
+            if not last_key:
+                return items
+            params['ExclusiveStartKey'] = last_key
+
+    async def get_trip(self, user_id, trip_id, fields=None, timeout=None):
+        """Return one trip by primary key, or None if it does not exist."""
+        db_resp = await self._call('get_item', timeout, **with_projection(
+            fields, Key=self._serialize({'user_id': user_id, 'trip_id': trip_id})
+        ))
+        item = db_resp.get('Item')
+        return self._deserializer.deserialize_item(item) if item else None
+
+    async def query_trips(self, user_id, fields=None, timeout=None):
+        """Return all trips of a user."""
+        names = {'#pk': 'user_id'}
+        return await self._query_all(timeout, **with_projection(
+            fields,
+            KeyConditionExpression='#pk = :pk',
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=self._serialize({':pk': user_id}),
+        ))
+
+    async def query_trips_by_date(self, user_id, from_date, to_date,
+                                  fields=None, timeout=None):
+        """Return the trips of a user starting between two dates, on the index."""
+        names = {'#pk': 'user_id', '#sk': 'start_date'}
+        values = {':pk': user_id, ':from': from_date, ':to': to_date}
+        return await self._query_all(timeout, **with_projection(
+            fields,
+            IndexName=self.index_name,
+            KeyConditionExpression='#pk = :pk AND #sk BETWEEN :from AND :to',
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=self._serialize(values),
+        ))
+
+    async def scan(self, filter_expression=None, values=None, fields=None,
+                   timeout=None):
+        """Yield scanned items page by page, as an async generator.
+
+        ``filter_expression`` and ``values`` are a FilterExpression string
+        and its ``:placeholder`` values in plain Python.
+        """
+        params = with_projection(fields)
+        if filter_expression:
+            params['FilterExpression'] = filter_expression
+        if values:
+            params['ExpressionAttributeValues'] = self._serialize(values)
+        while True:
+            db_resp = await self._call('scan', timeout, **params)
+            for item in self._deserializer.deserialize_items(db_resp['Items']):
+                yield item
+            last_key = db_resp.get('LastEvaluatedKey')
+            if not last_key:
+                return
+            params['ExclusiveStartKey'] = last_key
+
+    async def put_trip(self, trip, listeners=(), timeout=None):
+        """Insert or replace a trip, notifying write listeners like ``put_trip``."""
+        trip = dict(trip, **write_stamp())
+        db_resp = await self._call('put_item', timeout,
+                                   Item=self._serialize(self._encode(trip)),
+                                   ReturnValues='ALL_OLD')
+        old_trip = db_resp.get('Attributes')
+        if old_trip:
+            old_trip = self._deserializer.deserialize_item(old_trip)
+        for listener in listeners:
+            listener.trip_changed(old_trip, trip)
+        return db_resp
+
+    async def update_trip(self, user_id, trip_id, updates, listeners=(),
+                          timeout=None):
+        """Set attributes on a trip, notifying write listeners like ``update_trip``."""
+        key = {'user_id': user_id, 'trip_id': trip_id}
+        updates = dict(updates, **write_stamp())
+        params = update_expression(self._encode(updates))
+        params['ExpressionAttributeValues'] = self._serialize(
+            params['ExpressionAttributeValues'])
+        db_resp = await self._call('update_item', timeout, Key=self._serialize(key),
+                                   ReturnValues='ALL_OLD', **params)
+        old_trip = db_resp.get('Attributes')
+        if old_trip:
+            old_trip = self._deserializer.deserialize_item(old_trip)
+        new_trip = dict(old_trip or key, **updates)
+        for listener in listeners:
+            listener.trip_changed(old_trip, new_trip)
+        return db_resp
+
+    async def query_many(self, user_ids, fields=None, timeout=None):
+        """Query the trips of many users at once.
+
+        Returns a dict of user_id to trip list. The number of queries in
+        flight is bounded by ``max_concurrency``. If any query fails, the
+        others are cancelled and the error is raised.
+        """
+        user_ids = list(dict.fromkeys(user_ids))
+        tasks = [asyncio.ensure_future(self.query_trips(user_id, fields, timeout))
+                 for user_id in user_ids]
+        try:
+            results = await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+        return dict(zip(user_ids, results))
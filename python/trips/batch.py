@@ -0,0 +1,247 @@
+"""Batch reads and writes for working with many trips at once.
+
+``put_item`` writes one item per round trip. ``BatchWriteItem`` takes up to 25
+put or delete requests per call, and several batches can be in flight at the
+same time on a thread pool. DynamoDB may leave part of a batch unwritten
+(``UnprocessedItems``) when the table is throttling; those requests are sent
+again with jittered exponential backoff.
+
+``get_trips`` does the same for reads: ``BatchGetItem`` fetches up to 100
+items per call, and ``UnprocessedKeys`` are retried the same way.
+"""
+
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from trips import TABLE_NAME
+from trips.deserialize import TripDeserializer
+from trips.location_index import index_entries
+from trips.projection import with_projection
+from trips.retry import is_retryable, sleep_backoff
+from trips.writes import write_stamp
+
+# most requests DynamoDB accepts in one BatchWriteItem call
+BATCH_WRITE_SIZE = 25
+
+# most keys DynamoDB accepts in one BatchGetItem call
+BATCH_GET_SIZE = 100
+
+
+class UnprocessedItemsError(Exception):
+    """Raised when a batch still has unprocessed requests after every retry."""
+
+    def __init__(self, unprocessed):
+        count = sum(len(requests) for requests in unprocessed.values())
+        super().__init__(f'{count} write requests still unprocessed')
+        self.unprocessed = unprocessed
+
+
+class UnprocessedKeysError(Exception):
+    """Raised when a batch still has unprocessed keys after every retry."""
+
+    def __init__(self, unprocessed):
+        count = sum(len(request['Keys']) for request in unprocessed.values())
+        super().__init__(f'{count} keys still unprocessed')
+        self.unprocessed = unprocessed
+
+
+class BatchStats(namedtuple('BatchStats', 'requests attempts seconds')):
+    """Outcome of one BatchWriteItem batch."""
+
+    @property
+    def requests_per_second(self):
+        return self.requests / self.seconds if self.seconds else float('inf')
+
+
+def _write_requests(items, table_name, index_table_name):
+    # yield (table name, key, PutRequest, trip) in DynamoDB JSON; trip is
+    # None for index entries
+    from boto3.dynamodb.types import TypeSerializer
+
+    serializer = TypeSerializer()
+
+    def put_request(item):
+        return {'PutRequest': {
+            'Item': {name: serializer.serialize(value) for name, value in item.items()}
+        }}
+
+    for item in items:
+        item = dict(item, **write_stamp())
+        yield table_name, (item['user_id'], item['trip_id']), put_request(item), item
+        if index_table_name:
+            for entry in index_entries(item).values():
+                key = (entry['location'], entry['trip_ref'])
+                yield index_table_name, key, put_request(entry), None
+
+
+def _chunks(requests, size):
+    # yield (request items, trips) with up to ``size`` requests each;
+    # DynamoDB rejects a batch that writes the same key twice, so within a
+    # chunk the last write of a key wins, like overwrite_by_pkeys in boto3
+    requests = iter(requests)
+    while True:
+        chunk = {}
+        for table_name, key, request, trip in requests:
+            chunk.pop((table_name, key), None)
+            chunk[(table_name, key)] = request, trip
+            if len(chunk) >= size:
+                break
+        if not chunk:
+            return
+        request_items = {}
+        trips = []
+        for (table_name, _), (request, trip) in chunk.items():
+            request_items.setdefault(table_name, []).append(request)
+            if trip is not None:
+                trips.append(trip)
+        yield request_items, trips
+
+
+def _count(request_items):
+    return sum(len(table_requests) for table_requests in request_items.values())
+
+
+def write_batch(client, request_items, max_attempts=8, limiter=None):
+    """Send one BatchWriteItem request until every item has been written.
+
+    Returns the batch's ``BatchStats``; raises ``UnprocessedItemsError`` if
+    DynamoDB still leaves requests unprocessed after ``max_attempts`` calls.
+    With a ``limiter`` (see ``trips.limiter``) every call is charged the
+    write capacity units it used, and unprocessed items slow it down the
+    same way throttling does.
+    """
+    requests = _count(request_items)
+    start = time.perf_counter()
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            if limiter:
+                # one WCU per item up to 1 KB, if the response doesn't say
+                db_resp = limiter.call(client.batch_write_item, _count(request_items),
+                                       RequestItems=request_items)
+            else:
+                db_resp = client.batch_write_item(RequestItems=request_items)
+        except Exception as e:
+            if attempt >= max_attempts or not is_retryable(e):
+                raise
+        else:
+            request_items = db_resp.get('UnprocessedItems')
+            if not request_items:
+                return BatchStats(requests, attempt, time.perf_counter() - start)
+            if limiter:
+                limiter.throttled()
+            if attempt >= max_attempts:
+                raise UnprocessedItemsError(request_items)
+        sleep_backoff(attempt)
+
+
+def batch_put_trips(client, trips, table_name=TABLE_NAME, max_workers=4,
+                    max_attempts=8, index_table_name=None, on_batch=None,
+                    limiter=None, listeners=()):
+    """Write ``trips`` in 25-request batches, ``max_workers`` batches at a time.
+
+    ``client`` is a DynamoDB service client (``trips_table.meta.client`` works
+    too) and ``trips`` is any iterable of plain Python items, consumed lazily.
+    With ``index_table_name`` set (for example ``LOCATION_INDEX_TABLE_NAME``),
+    the location index entries of each trip are written in the same batches.
+    Batch writes cannot return the replaced item, so stale index entries of a
+    trip that is overwritten with different locations are not removed; use
+    ``put_trip`` for those.
+
+    A trip that appears more than once within a batch is written once, with
+    its last value. Copies further apart land in different batches, which
+    may be written in either order.
+
+    ``on_batch`` is called with the ``BatchStats`` of each batch as it
+    completes. Returns the list of all ``BatchStats``. ``limiter`` is shared
+    by every batch, keeping the whole load within one write capacity budget.
+
+    ``listeners`` (see ``trips.writes``) are told about each trip once its
+    batch is written, from the calling thread. Batch writes cannot return
+    the replaced item, so ``old_trip`` is always None: caches are refreshed,
+    but a ``LocationIndex`` cannot delete the entries of locations an
+    overwritten trip no longer has.
+    """
+    requests = _write_requests(trips, table_name, index_table_name)
+    stats = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # future -> the trips of its batch
+        pending = {}
+        for request_items, batch_trips in _chunks(requests, BATCH_WRITE_SIZE):
+            # keep a bounded number of batches queued, so a large input
+            # is never fully materialized
+            if len(pending) >= 2 * max_workers:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                stats.extend(_collect(done, pending, on_batch, listeners))
+            future = executor.submit(write_batch, client, request_items,
+                                     max_attempts, limiter)
+            pending[future] = batch_trips
+        stats.extend(_collect(wait(pending).done, pending, on_batch, listeners))
+    return stats
+
+
+def _collect(futures, pending, on_batch, listeners):
+    for future in futures:
+        batch_stats = future.result()
+        for trip in pending.pop(future):
+            for listener in listeners:
+                listener.trip_changed(None, trip)
+        if on_batch:
+            on_batch(batch_stats)
+        yield batch_stats
+
+
+def _get_batch(client, table_name, keys, max_attempts, fields):
+    # fetch one batch of up to 100 (user_id, trip_id) keys, as DynamoDB JSON
+    request_items = {table_name: with_projection(fields, Keys=[
+        {'user_id': {'S': user_id}, 'trip_id': {'S': trip_id}}
+        for user_id, trip_id in keys
+    ])}
+    items = []
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            db_resp = client.batch_get_item(RequestItems=request_items)
+        except Exception as e:
+            if attempt >= max_attempts or not is_retryable(e):
+                raise
+        else:
+            items.extend(db_resp['Responses'].get(table_name, []))
+            request_items = db_resp.get('UnprocessedKeys')
+            if not request_items:
+                return items
+            if attempt >= max_attempts:
+                raise UnprocessedKeysError(request_items)
+        sleep_backoff(attempt)
+
+
+def get_trips(client, keys, table_name=TABLE_NAME, max_workers=4,
+              max_attempts=8, native=False, fields=None, codec=None):
+    """Fetch many trips by primary key with parallel BatchGetItem calls.
+
+    ``keys`` is a sequence of ``(user_id, trip_id)`` pairs. Duplicate keys are
+    fetched once, and the rest are split into batches of 100 sent
+    ``max_workers`` at a time. Returns one plain Python item per input key, in
+    input order, with ``None`` for trips that do not exist. With ``native``
+    set, numbers come back as int/float rather than Decimal. With ``fields``
+    set, only those attributes (plus the key) are returned. With a ``codec``
+    (see ``trips.codec``), compressed attributes are decompressed.
+    """
+    if fields is not None:
+        fields = ('user_id', 'trip_id') + tuple(fields)
+    unique_keys = list(dict.fromkeys(keys))
+    batches = [unique_keys[i:i + BATCH_GET_SIZE]
+               for i in range(0, len(unique_keys), BATCH_GET_SIZE)]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(_get_batch, client, table_name, batch,
+                                   max_attempts, fields)
+                   for batch in batches]
+        raw_items = [item for future in futures for item in future.result()]
+
+    items = TripDeserializer(native=native, codec=codec).deserialize_items(raw_items)
+    found = {(item['user_id'], item['trip_id']): item for item in items}
+    return [found.get(key) for key in keys]
@@ -0,0 +1,270 @@
+"""Benchmarks for the trip access patterns, against the local stand-in table.
+
+Each pattern from the example scripts (get, query, query-range on the index,
+the location scan, put and update) runs against a ``trips.local.LocalTable``
+filled with generated trips, so results are reproducible and cost nothing.
+For every pattern it reports throughput, p50/p95/p99 latency and the peak
+memory allocated while running it.
+
+Run it from the python folder::
+
+    python -m trips.bench --items 10000 --itinerary 10 --concurrency 4 \\
+        --output results.json
+    python -m trips.bench --compare results.json
+
+``--compare`` prints the change against a previous JSON result, so
+regressions show up between runs. Both runs have to use the same settings
+(``--items``, ``--concurrency``, ...); ``--force`` compares them anyway,
+with a warning. ``--latency`` adds a simulated round trip
+time to every call, which is what makes ``--concurrency`` pay off.
+"""
+
+import argparse
+import json
+import platform
+import random
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from trips import INDEX_NAME
+from trips.local import LocalTable
+
+LOCATIONS = ('Iceland', 'Vermont', 'Portugal', 'Quebec', 'Japan', 'Peru',
+             'Morocco', 'Norway', 'Chile', 'Greece')
+
+# every pattern, in the order they are run
+PATTERNS = ('get', 'query', 'query-range', 'scan', 'put', 'update')
+
+
+def make_trip(rng, user_id, itinerary_entries=0):
+    """Return a generated trip, optionally with an itinerary."""
+    year = rng.choice((2025, 2026, 2027))
+    month = rng.randint(1, 12)
+    day = rng.randint(1, 28)
+    locations = rng.sample(LOCATIONS, rng.randint(1, 3))
+    start_date = f'{year}/{month:02d}/{day:02d}'
+    trip = {
+        'user_id': user_id,
+        'trip_id': f'{start_date}_{locations[0]}_{rng.randrange(10 ** 6)}',
+        'start_date': start_date,
+        'start_time': '5:30pm',
+        'end_date': f'{year}/{month:02d}/{min(day + 3, 28):02d}',
+        'end_time': '11:00am',
+        'locations': locations,
+    }
+    if itinerary_entries:
+        trip['itinerary'] = [make_itinerary_entry(rng, start_date)
+                             for _ in range(itinerary_entries)]
+    return trip
+
+
+def make_itinerary_entry(rng, date):
+    return {
+        'date': date,
+        'from_time': '09:00',
+        'to_time': '17:00',
+        'title': f'Activity {rng.randrange(1000)}',
+        'location': rng.choice(LOCATIONS),
+        'description': 'Explore the scenic trails, offering breathtaking views '
+                       'of the lake before heading back into town for dinner.',
+    }
+
+
+def build_table(items, users, itinerary_entries, seed=0, latency=0.0):
+    """Return a LocalTable with ``items`` generated trips, and their keys."""
+    rng = random.Random(seed)
+    trips = [make_trip(rng, f'user{i % users}', itinerary_entries)
+             for i in range(items)]
+    table = LocalTable(latency=latency)
+    table.load(trips)
+    return table, [(trip['user_id'], trip['trip_id']) for trip in trips]
+
+
+def _operations(table, keys, users, itinerary_entries):
+    # one callable per pattern, each doing a single operation
+    from boto3.dynamodb.conditions import Key
+
+    from trips.scan import scan_items
+    from trips.writes import put_trip, update_trip
+
+    def query_all(**query_kwargs):
+        count = 0
+        while True:
+            db_resp = table.query(**query_kwargs)
+            count += len(db_resp['Items'])
+            if 'LastEvaluatedKey' not in db_resp:
+                return count
+            query_kwargs['ExclusiveStartKey'] = db_resp['LastEvaluatedKey']
+
+    def get(rng):
+        user_id, trip_id = rng.choice(keys)
+        table.get_item(Key={'user_id': user_id, 'trip_id': trip_id})
+
+    def query(rng):
+        query_all(KeyConditionExpression=Key('user_id').eq(f'user{rng.randrange(users)}'))
+
+    def query_range(rng):
+        query_all(IndexName=INDEX_NAME, KeyConditionExpression=(
+            Key('user_id').eq(f'user{rng.randrange(users)}') &
+            Key('start_date').between('2025/07/09', '2026/12/31')
+        ))
+
+    def scan(rng):
+        for _ in scan_items(table, FilterExpression='contains(locations, :location)',
+                            ExpressionAttributeValues={':location': rng.choice(LOCATIONS)}):
+            pass
+
+    def put(rng):
+        put_trip(table, make_trip(rng, f'user{rng.randrange(users)}', itinerary_entries))
+
+    def update(rng):
+        user_id, trip_id = rng.choice(keys)
+        update_trip(table, user_id, trip_id, {'end_time': f'{rng.randint(1, 12)}:00pm'})
+
+    return {'get': get, 'query': query, 'query-range': query_range,
+            'scan': scan, 'put': put, 'update': update}
+
+
+def _percentile(sorted_values, percent):
+    # nearest-rank percentile
+    index = max(0, int(round(percent / 100 * len(sorted_values))) - 1)
+    return sorted_values[index]
+
+
+def run_pattern(operation, ops, concurrency, seed=0):
+    """Run ``ops`` operations on ``concurrency`` threads; return the stats."""
+
+    def timed(i):
+        rng = random.Random(seed * 1000003 + i)
+        start = time.perf_counter()
+        operation(rng)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = sorted(executor.map(timed, range(ops)))
+    seconds = time.perf_counter() - start
+
+    # measure memory on a separate, shorter run, as tracing slows things down
+    tracemalloc.start()
+    try:
+        for i in range(min(ops, 50)):
+            operation(random.Random(i))
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'ops': ops,
+        'seconds': round(seconds, 4),
+        'ops_per_sec': round(ops / seconds, 1),
+        'p50_ms': round(_percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(_percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(_percentile(latencies, 99) * 1000, 3),
+        'peak_memory_kb': round(peak / 1024, 1),
+    }
+
+
+def run(items=10000, users=500, itinerary=0, concurrency=1, ops=1000,
+        scan_ops=10, latency=0.0, patterns=PATTERNS, seed=0):
+    """Run the benchmark and return the results as a JSON-ready dict."""
+    config = {
+        'items': items, 'users': users, 'itinerary': itinerary,
+        'concurrency': concurrency, 'ops': ops, 'scan_ops': scan_ops,
+        'latency': latency, 'seed': seed,
+    }
+    table, keys = build_table(items, users, itinerary, seed, latency)
+    operations = _operations(table, keys, users, itinerary)
+    results = {}
+    for name in patterns:
+        pattern_ops = scan_ops if name == 'scan' else ops
+        results[name] = run_pattern(operations[name], pattern_ops, concurrency, seed)
+    return {
+        'config': config,
+        'python': platform.python_version(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'results': results,
+    }
+
+
+def config_changes(current, baseline):
+    """Return the settings that differ between two benchmark results."""
+    before, after = baseline.get('config', {}), current['config']
+    return {name: (before.get(name), after.get(name))
+            for name in sorted(set(before) | set(after))
+            if before.get(name) != after.get(name)}
+
+
+def compare(current, baseline, force=False):
+    """Return report lines comparing two benchmark results.
+
+    Raises ValueError if the two runs used different settings, as their
+    numbers say nothing about a regression; with ``force``, the report
+    starts with a warning instead.
+    """
+    changes = config_changes(current, baseline)
+    described = ', '.join(f'{name} {before} -> {after}'
+                          for name, (before, after) in changes.items())
+    if changes and not force:
+        raise ValueError(f'runs used different settings: {described}')
+    lines = [f'warning: runs used different settings: {described}'] if changes else []
+    for name, result in current['results'].items():
+        before = baseline['results'].get(name)
+        if before is None:
+            continue
+        throughput = (result['ops_per_sec'] / before['ops_per_sec'] - 1) * 100
+        p99 = (result['p99_ms'] / before['p99_ms'] - 1) * 100 if before['p99_ms'] else 0.0
+        lines.append(f'{name:12} ops/sec {throughput:+7.1f}%   p99 {p99:+7.1f}%')
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m trips.bench',
+        description='Benchmark the trip access patterns on a local table.')
+    parser.add_argument('--items', type=int, default=10000, help='trips in the table')
+    parser.add_argument('--users', type=int, default=500, help='distinct user ids')
+    parser.add_argument('--itinerary', type=int, default=0,
+                        help='itinerary entries per trip (0 for none)')
+    parser.add_argument('--concurrency', type=int, default=1, help='worker threads')
+    parser.add_argument('--ops', type=int, default=1000, help='operations per pattern')
+    parser.add_argument('--scan-ops', type=int, default=10, help='full scans to run')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='simulated seconds of round trip per call')
+    parser.add_argument('--patterns', nargs='+', choices=PATTERNS, default=PATTERNS)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='save the results to this JSON file')
+    parser.add_argument('--compare', help='compare with the results in this JSON file')
+    parser.add_argument('--force', action='store_true',
+                        help='compare even if the runs used different settings')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    report = run(args.items, args.users, args.itinerary, args.concurrency,
+                 args.ops, args.scan_ops, args.latency, args.patterns, args.seed)
+
+    print(f"{'pattern':12} {'ops/sec':>10} {'p50 ms':>9} {'p95 ms':>9} "
+          f"{'p99 ms':>9} {'peak KB':>9}")
+    for name, result in report['results'].items():
+        print(f"{name:12} {result['ops_per_sec']:10.1f} {result['p50_ms']:9.3f} "
+              f"{result['p95_ms']:9.3f} {result['p99_ms']:9.3f} "
+              f"{result['peak_memory_kb']:9.1f}")
+
+    if args.compare:
+        try:
+            lines = compare(report, baseline, args.force)
+        except ValueError as e:
+            parser.exit(2, f'{parser.prog}: error: {e} (use --force to compare anyway)\n')
+        print(f'\nCompared with {args.compare}:')
+        for line in lines:
+            print(line)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,277 @@
+"""In-process read-through caches for trips.
+
+Trips are read far more often than they change, so repeated lookups of the
+same ``(user_id, trip_id)`` can be served from memory. ``TripCache`` keeps at
+most ``max_size`` trips, evicting the least recently used one, and forgets
+each trip ``ttl`` seconds after it was cached.
+
+The cache is a write listener (see ``trips.writes``): passing it to
+``put_trip``/``update_trip`` refreshes the cached copy of every trip written
+through this process, and so does passing it to ``batch_put_trips``. Writes
+made by other processes are only picked up once the entry expires, so
+``ttl`` bounds how stale a read can be. A read-through whose trip is written
+or invalidated while the table read is in flight does not cache its result,
+which may predate the write.
+
+``UserTripsCache`` does the same for the trip list of a user, as returned by
+a query on the ``user_id`` partition. Any write to one of the user's trips
+drops the cached list, and users with no trips are cached too, for a
+shorter ``negative_ttl``.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class _Generations:
+    """Per-key generation counters, kept only while reads of the key are in flight.
+
+    Not thread-safe on its own: callers hold the cache's lock.
+    """
+
+    def __init__(self):
+        # key -> [generation, reads in flight]
+        self._keys = {}
+
+    def start(self, key):
+        entry = self._keys.setdefault(key, [0, 0])
+        entry[1] += 1
+        return entry[0]
+
+    def bump(self, key):
+        entry = self._keys.get(key)
+        if entry is not None:
+            entry[0] += 1
+
+    def bump_all(self):
+        for entry in self._keys.values():
+            entry[0] += 1
+
+    def finish(self, key, generation):
+        """End a read; returns True if the key did not change during it."""
+        entry = self._keys[key]
+        entry[1] -= 1
+        if not entry[1]:
+            del self._keys[key]
+        return entry[0] == generation
+
+
+class TripCache:
+    """LRU cache of trip items keyed on (user_id, trip_id), with a TTL."""
+
+    def __init__(self, max_size=1024, ttl=300.0, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._generations = _Generations()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, user_id, trip_id):
+        """Return the cached trip, or None if it is missing or expired."""
+        key = (user_id, trip_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= self.clock():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def _store(self, key, trip):
+        self._entries[key] = (self.clock() + self.ttl, trip)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def put(self, trip):
+        """Cache ``trip``, evicting the least recently used trip if full."""
+        key = (trip['user_id'], trip['trip_id'])
+        with self._lock:
+            self._generations.bump(key)
+            self._store(key, trip)
+
+    def invalidate(self, user_id, trip_id):
+        """Drop a trip from the cache, if present."""
+        key = (user_id, trip_id)
+        with self._lock:
+            self._generations.bump(key)
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._generations.bump_all()
+            self._entries.clear()
+
+    def stats(self):
+        """Return the hit/miss counters and the current size."""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+            'size': len(self._entries),
+        }
+
+    def trip_changed(self, old_trip, new_trip):
+        """Write listener: refresh the cached copy of a written trip."""
+        if new_trip is None:
+            self.invalidate(old_trip['user_id'], old_trip['trip_id'])
+        else:
+            self.put(new_trip)
+
+    def get_trip(self, table, user_id, trip_id):
+        """Return a trip from the cache, reading it from ``table`` on a miss.
+
+        Returns None if the trip does not exist. Cached items are shared
+        between callers, so treat them as read-only.
+        """
+        trip = self.get(user_id, trip_id)
+        if trip is not None:
+            return trip
+        key = (user_id, trip_id)
+        with self._lock:
+            generation = self._generations.start(key)
+        trip = None
+        try:
+            db_resp = table.get_item(Key={'user_id': user_id, 'trip_id': trip_id})
+            trip = db_resp.get('Item')
+        finally:
+            with self._lock:
+                # a write during the read may be newer than what was read
+                if self._generations.finish(key, generation) and trip is not None:
+                    self._store(key, trip)
+        return trip
+
+
+class UserTripsCache:
+    """LRU cache of per-user trip lists, bounded by the total number of trips."""
+
+    def __init__(self, max_items=10000, ttl=60.0, negative_ttl=10.0,
+                 clock=time.monotonic):
+        self.max_items = max_items
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.item_count = 0
+        self._entries = OrderedDict()
+        self._generations = _Generations()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, user_id):
+        """Return the cached trip list of a user, or None on a miss.
+
+        A user cached as having no trips returns an empty list.
+        """
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] <= self.clock():
+                if entry is not None:
+                    self._drop(user_id)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, user_id, trips):
+        """Cache the trip list of a user, evicting least recently used users.
+
+        A list longer than ``max_items`` is not cached at all, and drops the
+        user's previous list.
+        """
+        with self._lock:
+            self._generations.bump(user_id)
+            self._store(user_id, trips)
+
+    def _store(self, user_id, trips):
+        # the old list is stale either way, even if the new one doesn't fit
+        self._drop(user_id)
+        if len(trips) > self.max_items:
+            return
+        ttl = self.ttl if trips else self.negative_ttl
+        self._entries[user_id] = (self.clock() + ttl, trips)
+        self.item_count += len(trips)
+        while self.item_count > self.max_items:
+            self._drop(next(iter(self._entries)))
+
+    def invalidate(self, user_id):
+        """Drop the cached trip list of a user, if present."""
+        with self._lock:
+            self._generations.bump(user_id)
+            self._drop(user_id)
+
+    def _drop(self, user_id):
+        entry = self._entries.pop(user_id, None)
+        if entry is not None:
+            self.item_count -= len(entry[1])
+
+    def clear(self):
+        with self._lock:
+            self._generations.bump_all()
+            self._entries.clear()
+            self.item_count = 0
+
+    def stats(self):
+        """Return the hit/miss counters and the current size."""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+            'users': len(self._entries),
+            'items': self.item_count,
+        }
+
+    def trip_changed(self, old_trip, new_trip):
+        """Write listener: drop the trip list of the user whose trip changed."""
+        for trip in (old_trip, new_trip):
+            if trip is not None:
+                self.invalidate(trip['user_id'])
+
+    def query_trips(self, table, user_id):
+        """Return all trips of a user from the cache, querying ``table`` on a miss.
+
+        The query follows ``LastEvaluatedKey``, so the whole partition is
+        cached. Cached lists are shared between callers, so treat them as
+        read-only.
+        """
+        trips = self.get(user_id)
+        if trips is not None:
+            return trips
+        from boto3.dynamodb.conditions import Key
+
+        with self._lock:
+            generation = self._generations.start(user_id)
+        trips = None
+        try:
+            query_kwargs = {'KeyConditionExpression': Key('user_id').eq(user_id)}
+            items = []
+            while True:
+                db_resp = table.query(**query_kwargs)
+                items.extend(db_resp['Items'])
+                last_key = db_resp.get('LastEvaluatedKey')
+                if not last_key:
+                    break
+                query_kwargs['ExclusiveStartKey'] = last_key
+            trips = items
+        finally:
+            with self._lock:
+                # a write during the query may be missing from the list
+                if self._generations.finish(user_id, generation) and trips is not None:
+                    self._store(user_id, trips)
+        return trips
@@ -0,0 +1,164 @@
+"""Write-behind coalescing of repeated updates to the same trip.
+
+A planner UI sends a burst of small edits to one trip, and each would be
+its own ``update_item`` call. ``UpdateCoalescer`` collects the updates per
+``(user_id, trip_id)`` instead, merging them (the latest value of each
+attribute wins), and writes each trip with a single ``update_trip`` call
+when:
+
+- the oldest pending update of a trip is ``window`` seconds old,
+- ``max_keys`` trips have updates pending, or
+- ``flush()`` or ``close()`` is called.
+
+Durability: ``update()`` returns before anything is written. Until the
+next flush, the updates only exist in this process's memory, and they are
+lost if the process crashes or is killed. Nothing is ordered between
+different trips, and other readers of the table see the updates only after
+the flush. Use ``update_trip`` directly for writes that must be durable
+when the call returns, and call ``close()`` (or use the coalescer as a
+context manager) before the process exits; it raises
+``UnflushedUpdatesError`` if some updates could not be written.
+
+Failed writes: a throttled or transient failure keeps the trip's updates
+pending, merged under any newer ones, for the next flush. Other errors
+drop the updates and are passed to ``on_error(key, updates, error)``;
+``flush()`` also raises the first of them once every trip was tried.
+"""
+
+import threading
+import time
+
+from trips.retry import is_retryable, sleep_backoff
+from trips.writes import update_trip
+
+
+class UnflushedUpdatesError(Exception):
+    """Raised by ``close()`` when updates could still not be written."""
+
+    def __init__(self, pending):
+        super().__init__(f'{len(pending)} trips still have unwritten updates')
+        self.pending = pending
+
+
+class UpdateCoalescer:
+    """Merges updates per trip and writes them in the background."""
+
+    def __init__(self, table, window=0.5, max_keys=100, listeners=(),
+                 on_error=None, clock=time.monotonic):
+        self.table = table
+        self.window = window
+        self.max_keys = max_keys
+        self.listeners = listeners
+        self.on_error = on_error
+        self.clock = clock
+        self.updates = 0
+        self.writes = 0
+        # key -> (time of the oldest pending update, merged updates)
+        self._pending = {}
+        self._lock = threading.Lock()
+        # only one flush writes at a time, so writes to a trip stay in order
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def update(self, user_id, trip_id, updates):
+        """Queue ``updates`` (attribute -> value) for a trip."""
+        key = (user_id, trip_id)
+        with self._lock:
+            self.updates += 1
+            since, merged = self._pending.get(key, (self.clock(), {}))
+            self._pending[key] = (since, dict(merged, **updates))
+            full = len(self._pending) >= self.max_keys
+            self._start()
+        if full:
+            self.flush()
+
+    def pending(self, user_id, trip_id):
+        """Return the updates queued for a trip and not written yet."""
+        with self._lock:
+            return dict(self._pending.get((user_id, trip_id), (None, {}))[1])
+
+    def _start(self):
+        # start the background flusher on first use
+        if self._thread is None and not self._stop.is_set():
+            self._thread = threading.Thread(target=self._run, daemon=True,
+                                            name='trips-coalescer')
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.window / 4):
+            self._flush(expired_only=True)
+
+    def _take(self, expired_only):
+        with self._lock:
+            if not expired_only:
+                taken, self._pending = self._pending, {}
+                return taken
+            deadline = self.clock() - self.window
+            taken = {key: value for key, value in self._pending.items()
+                     if value[0] <= deadline}
+            for key in taken:
+                del self._pending[key]
+            return taken
+
+    def _flush(self, expired_only=False):
+        errors = []
+        with self._flush_lock:
+            for key, (since, updates) in self._take(expired_only).items():
+                try:
+                    update_trip(self.table, *key, updates, listeners=self.listeners)
+                    self.writes += 1
+                except Exception as e:
+                    if is_retryable(e):
+                        self._requeue(key, since, updates)
+                        continue
+                    errors.append(e)
+                    if self.on_error:
+                        self.on_error(key, updates, e)
+        return errors
+
+    def _requeue(self, key, since, updates):
+        # newer updates queued during the write win over the failed ones
+        with self._lock:
+            newer = self._pending.get(key, (since, {}))[1]
+            self._pending[key] = (since, dict(updates, **newer))
+
+    def flush(self):
+        """Write every pending update now; raises the first non-retryable error."""
+        errors = self._flush()
+        if errors:
+            raise errors[0]
+
+    def close(self, max_attempts=5):
+        """Stop the background flusher and write everything still pending.
+
+        Retries throttled writes up to ``max_attempts`` times, then raises
+        ``UnflushedUpdatesError`` with the updates that are left. Updates
+        queued after ``close()`` are only written by ``flush()``.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        for attempt in range(max_attempts):
+            self.flush()
+            with self._lock:
+                if not self._pending:
+                    return
+            sleep_backoff(attempt)
+        with self._lock:
+            pending = {key: updates for key, (_, updates) in self._pending.items()}
+        raise UnflushedUpdatesError(pending)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'updates': self.updates,
+                'writes': self.writes,
+                'pending': len(self._pending),
+            }
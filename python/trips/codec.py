@@ -0,0 +1,264 @@
+"""Transparent compression of large trip attributes.
+
+Long itineraries, with their free text descriptions, make up most of a
+trip's size, and DynamoDB charges reads by 4 KB and writes by 1 KB of item
+size, up to an item limit of 400 KB. ``AttributeCodec`` compresses the
+top-level attributes it is given (just ``itinerary`` by default, which holds
+the activity descriptions) with zlib into a binary value once they grow
+past ``threshold`` bytes, and turns them back into their original value
+when the item is read. Compressed values start with ``MAGIC``, so items
+written before, or below the threshold, read back unchanged.
+
+``CompressedTable`` wraps a resource table so this happens on every
+``put_item``, ``update_item`` (for attributes set as a whole),
+``batch_writer`` put, ``get_item``, ``query`` and ``scan``; everything else
+passes through to the table. Since a compressed attribute is a single
+binary value, DynamoDB cannot look inside it: conditions and filters on its
+contents only work on uncompressed values, and ``patch_itinerary`` sets a
+compressed itinerary as a whole rather than patching it.
+
+The service client readers decode too when given the codec:
+``TripDeserializer(codec=...)``, ``get_trips(..., codec=...)`` and
+``AsyncTripsClient(..., codec=...)``, which also compresses what it writes.
+``batch_put_trips`` writes items as given; pass them through
+``encode_item`` first.
+
+``item_size`` estimates the size DynamoDB bills for an item, and
+``compression_report`` shows the bytes and capacity units a codec saves.
+"""
+
+import base64
+import json
+import math
+import re
+import zlib
+from decimal import Decimal
+
+# marks a compressed attribute value: codec name and format version
+MAGIC = b'TZ\x01'
+
+# attributes compressed by default
+COMPRESSED_ATTRIBUTES = ('itinerary',)
+
+# DynamoDB capacity unit sizes, in bytes
+READ_UNIT_BYTES = 4096
+WRITE_UNIT_BYTES = 1024
+
+
+def _value_size(value):
+    # size of one value, following the DynamoDB item size rules
+    if isinstance(value, str):
+        return len(value.encode('utf-8'))
+    if isinstance(value, bool) or value is None:
+        return 1
+    if isinstance(value, (int, float, Decimal)):
+        digits = Decimal(value).normalize().as_tuple().digits
+        return (len(digits) + 1) // 2 + 1
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if hasattr(value, 'value') and isinstance(value.value, bytes):
+        # boto3 Binary
+        return len(value.value)
+    if isinstance(value, dict):
+        return 3 + sum(_value_size(name) + _value_size(element) + 1
+                       for name, element in value.items())
+    if isinstance(value, (list, tuple)):
+        return 3 + sum(_value_size(element) + 1 for element in value)
+    if isinstance(value, (set, frozenset)):
+        return sum(_value_size(element) for element in value)
+    raise TypeError(f'Unsupported type for item size: {type(value).__name__}')
+
+
+def item_size(item):
+    """Estimate the size of ``item`` in bytes, as DynamoDB bills it."""
+    return sum(_value_size(name) + _value_size(value) for name, value in item.items())
+
+
+def read_units(size, consistent=False):
+    """Return the RCUs to read an item of ``size`` bytes with get_item."""
+    units = max(1, math.ceil(size / READ_UNIT_BYTES))
+    return units if consistent else units / 2
+
+
+def write_units(size):
+    """Return the WCUs to write an item of ``size`` bytes."""
+    return max(1, math.ceil(size / WRITE_UNIT_BYTES))
+
+
+def _binary(value):
+    # the bytes of a binary value, as returned by either client, or None
+    if isinstance(value, (bytes, bytearray)):
+        return bytes(value)
+    if type(value).__name__ == 'Binary':
+        return value.value
+    return None
+
+
+def _restore_binary(value):
+    # undo the base64 encoding of binary values inside DynamoDB JSON
+    (tag, inner), = value.items()
+    if tag == 'B':
+        return {tag: base64.b64decode(inner)}
+    if tag == 'BS':
+        return {tag: [base64.b64decode(element) for element in inner]}
+    if tag == 'L':
+        return {tag: [_restore_binary(element) for element in inner]}
+    if tag == 'M':
+        return {tag: {name: _restore_binary(element) for name, element in inner.items()}}
+    return value
+
+
+class AttributeCodec:
+    """Compresses ``attributes`` whose size is over ``threshold`` bytes.
+
+    Values are stored as DynamoDB JSON, so numbers, sets and binary values
+    come back with the same types the client gave them.
+    """
+
+    def __init__(self, attributes=COMPRESSED_ATTRIBUTES, threshold=1024, level=6):
+        from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+
+        self.attributes = frozenset(attributes)
+        self.threshold = threshold
+        self.level = level
+        self._serializer = TypeSerializer()
+        self._deserializer = TypeDeserializer()
+
+    def encode_value(self, value):
+        """Return ``value`` compressed, or unchanged if it is small enough."""
+        if _binary(value) is not None or _value_size(value) <= self.threshold:
+            return value
+        document = json.dumps(self._serializer.serialize(value), separators=(',', ':'),
+                              default=lambda raw: base64.b64encode(raw).decode())
+        compressed = MAGIC + zlib.compress(document.encode('utf-8'), self.level)
+        # text that does not compress is better left readable
+        return compressed if len(compressed) < _value_size(value) else value
+
+    def decompress(self, value):
+        """Return the DynamoDB JSON of a compressed value, or None for other values."""
+        raw = _binary(value)
+        if raw is None or not raw.startswith(MAGIC):
+            return None
+        return _restore_binary(json.loads(zlib.decompress(raw[len(MAGIC):])))
+
+    def decode_value(self, value):
+        """Return the original of a compressed value; other values unchanged."""
+        document = self.decompress(value)
+        if document is None:
+            return value
+        return self._deserializer.deserialize(document)
+
+    def encode_item(self, item):
+        """Return a copy of ``item`` with its large attributes compressed."""
+        return {name: self.encode_value(value) if name in self.attributes else value
+                for name, value in item.items()}
+
+    def decode_item(self, item):
+        """Return a copy of ``item`` with its compressed attributes restored."""
+        if item is None:
+            return None
+        return {name: self.decode_value(value) if name in self.attributes else value
+                for name, value in item.items()}
+
+
+def compression_report(item, codec=None):
+    """Compare the size and capacity units of ``item`` with and without ``codec``."""
+    codec = codec or AttributeCodec()
+    before = item_size(item)
+    after = item_size(codec.encode_item(item))
+    return {
+        'bytes': before,
+        'compressed_bytes': after,
+        'saved_bytes': before - after,
+        'read_units': read_units(before),
+        'compressed_read_units': read_units(after),
+        'write_units': write_units(before),
+        'compressed_write_units': write_units(after),
+    }
+
+
+def _whole_assignments(expression):
+    # yield (name, placeholder) for "SET name = :value" actions on a whole attribute
+    # clause keywords, but not placeholders like :delete or #set
+    clauses = re.split(r'(?<![#:\w])(SET|REMOVE|ADD|DELETE)(?![\w])', expression,
+                       flags=re.IGNORECASE)
+    for keyword, clause in zip(clauses[1::2], clauses[2::2]):
+        if keyword.upper() != 'SET':
+            continue
+        depth = 0
+        action = ''
+        for char in clause + ',':
+            depth += (char == '(') - (char == ')')
+            if char == ',' and not depth:
+                match = re.fullmatch(r'\s*(#?\w+)\s*=\s*(:\w+)\s*', action)
+                if match:
+                    yield match.groups()
+                action = ''
+            else:
+                action += char
+
+
+class _CompressedBatchWriter:
+
+    def __init__(self, writer, codec):
+        self._writer = writer
+        self._codec = codec
+
+    def __enter__(self):
+        self._writer.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        return self._writer.__exit__(*exc_info)
+
+    def put_item(self, Item):
+        self._writer.put_item(Item=self._codec.encode_item(Item))
+
+    def delete_item(self, Key):
+        self._writer.delete_item(Key=Key)
+
+
+class CompressedTable:
+    """A resource table that compresses and decompresses attributes with ``codec``."""
+
+    def __init__(self, table, codec=None):
+        self.table = table
+        self.codec = codec or AttributeCodec()
+
+    def __getattr__(self, name):
+        return getattr(self.table, name)
+
+    def _decode(self, db_resp):
+        db_resp = dict(db_resp)
+        for name in ('Item', 'Attributes'):
+            if name in db_resp:
+                db_resp[name] = self.codec.decode_item(db_resp[name])
+        if 'Items' in db_resp:
+            db_resp['Items'] = [self.codec.decode_item(item) for item in db_resp['Items']]
+        return db_resp
+
+    def get_item(self, **kwargs):
+        return self._decode(self.table.get_item(**kwargs))
+
+    def put_item(self, Item, **kwargs):
+        return self._decode(self.table.put_item(Item=self.codec.encode_item(Item), **kwargs))
+
+    def update_item(self, **kwargs):
+        expression = kwargs.get('UpdateExpression', '')
+        names = kwargs.get('ExpressionAttributeNames', {})
+        values = dict(kwargs.get('ExpressionAttributeValues', {}))
+        for name, placeholder in _whole_assignments(expression):
+            if names.get(name, name) in self.codec.attributes and placeholder in values:
+                values[placeholder] = self.codec.encode_value(values[placeholder])
+        if values:
+            kwargs['ExpressionAttributeValues'] = values
+        return self._decode(self.table.update_item(**kwargs))
+
+    def query(self, **kwargs):
+        return self._decode(self.table.query(**kwargs))
+
+    def scan(self, **kwargs):
+        return self._decode(self.table.scan(**kwargs))
+
+    def batch_writer(self, *args, **kwargs):
+        return _CompressedBatchWriter(self.table.batch_writer(*args, **kwargs), self.codec)
@@ -0,0 +1,151 @@
+"""Page-at-a-time queries with opaque, signed cursors.
+
+A query without ``Limit`` reads a whole partition, up to 1 MB per call, so
+a heavy user's trip list takes as long as its size. ``query_page`` asks
+for ``page_size`` items at a time instead and hands back a cursor for the
+next page, so every request does the same amount of work, and an HTTP API
+can serve infinite scroll with no state kept on the server.
+
+The cursor is the query's ``LastEvaluatedKey`` as compact JSON, in base64url
+(safe in URLs), followed by an HMAC-SHA256 signature. The signature covers
+the query the cursor belongs to (table, index, conditions and values), so
+a client can neither alter a cursor to jump into another user's partition
+nor replay it against a different query. The key inside is only encoded,
+not encrypted: clients should treat cursors as opaque, but it is no place
+for secrets. Cursors can also be given a ``max_age``.
+
+With a ``FilterExpression`` a page may hold fewer than ``page_size`` items,
+as DynamoDB applies ``Limit`` before filtering, and the last page may be
+empty: DynamoDB returns a ``LastEvaluatedKey`` whenever it stopped at
+``Limit``, even if nothing is left after it.
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import time
+from collections import namedtuple
+from decimal import Decimal
+
+# bytes of the HMAC-SHA256 signature kept in a cursor
+SIGNATURE_BYTES = 16
+
+
+class InvalidCursorError(ValueError):
+    """Raised for cursors that are malformed, tampered with, or expired."""
+
+
+class Page(namedtuple('Page', 'items cursor')):
+    """One page of results; ``cursor`` is None on the last page."""
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+def _encode_value(value):
+    # key attributes are strings, numbers or binary
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (int, Decimal)):
+        return {'N': str(value)}
+    if isinstance(value, bytes):
+        return {'B': _b64encode(value)}
+    if type(value).__name__ == 'Binary':
+        return {'B': _b64encode(value.value)}
+    raise TypeError(f'Unsupported key value: {type(value).__name__}')
+
+
+def _decode_value(value):
+    if isinstance(value, str):
+        return value
+    if 'N' in value:
+        return Decimal(value['N'])
+    return _b64decode(value['B'])
+
+
+def _describe(value):
+    # a stable text form of a boto3 condition, for the cursor signature
+    if hasattr(value, 'get_expression'):
+        expression = value.get_expression()
+        return '{}({})'.format(expression['operator'],
+                               ','.join(_describe(v) for v in expression['values']))
+    if hasattr(value, 'name'):
+        return '#' + value.name
+    return repr(value)
+
+
+def query_scope(**query_kwargs):
+    """Return the text a cursor of this query is bound to."""
+    return '|'.join([
+        str(query_kwargs.get('TableName', '')),
+        str(query_kwargs.get('IndexName', '')),
+        _describe(query_kwargs.get('KeyConditionExpression')),
+        _describe(query_kwargs.get('FilterExpression')),
+        repr(sorted(query_kwargs.get('ExpressionAttributeValues', {}).items())),
+        str(query_kwargs.get('ScanIndexForward', True)),
+    ])
+
+
+class CursorCodec:
+    """Signs and checks cursors with ``secret``, a key shared by every server.
+
+    ``max_age`` (in seconds) rejects cursors issued longer ago than that.
+    """
+
+    def __init__(self, secret, max_age=None, clock=time.time):
+        if isinstance(secret, str):
+            secret = secret.encode('utf-8')
+        if len(secret) < 16:
+            raise ValueError('cursor secret should be at least 16 bytes')
+        self.secret = secret
+        self.max_age = max_age
+        self.clock = clock
+
+    def _sign(self, payload, scope):
+        digest = hmac.new(self.secret, payload + b'\0' + scope.encode('utf-8'),
+                          hashlib.sha256).digest()
+        return digest[:SIGNATURE_BYTES]
+
+    def encode(self, last_key, scope=''):
+        """Return the cursor for ``last_key`` (a LastEvaluatedKey)."""
+        document = {'k': {name: _encode_value(value) for name, value in last_key.items()},
+                    't': int(self.clock())}
+        payload = json.dumps(document, separators=(',', ':'), sort_keys=True).encode()
+        return _b64encode(payload) + '.' + _b64encode(self._sign(payload, scope))
+
+    def decode(self, cursor, scope=''):
+        """Return the LastEvaluatedKey in ``cursor``; raises ``InvalidCursorError``."""
+        try:
+            payload_text, signature_text = cursor.split('.')
+            payload = _b64decode(payload_text)
+            signature = _b64decode(signature_text)
+        except (AttributeError, ValueError) as e:
+            raise InvalidCursorError('malformed cursor') from e
+        if not hmac.compare_digest(signature, self._sign(payload, scope)):
+            raise InvalidCursorError('cursor signature does not match')
+        document = json.loads(payload)
+        if self.max_age is not None and self.clock() - document['t'] > self.max_age:
+            raise InvalidCursorError('cursor has expired')
+        return {name: _decode_value(value) for name, value in document['k'].items()}
+
+
+def query_page(table, codec, page_size=25, cursor=None, **query_kwargs):
+    """Return one ``Page`` of at most ``page_size`` items of a query.
+
+    ``query_kwargs`` are the usual ``table.query`` arguments
+    (KeyConditionExpression, IndexName, projections, ...), and must be the
+    same for every page. Pass the previous page's ``cursor`` to continue;
+    a cursor from another query raises ``InvalidCursorError``.
+    """
+    scope = query_scope(TableName=table.name, **query_kwargs)
+    if cursor is not None:
+        query_kwargs['ExclusiveStartKey'] = codec.decode(cursor, scope)
+    db_resp = table.query(Limit=page_size, **query_kwargs)
+    last_key = db_resp.get('LastEvaluatedKey')
+    return Page(db_resp['Items'], codec.encode(last_key, scope) if last_key else None)
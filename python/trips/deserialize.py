@@ -0,0 +1,222 @@
+"""Fast conversion of service client (DynamoDB JSON) items to plain Python.
+
+boto3's ``TypeDeserializer`` inspects the type of every attribute through a
+generic dispatch, and turns every number into a ``Decimal``. Trips always
+have the same shape, so ``TripDeserializer`` builds one converter per known
+attribute up front, and each converter goes straight for the expected type
+tag. Anything unexpected (an unknown attribute, or a known one with another
+type) falls back to a generic converter, so the result is still correct for
+any item.
+
+With ``native=True``, numbers become ``int``/``float`` instead of ``Decimal``
+and binary values stay ``bytes``. With a ``codec`` (see ``trips.codec``),
+attributes it compressed are decompressed first, then converted as usual.
+
+Run ``python -m trips.deserialize`` to compare it with ``TypeDeserializer``.
+"""
+
+from decimal import Decimal
+
+# type specs of the trip attributes: a DynamoDB type tag, ('L', spec) for a
+# list of spec, or ('M', spec) for a map whose values are all spec
+TRIP_SCHEMA = {
+    'user_id': 'S',
+    'trip_id': 'S',
+    'start_date': 'S',
+    'start_time': 'S',
+    'end_date': 'S',
+    'end_time': 'S',
+    'locations': ('L', 'S'),
+    'itinerary': ('L', ('M', 'S')),
+}
+
+
+def _native_number(text):
+    if '.' in text or 'e' in text or 'E' in text:
+        return float(text)
+    return int(text)
+
+
+def _generic(native):
+    # converter for any DynamoDB JSON value
+    from boto3.dynamodb.types import Binary
+
+    number = _native_number if native else Decimal
+    binary = bytes if native else Binary
+
+    def convert(value):
+        (tag, data), = value.items()
+        if tag == 'S':
+            return data
+        if tag == 'N':
+            return number(data)
+        if tag == 'L':
+            return [convert(element) for element in data]
+        if tag == 'M':
+            return {name: convert(element) for name, element in data.items()}
+        if tag == 'BOOL':
+            return data
+        if tag == 'NULL':
+            return None
+        if tag == 'B':
+            return binary(data)
+        if tag == 'SS':
+            return set(data)
+        if tag == 'NS':
+            return {number(element) for element in data}
+        if tag == 'BS':
+            return {binary(element) for element in data}
+        raise TypeError(f'Unsupported DynamoDB type: {tag}')
+
+    return convert
+
+
+def _compile(spec, generic, native):
+    # build a converter for one type spec, falling back to generic
+    if spec == 'S':
+        def convert(value):
+            data = value.get('S')
+            return data if data is not None else generic(value)
+    elif spec == 'N':
+        number = _native_number if native else Decimal
+
+        def convert(value):
+            data = value.get('N')
+            return number(data) if data is not None else generic(value)
+    elif spec[0] == 'L' and spec[1] == 'S':
+        # the common case of a list of strings gets its own tight loop
+        def convert(value):
+            data = value.get('L')
+            if data is None:
+                return generic(value)
+            try:
+                return [element['S'] for element in data]
+            except KeyError:
+                return generic(value)
+    elif spec[0] == 'L':
+        element_convert = _compile(spec[1], generic, native)
+
+        def convert(value):
+            data = value.get('L')
+            if data is None:
+                return generic(value)
+            return [element_convert(element) for element in data]
+    elif spec[0] == 'M':
+        element_convert = _compile(spec[1], generic, native)
+
+        def convert(value):
+            data = value.get('M')
+            if data is None:
+                return generic(value)
+            return {name: element_convert(element) for name, element in data.items()}
+    else:
+        raise ValueError(f'Unsupported type spec: {spec!r}')
+    return convert
+
+
+def _decompressing(codec, convert):
+    # restore a compressed value before converting it
+    def decode(value):
+        data = value.get('B')
+        if data is not None:
+            document = codec.decompress(data)
+            if document is not None:
+                return convert(document)
+        return convert(value)
+
+    return decode
+
+
+class TripDeserializer:
+    """Converts DynamoDB JSON items of a known schema to plain Python."""
+
+    def __init__(self, schema=TRIP_SCHEMA, native=False, codec=None):
+        self.generic = _generic(native)
+        self.converters = {
+            name: _compile(spec, self.generic, native)
+            for name, spec in schema.items()
+        }
+        if codec is not None:
+            for name in codec.attributes:
+                self.converters[name] = _decompressing(
+                    codec, self.converters.get(name, self.generic))
+
+    def deserialize_item(self, item):
+        """Convert one item."""
+        converters = self.converters
+        generic = self.generic
+        return {
+            name: converters.get(name, generic)(value)
+            for name, value in item.items()
+        }
+
+    def deserialize_items(self, items):
+        """Convert a whole page of items, e.g. ``db_resp['Items']``."""
+        converters = self.converters
+        generic = self.generic
+        return [
+            {name: converters.get(name, generic)(value) for name, value in item.items()}
+            for item in items
+        ]
+
+
+def _sample_item(i):
+    # a service client trip item with a three entry itinerary
+    entry = {
+        'date': {'S': '2026/10/18'},
+        'from_time': {'S': '09:00'},
+        'to_time': {'S': '17:00'},
+        'title': {'S': 'Hike at Mount Philo State Park'},
+        'location': {'S': 'Charlotte'},
+        'description': {'S': 'Explore the scenic trails of Mount Philo.'},
+    }
+    return {
+        'user_id': {'S': f'user{i % 100}'},
+        'trip_id': {'S': f'2026/10/17_Vermont_{i}'},
+        'start_date': {'S': '2026/10/17'},
+        'start_time': {'S': '5:30pm'},
+        'end_date': {'S': '2026/10/19'},
+        'end_time': {'S': '11:00am'},
+        'locations': {'L': [{'S': 'Vermont'}, {'S': 'Quebec'}]},
+        'itinerary': {'L': [{'M': entry}] * 3},
+        'budget': {'N': '1250'},
+    }
+
+
+def benchmark(count=10000, repeat=5):
+    """Time TypeDeserializer against TripDeserializer on ``count`` items.
+
+    Returns the best time in seconds for each, keyed by name.
+    """
+    import timeit
+
+    from boto3.dynamodb.types import TypeDeserializer
+
+    items = [_sample_item(i) for i in range(count)]
+    boto_deserializer = TypeDeserializer()
+    trip_deserializer = TripDeserializer()
+    native_deserializer = TripDeserializer(native=True)
+
+    def boto3_default():
+        return [{name: boto_deserializer.deserialize(value)
+                 for name, value in item.items()} for item in items]
+
+    candidates = {
+        'boto3 TypeDeserializer': boto3_default,
+        'TripDeserializer': lambda: trip_deserializer.deserialize_items(items),
+        'TripDeserializer(native=True)':
+            lambda: native_deserializer.deserialize_items(items),
+    }
+    return {
+        name: min(timeit.repeat(function, number=1, repeat=repeat))
+        for name, function in candidates.items()
+    }
+
+
+if __name__ == '__main__':
+    count = 10000
+    results = benchmark(count)
+    baseline = results['boto3 TypeDeserializer']
+    for name, seconds in results.items():
+        print(f'{name:32} {seconds * 1000:8.1f} ms  '
+              f'{count / seconds:10.0f} items/s  {baseline / seconds:5.1f}x')
@@ -0,0 +1,272 @@
+"""Streaming export of the trips table to NDJSON or Parquet files.
+
+``export_table`` feeds scan pages straight into a file writer, buffering at
+most one row group (``row_group_size`` items, plus the page being read), so
+memory stays flat however large the table is:
+
+- ``NDJSONWriter`` writes one JSON object per line to a single file, every
+  attribute included
+- ``ParquetWriter`` writes a directory of Parquet files, one per row group,
+  with a column per trip attribute; it needs ``pyarrow``, imported only
+  when used
+
+After each row group, the scan's ``LastEvaluatedKey`` is saved to a
+checkpoint file together with what was written so far. Running the same
+export again with the same checkpoint resumes from there, dropping anything
+written after the checkpoint, and a finished export is not run twice.
+
+Attributes compressed by ``trips.codec`` are decompressed before they are
+written, so both formats hold the original values.
+
+With ``total_segments`` above 1 the pages come from a parallel scan. Pages
+of different segments arrive interleaved, so there is no single key to
+resume from, and parallel exports cannot be checkpointed.
+"""
+
+import base64
+import json
+import os
+import time
+from collections import namedtuple
+from decimal import Decimal
+
+from trips import TABLE_NAME
+from trips.codec import AttributeCodec
+from trips.records import TRIP_ATTRIBUTES
+
+# fields of an itinerary activity kept in the Parquet itinerary column
+ITINERARY_FIELDS = ('date', 'from_time', 'to_time', 'title', 'location', 'description')
+
+
+class ExportStats(namedtuple('ExportStats', 'items pages row_groups bytes seconds')):
+    """Progress of an export, reported after each row group."""
+
+    @property
+    def items_per_second(self):
+        return self.items / self.seconds if self.seconds else float('inf')
+
+    @property
+    def megabytes_per_second(self):
+        return self.bytes / 1e6 / self.seconds if self.seconds else float('inf')
+
+
+def _json_default(value):
+    # the types boto3 returns that json can't write
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, (set, frozenset)):
+        return sorted(value, key=str)
+    if isinstance(value, bytes):
+        return base64.b64encode(value).decode()
+    if type(value).__name__ == 'Binary':
+        return base64.b64encode(value.value).decode()
+    raise TypeError(f'Cannot export {type(value).__name__}')
+
+
+class NDJSONWriter:
+    """Writes items as newline delimited JSON to ``path``."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def open(self, position=None):
+        """Open the file, truncated to ``position`` bytes when resuming."""
+        if position is None:
+            self._file = open(self.path, 'wb')
+        else:
+            self._file = open(self.path, 'r+b')
+            self._file.truncate(position)
+            self._file.seek(position)
+
+    def write_row_group(self, items):
+        """Write ``items``; returns the bytes written and the new position."""
+        data = ''.join(json.dumps(item, default=_json_default, separators=(',', ':')) + '\n'
+                       for item in items).encode('utf-8')
+        self._file.write(data)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        return len(data), self._file.tell()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def _arrow_schema(pa):
+    string_list = pa.list_(pa.string())
+    activity = pa.struct([(name, pa.string()) for name in ITINERARY_FIELDS])
+    columns = [(name, pa.string()) for name in TRIP_ATTRIBUTES]
+    columns[TRIP_ATTRIBUTES.index('locations')] = ('locations', string_list)
+    columns[TRIP_ATTRIBUTES.index('itinerary')] = ('itinerary', pa.list_(activity))
+    # any other attributes, as a JSON object
+    return pa.schema(columns + [('extra', pa.string())])
+
+
+def _text(value):
+    return value if value is None or isinstance(value, str) else json.dumps(
+        value, default=_json_default)
+
+
+class ParquetWriter:
+    """Writes items as Parquet files ``part-00000.parquet``, ... in directory ``path``.
+
+    Each row group is its own file, closed before the checkpoint moves past
+    it, so an interrupted export never leaves a half written file behind
+    that the checkpoint counts. Activity fields other than
+    ``ITINERARY_FIELDS`` are not exported; NDJSON keeps everything.
+    """
+
+    def __init__(self, path, compression='zstd'):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError('Parquet export needs pyarrow: pip install pyarrow') from None
+        self.path = path
+        self.compression = compression
+        self._pa = pyarrow
+        self._pq = pyarrow.parquet
+        self._schema = _arrow_schema(pyarrow)
+        self._part = 0
+
+    def open(self, position=None):
+        """Create the directory; ``position`` is the next part number when resuming."""
+        os.makedirs(self.path, exist_ok=True)
+        self._part = position or 0
+
+    def _row(self, item):
+        row = {name: _text(item.get(name)) for name in TRIP_ATTRIBUTES}
+        row['locations'] = [_text(location) for location in item.get('locations') or ()]
+        row['itinerary'] = [{name: _text(activity.get(name)) for name in ITINERARY_FIELDS}
+                            for activity in item.get('itinerary') or ()]
+        extra = {name: value for name, value in item.items() if name not in TRIP_ATTRIBUTES}
+        row['extra'] = _text(extra) if extra else None
+        return row
+
+    def write_row_group(self, items):
+        table = self._pa.Table.from_pylist([self._row(item) for item in items],
+                                           schema=self._schema)
+        path = os.path.join(self.path, f'part-{self._part:05d}.parquet')
+        self._pq.write_table(table, path, compression=self.compression)
+        self._part += 1
+        return os.path.getsize(path), self._part
+
+    def close(self):
+        pass
+
+
+WRITERS = {'ndjson': NDJSONWriter, 'parquet': ParquetWriter}
+
+
+def _load_checkpoint(path):
+    if path is None or not os.path.exists(path):
+        return None
+    with open(path) as f:
+        # numbers in the key stay Decimal, as boto3 expects
+        checkpoint = json.load(f, parse_float=Decimal, parse_int=Decimal)
+    items, pages, row_groups, written, seconds = checkpoint['stats']
+    checkpoint['stats'] = ExportStats(int(items), int(pages), int(row_groups),
+                                      int(written), float(seconds))
+    if checkpoint['position'] is not None:
+        checkpoint['position'] = int(checkpoint['position'])
+    return checkpoint
+
+
+def _save_checkpoint(path, checkpoint):
+    # write then rename, so a crash never leaves a half written checkpoint
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump(checkpoint, f, default=_json_default)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+def _pages(table_name, table, total_segments, limiter, start_key, scan_kwargs):
+    from trips.scan import parallel_scan_pages, scan_pages
+
+    if total_segments > 1:
+        table_factory = (lambda: table) if table is not None else None
+        return parallel_scan_pages(table_name, total_segments,
+                                   table_factory=table_factory, limiter=limiter,
+                                   **scan_kwargs)
+    if start_key is not None:
+        scan_kwargs = dict(scan_kwargs, ExclusiveStartKey=start_key)
+    if table is None:
+        from trips.session import get_table
+        table = get_table(table_name)
+    return scan_pages(table, limiter=limiter, **scan_kwargs)
+
+
+def export_table(path, format='ndjson', table_name=TABLE_NAME, table=None,
+                 row_group_size=10000, checkpoint_path=None, total_segments=1,
+                 limiter=None, on_progress=None, codec=None, **scan_kwargs):
+    """Export every item of the table to ``path``; returns the final ``ExportStats``.
+
+    ``format`` is ``'ndjson'`` or ``'parquet'``. ``table`` defaults to the
+    shared ``trips.session`` table for ``table_name``. Row groups are cut at
+    page boundaries once ``row_group_size`` items are buffered. With
+    ``checkpoint_path`` set, progress is saved after each row group and an
+    interrupted export resumes from it. ``limiter`` keeps the scan within a
+    read capacity budget (see ``trips.limiter``), and ``on_progress`` is
+    called with the running ``ExportStats`` after each row group.
+    ``codec`` decompresses the attributes it covers, and defaults to an
+    ``AttributeCodec`` for ``COMPRESSED_ATTRIBUTES``.
+    ``scan_kwargs`` go to every scan call (FilterExpression, projections, ...).
+    """
+    if total_segments > 1 and checkpoint_path:
+        raise ValueError('parallel exports cannot be checkpointed')
+    checkpoint = _load_checkpoint(checkpoint_path)
+    if checkpoint and checkpoint['done']:
+        return checkpoint['stats']
+    writer = WRITERS[format](path)
+    codec = codec or AttributeCodec()
+
+    items = pages = row_groups = written = 0
+    start_key = position = None
+    if checkpoint:
+        items, pages, row_groups, written, _ = checkpoint['stats']
+        start_key, position = checkpoint['last_key'], checkpoint['position']
+    start = time.perf_counter()
+    elapsed = checkpoint['stats'][4] if checkpoint else 0.0
+
+    def stats():
+        return ExportStats(items, pages, row_groups, written,
+                           elapsed + time.perf_counter() - start)
+
+    writer.open(position)
+    try:
+        buffer = []
+        last_key = start_key
+        for page in _pages(table_name, table, total_segments, limiter, start_key,
+                           scan_kwargs):
+            pages += 1
+            buffer.extend(codec.decode_item(item) for item in page.get('Items', []))
+            last_key = page.get('LastEvaluatedKey')
+            if len(buffer) >= row_group_size or not last_key:
+                if buffer:
+                    size, position = writer.write_row_group(buffer)
+                    items += len(buffer)
+                    row_groups += 1
+                    written += size
+                    buffer = []
+                if checkpoint_path:
+                    _save_checkpoint(checkpoint_path, {
+                        'last_key': last_key,
+                        'position': position,
+                        'stats': list(stats()),
+                        'done': not last_key,
+                    })
+                if on_progress:
+                    on_progress(stats())
+        if buffer:
+            # a parallel scan has no last page to close the final row group
+            size, position = writer.write_row_group(buffer)
+            items += len(buffer)
+            row_groups += 1
+            written += size
+    finally:
+        writer.close()
+    return stats()
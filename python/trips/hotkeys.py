@@ -0,0 +1,289 @@
+"""Hot partition detection with streaming frequency sketches.
+
+The trips table is partitioned on ``user_id``, and a single partition can
+only serve so many reads and writes per second. A handful of very active
+users can get their partition throttled while the rest of the table is
+idle. ``HotKeyTracker`` watches the partition key of every get, query and
+update, in constant memory and a few hash operations per request:
+
+- a count-min sketch per time window estimates how often any key was seen;
+  it never underestimates, and for independent hash functions overestimates
+  by at most ``e * requests / width`` with probability ``1 - e**-depth``.
+  Here all rows derive from one ``hash()`` split in two (double hashing), so
+  take that as a guide rather than a guarantee
+- a SpaceSaving summary of the ``top_k`` most frequent keys remembers which
+  keys to look at, since a sketch can count keys but cannot list them
+
+Rates are estimated over a sliding ``window`` of seconds from the current
+and previous windows' sketches. Keys above ``hot_rate`` requests per second
+are hot.
+
+Keys are fed with ``record(key)``, by attaching the tracker to a client's
+botocore events (``attach(client)``), or as a write listener. A
+``HotKeyRouter`` goes a step further and serves reads of hot users from
+``TripCache``/``UserTripsCache``, and every other read from the table.
+"""
+
+import re
+import threading
+import time
+
+from trips import TABLE_NAME
+
+# the operations ``attach`` records, and the names they are counted under
+TRACKED_OPERATIONS = {
+    'GetItem': 'get',
+    'Query': 'query',
+    'PutItem': 'put',
+    'UpdateItem': 'update',
+    'DeleteItem': 'delete',
+}
+
+
+class CountMinSketch:
+    """Approximate counts of keys in ``width`` x ``depth`` counters."""
+
+    def __init__(self, width=2048, depth=4):
+        self.width = width
+        self.depth = depth
+        self.total = 0
+        self._rows = [[0] * width for _ in range(depth)]
+
+    def _indexes(self, key):
+        # one hash, split into two, gives every row its own index; the rows
+        # are not independent, which weakens the textbook error bound
+        value = hash(key)
+        low = value & 0xFFFFFFFF
+        high = ((value >> 32) & 0xFFFFFFFF) | 1
+        return [(low + row * high) % self.width for row in range(self.depth)]
+
+    def add(self, key, count=1):
+        self.total += count
+        for row, index in zip(self._rows, self._indexes(key)):
+            row[index] += count
+
+    def estimate(self, key):
+        return min(row[index] for row, index in zip(self._rows, self._indexes(key)))
+
+
+class SpaceSaving:
+    """The approximately ``size`` most frequent keys, with their counts.
+
+    Each key's count is an overestimate by at most its ``error``.
+    """
+
+    def __init__(self, size=32):
+        self.size = size
+        # key -> [count, error]
+        self._counters = {}
+
+    def add(self, key, count=1):
+        counter = self._counters.get(key)
+        if counter is not None:
+            counter[0] += count
+            return
+        if len(self._counters) < self.size:
+            self._counters[key] = [count, 0]
+            return
+        # replace the least frequent key, which the new one may have outnumbered
+        smallest = min(self._counters, key=lambda k: self._counters[k][0])
+        floor = self._counters.pop(smallest)[0]
+        self._counters[key] = [floor + count, floor]
+
+    def keys(self):
+        return list(self._counters)
+
+    def top(self, count=None):
+        """Return ``(key, count, error)`` tuples, most frequent first."""
+        ranked = sorted(((key, c, e) for key, (c, e) in self._counters.items()),
+                        key=lambda entry: entry[1], reverse=True)
+        return ranked[:count]
+
+
+class HotKeyTracker:
+    """Tracks request rates per partition key and reports the hot ones."""
+
+    def __init__(self, window=60.0, hot_rate=50.0, top_k=32, width=2048, depth=4,
+                 clock=time.monotonic):
+        self.window = window
+        self.hot_rate = hot_rate
+        self.top_k = top_k
+        self.width = width
+        self.depth = depth
+        self.clock = clock
+        self.operations = {}
+        self._lock = threading.Lock()
+        self._started = clock()
+        self._current = CountMinSketch(width, depth)
+        self._previous = CountMinSketch(width, depth)
+        self._heavy = SpaceSaving(top_k)
+        self._previous_heavy = []
+
+    def _rotate(self, now):
+        # start new windows once the current one is over
+        elapsed = now - self._started
+        if elapsed < self.window:
+            return
+        if elapsed < 2 * self.window:
+            self._previous, self._previous_heavy = self._current, self._heavy.keys()
+            self._started += self.window
+        else:
+            # nothing was recorded for a whole window
+            self._previous, self._previous_heavy = CountMinSketch(self.width, self.depth), []
+            self._started = now
+        self._current = CountMinSketch(self.width, self.depth)
+        self._heavy = SpaceSaving(self.top_k)
+
+    def record(self, key, operation='get', count=1):
+        """Count ``count`` requests of ``operation`` to partition ``key``."""
+        with self._lock:
+            self._rotate(self.clock())
+            self._current.add(key, count)
+            self._heavy.add(key, count)
+            self.operations[operation] = self.operations.get(operation, 0) + count
+
+    def _rate(self, key, now):
+        # weight the previous window by how much of it is still in the slide
+        overlap = max(0.0, 1.0 - (now - self._started) / self.window)
+        count = self._current.estimate(key) + overlap * self._previous.estimate(key)
+        return count / self.window
+
+    def rate(self, key):
+        """Estimated requests per second to ``key`` over the last window."""
+        with self._lock:
+            now = self.clock()
+            self._rotate(now)
+            return self._rate(key, now)
+
+    def is_hot(self, key):
+        return self.rate(key) >= self.hot_rate
+
+    def hot_keys(self, min_rate=None):
+        """Return ``(key, rate)`` of keys at or above ``min_rate``, hottest first."""
+        min_rate = self.hot_rate if min_rate is None else min_rate
+        with self._lock:
+            now = self.clock()
+            self._rotate(now)
+            candidates = set(self._heavy.keys()) | set(self._previous_heavy)
+            rates = [(key, self._rate(key, now)) for key in candidates]
+        return sorted([(key, rate) for key, rate in rates if rate >= min_rate],
+                      key=lambda entry: entry[1], reverse=True)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'requests': self._current.total,
+                'operations': dict(self.operations),
+                'top': [(key, count) for key, count, _ in self._heavy.top(5)],
+            }
+
+    # write listener
+
+    def trip_changed(self, old_trip, new_trip):
+        trip = new_trip or old_trip
+        self.record(trip['user_id'], 'update')
+
+    # botocore events
+
+    def attach(self, client, table_name=TABLE_NAME, partition_key='user_id'):
+        """Record the partition key of every call a service client makes.
+
+        Covers GetItem, PutItem, UpdateItem and DeleteItem through their
+        key, and Query through an equality test on ``partition_key`` in the
+        key condition. Returns False for clients without botocore events.
+        """
+        events = getattr(client.meta, 'events', None)
+        if events is None:
+            return False
+
+        def on_params(params, model, **kwargs):
+            if params.get('TableName') != table_name:
+                return
+            key = _partition_value(model.name, params, partition_key)
+            if key is not None:
+                self.record(key, TRACKED_OPERATIONS[model.name])
+
+        for operation in TRACKED_OPERATIONS:
+            events.register(f'provide-client-params.dynamodb.{operation}', on_params)
+        return True
+
+
+def _plain(value):
+    # DynamoDB JSON ({'S': 'tucker'}) from service client calls
+    if isinstance(value, dict) and len(value) == 1:
+        return next(iter(value.values()))
+    return value
+
+
+def _condition_value(condition, partition_key):
+    # find "partition_key = value" in a boto3 condition object
+    expression = condition.get_expression()
+    values = expression['values']
+    if expression['operator'] == 'AND':
+        return (_condition_value(values[0], partition_key) or
+                _condition_value(values[1], partition_key))
+    if expression['operator'] == '=' and getattr(values[0], 'name', None) == partition_key:
+        return values[1]
+    return None
+
+
+def _partition_value(operation, params, partition_key):
+    if operation == 'PutItem':
+        return _plain(params.get('Item', {}).get(partition_key))
+    if operation != 'Query':
+        return _plain(params.get('Key', {}).get(partition_key))
+    condition = params.get('KeyConditionExpression')
+    if hasattr(condition, 'get_expression'):
+        return _condition_value(condition, partition_key)
+    if isinstance(condition, str):
+        names = params.get('ExpressionAttributeNames', {})
+        values = params.get('ExpressionAttributeValues', {})
+        for name, placeholder in re.findall(r'(#?\w+)\s*=\s*(:\w+)', condition):
+            if names.get(name, name) == partition_key:
+                return _plain(values.get(placeholder))
+    return None
+
+
+class HotKeyRouter:
+    """Serves the reads of hot users from caches, and other reads from the table.
+
+    Every read is recorded in ``tracker``. Pass the router as a write
+    listener instead of the caches: it records the update and keeps the
+    caches in step. Don't also ``attach`` the tracker to the client behind
+    ``table``, or every read is counted twice.
+    """
+
+    def __init__(self, tracker, trip_cache=None, user_trips_cache=None):
+        self.tracker = tracker
+        self.trip_cache = trip_cache
+        self.user_trips_cache = user_trips_cache
+
+    def get_trip(self, table, user_id, trip_id):
+        """Return a trip item, or None if it does not exist."""
+        self.tracker.record(user_id, 'get')
+        if self.trip_cache is not None and self.tracker.is_hot(user_id):
+            return self.trip_cache.get_trip(table, user_id, trip_id)
+        return table.get_item(Key={'user_id': user_id, 'trip_id': trip_id}).get('Item')
+
+    def query_trips(self, table, user_id):
+        """Return every trip of a user."""
+        self.tracker.record(user_id, 'query')
+        if self.user_trips_cache is not None and self.tracker.is_hot(user_id):
+            return self.user_trips_cache.query_trips(table, user_id)
+        from boto3.dynamodb.conditions import Key
+
+        query_kwargs = {'KeyConditionExpression': Key('user_id').eq(user_id)}
+        trips = []
+        while True:
+            db_resp = table.query(**query_kwargs)
+            trips.extend(db_resp['Items'])
+            last_key = db_resp.get('LastEvaluatedKey')
+            if not last_key:
+                return trips
+            query_kwargs['ExclusiveStartKey'] = last_key
+
+    def trip_changed(self, old_trip, new_trip):
+        self.tracker.trip_changed(old_trip, new_trip)
+        for cache in (self.trip_cache, self.user_trips_cache):
+            if cache is not None:
+                cache.trip_changed(old_trip, new_trip)
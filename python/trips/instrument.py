@@ -0,0 +1,245 @@
+"""Consumed capacity and latency instrumentation through botocore events.
+
+``Instrumentation.attach(client)`` hooks into a client's event system:
+
+- before each call, it sets ``ReturnConsumedCapacity='TOTAL'`` so DynamoDB
+  reports the capacity units the call used, unless the caller already
+  asked for something else
+- after each call, it records the latency (including botocore's own
+  retries), the read or write capacity units consumed, the item counts,
+  the number of retries and the response size
+
+Stats are kept per operation (GetItem, Query, Scan, PutItem, UpdateItem,
+and the batch and delete calls) and read with ``snapshot()``, or written out
+every few seconds by ``start_dump()``. Resource clients are instrumented
+through their service client: ``attach(trips_table.meta.client)``.
+"""
+
+import json
+import threading
+import time
+
+# operations that accept ReturnConsumedCapacity, and what they consume
+READ_OPERATIONS = {'GetItem', 'Query', 'Scan', 'BatchGetItem'}
+WRITE_OPERATIONS = {'PutItem', 'UpdateItem', 'DeleteItem', 'BatchWriteItem'}
+
+# latency histogram bucket upper bounds, in milliseconds
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000,
+                      float('inf'))
+
+
+def _label(bound):
+    # JSON has no infinity; the last bucket is "over the largest bound"
+    return bound if bound != float('inf') else f'>{LATENCY_BUCKETS_MS[-2]}'
+
+
+class OperationStats:
+    """Running totals and a latency histogram for one operation."""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.capacity_units = 0.0
+        self.items = 0
+        self.scanned = 0
+        self.response_bytes = 0
+        self.latency_ms = 0.0
+        self.buckets = [0] * len(LATENCY_BUCKETS_MS)
+
+    def add_latency(self, latency_ms):
+        self.latency_ms += latency_ms
+        for i, bound in enumerate(LATENCY_BUCKETS_MS):
+            if latency_ms <= bound:
+                self.buckets[i] += 1
+                return
+
+    def percentile(self, percent):
+        """Return the upper bound of the bucket holding the percentile, in ms.
+
+        That is ``float('inf')`` for latencies over the largest bound.
+        """
+        total = sum(self.buckets)
+        if not total:
+            return 0.0
+        rank = percent / 100 * total
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS_MS, self.buckets):
+            seen += count
+            if seen >= rank:
+                return bound
+        return LATENCY_BUCKETS_MS[-1]
+
+    def as_dict(self):
+        calls = self.calls or 1
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'retries': self.retries,
+            'capacity_units': round(self.capacity_units, 2),
+            'items': self.items,
+            'scanned': self.scanned,
+            'response_bytes': self.response_bytes,
+            'mean_ms': round(self.latency_ms / calls, 3),
+            # a bound, or '>5000' in the last bucket
+            'p50_ms': _label(self.percentile(50)),
+            'p95_ms': _label(self.percentile(95)),
+            'p99_ms': _label(self.percentile(99)),
+            'histogram': {str(_label(bound)): count
+                          for bound, count in zip(LATENCY_BUCKETS_MS, self.buckets)},
+        }
+
+
+def _capacity_units(consumed):
+    # ConsumedCapacity is a dict, or a list of them for batch calls
+    if not consumed:
+        return 0.0
+    if isinstance(consumed, dict):
+        consumed = [consumed]
+    return sum(entry.get('CapacityUnits', 0.0) for entry in consumed)
+
+
+def _item_counts(operation, parsed):
+    if operation in ('Query', 'Scan'):
+        return parsed.get('Count', 0), parsed.get('ScannedCount', 0)
+    if operation == 'GetItem':
+        found = 1 if 'Item' in parsed else 0
+        return found, found
+    if operation == 'BatchGetItem':
+        found = sum(len(items) for items in parsed.get('Responses', {}).values())
+        return found, found
+    return 0, 0
+
+
+def _response_bytes(http_response):
+    length = http_response.headers.get('content-length')
+    if length is not None:
+        return int(length)
+    try:
+        return len(http_response.content or b'')
+    except AttributeError:
+        # stubbed responses have no body stream
+        return 0
+
+
+class Instrumentation:
+    """Collects per-operation DynamoDB stats from instrumented clients."""
+
+    def __init__(self):
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._dumper = None
+
+    def attach(self, client):
+        """Instrument a service client; returns False if it has no events.
+
+        Clients without a botocore event system, like the local engine in
+        ``trips.local``, are left as they are.
+        """
+        events = getattr(client.meta, 'events', None)
+        if events is None:
+            return False
+        for operation in READ_OPERATIONS | WRITE_OPERATIONS:
+            events.register(f'provide-client-params.dynamodb.{operation}',
+                            self._request_capacity)
+        events.register('before-call.dynamodb', self._before_call)
+        events.register('after-call.dynamodb', self._after_call)
+        events.register('after-call-error.dynamodb', self._after_call_error)
+        return True
+
+    # event handlers
+
+    def _request_capacity(self, params, **kwargs):
+        params.setdefault('ReturnConsumedCapacity', 'TOTAL')
+
+    def _before_call(self, model, context, **kwargs):
+        context['trips_started'] = time.perf_counter()
+        # after-call-error is only given the exception and the context
+        context['trips_operation'] = model.name
+
+    def _operation(self, name):
+        stats = self._stats.get(name)
+        if stats is None:
+            stats = self._stats.setdefault(name, OperationStats())
+        return stats
+
+    def _latency_ms(self, context):
+        started = context.get('trips_started')
+        return (time.perf_counter() - started) * 1000 if started else 0.0
+
+    def _after_call(self, http_response, parsed, model, context, **kwargs):
+        latency_ms = self._latency_ms(context)
+        items, scanned = _item_counts(model.name, parsed)
+        with self._lock:
+            stats = self._operation(model.name)
+            stats.calls += 1
+            if 'Error' in parsed:
+                stats.errors += 1
+            stats.add_latency(latency_ms)
+            stats.capacity_units += _capacity_units(parsed.get('ConsumedCapacity'))
+            stats.items += items
+            stats.scanned += scanned
+            stats.retries += parsed.get('ResponseMetadata', {}).get('RetryAttempts', 0)
+            stats.response_bytes += _response_bytes(http_response)
+
+    def _after_call_error(self, exception, context, **kwargs):
+        name = context.get('trips_operation')
+        if name is None:
+            return
+        latency_ms = self._latency_ms(context)
+        with self._lock:
+            stats = self._operation(name)
+            stats.calls += 1
+            stats.errors += 1
+            stats.add_latency(latency_ms)
+
+    # reporting
+
+    def snapshot(self):
+        """Return the stats so far, per operation, plus RCU/WCU totals."""
+        with self._lock:
+            operations = {name: stats.as_dict() for name, stats in self._stats.items()}
+        return {
+            'operations': operations,
+            'read_capacity_units': round(sum(
+                stats['capacity_units'] for name, stats in operations.items()
+                if name in READ_OPERATIONS), 2),
+            'write_capacity_units': round(sum(
+                stats['capacity_units'] for name, stats in operations.items()
+                if name in WRITE_OPERATIONS), 2),
+        }
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+    def start_dump(self, interval=60.0, path=None, logger=None):
+        """Write a snapshot every ``interval`` seconds until ``stop_dump()``.
+
+        Snapshots are appended to ``path`` as JSON lines, or logged at INFO
+        level on ``logger``, or printed if neither is given.
+        """
+        self.stop_dump()
+        stop = threading.Event()
+
+        def dump():
+            while not stop.wait(interval):
+                line = json.dumps(dict(self.snapshot(), time=time.time()))
+                if path:
+                    with open(path, 'a') as f:
+                        f.write(line + '\n')
+                elif logger:
+                    logger.info(line)
+                else:
+                    print(line)
+
+        thread = threading.Thread(target=dump, name='trips-stats-dump', daemon=True)
+        thread.start()
+        self._dumper = (stop, thread)
+
+    def stop_dump(self):
+        if self._dumper:
+            stop, thread = self._dumper
+            stop.set()
+            thread.join()
+            self._dumper = None
@@ -0,0 +1,260 @@
+"""Incremental itinerary updates.
+
+Setting ``itinerary = :itinerary`` sends the whole list on every change, even
+to add one activity. ``itinerary_patch`` compares the old and new lists with
+``difflib`` and builds the smallest update it can:
+
+- activities added at the end: ``SET #it = list_append(#it, :added)``
+- changed fields of an activity: ``SET #it[2].#f0 = :v0``, and
+  ``REMOVE #it[2].#f1`` for fields that were dropped
+- removed activities: ``REMOVE #it[3]``
+
+DynamoDB resolves every list index against the item as it was before the
+update, so all the actions can go in one call. An activity inserted in the
+middle of the list would shift every index after it, so in that case the
+patch falls back to setting the whole list.
+
+Each patch carries a condition on the list size and on the old values it
+touches: if another writer added or removed activities, or changed the ones
+this patch touches, in the meantime, the update fails with
+``ConditionalCheckFailedException`` instead of mixing the two edits, and the
+caller can read the trip again and retry.
+
+Note that DynamoDB bills an update by the size of the whole item, so a patch
+saves request size and bandwidth, not write capacity units.
+
+Through a ``CompressedTable`` whose codec stores the itinerary compressed,
+DynamoDB sees a single binary value, not a list, so ``patch_itinerary``
+sets the whole (compressed) itinerary instead, guarded by the trip's
+``updated_at`` stamp.
+"""
+
+import json
+from difflib import SequenceMatcher
+
+from trips.codec import CompressedTable
+from trips.writes import UPDATED_AT, UPDATED_DAY, _notify, write_stamp
+
+# longest update or condition expression DynamoDB accepts, in bytes
+MAX_EXPRESSION_LENGTH = 4096
+
+_MISSING = object()
+
+
+def _entry_key(entry):
+    # dicts are not hashable; compare activities by their JSON form
+    return json.dumps(entry, sort_keys=True, default=str)
+
+
+class _Builder:
+    # collects actions, conditions and their placeholders
+
+    def __init__(self, attribute):
+        self.names = {'#it': attribute}
+        self.values = {}
+        self.set = []
+        self.remove = []
+        self.conditions = []
+
+    def name(self, field):
+        placeholder = f'#f{len(self.names) - 1}'
+        self.names[placeholder] = field
+        return placeholder
+
+    def value(self, value):
+        placeholder = f':p{len(self.values)}'
+        self.values[placeholder] = value
+        return placeholder
+
+    def edit(self, index, old_entry, new_entry):
+        for field in sorted(set(old_entry) | set(new_entry), key=str):
+            if old_entry.get(field, _MISSING) == new_entry.get(field, _MISSING):
+                continue
+            path = f'#it[{index}].{self.name(field)}'
+            if field in new_entry:
+                self.set.append(f'{path} = {self.value(new_entry[field])}')
+            else:
+                self.remove.append(path)
+            if field in old_entry:
+                self.conditions.append(f'{path} = {self.value(old_entry[field])}')
+            else:
+                self.conditions.append(f'attribute_not_exists({path})')
+
+    def replace(self, index, old_entry, new_entry):
+        self.set.append(f'#it[{index}] = {self.value(new_entry)}')
+        self.conditions.append(f'#it[{index}] = {self.value(old_entry)}')
+
+    def delete(self, index, old_entry):
+        self.remove.append(f'#it[{index}]')
+        self.conditions.append(f'#it[{index}] = {self.value(old_entry)}')
+
+    def append(self, start, entries):
+        if not entries:
+            return
+        if self.set or self.remove:
+            # list_append would overlap with the indexed paths, which
+            # DynamoDB rejects; setting an index past the end appends too
+            for offset, entry in enumerate(entries):
+                self.set.append(f'#it[{start + offset}] = {self.value(entry)}')
+        else:
+            self.set.append(f'#it = list_append(#it, {self.value(list(entries))})')
+
+    def arguments(self, old_size):
+        clauses = []
+        if self.set:
+            clauses.append('SET ' + ', '.join(self.set))
+        if self.remove:
+            clauses.append('REMOVE ' + ', '.join(self.remove))
+        conditions = [f'size(#it) = {self.value(old_size)}'] + self.conditions
+        return {
+            'UpdateExpression': ' '.join(clauses),
+            'ConditionExpression': ' AND '.join(conditions),
+            'ExpressionAttributeNames': self.names,
+            'ExpressionAttributeValues': self.values,
+        }
+
+
+def _full_set(old, new, attribute):
+    # replace the whole list, still guarded against concurrent changes
+    condition = ('attribute_not_exists(#it)' if old is None
+                 else '#it = :old')
+    values = {':itinerary': list(new)}
+    if old is not None:
+        values[':old'] = list(old)
+    return {
+        'UpdateExpression': 'SET #it = :itinerary',
+        'ConditionExpression': condition,
+        'ExpressionAttributeNames': {'#it': attribute},
+        'ExpressionAttributeValues': values,
+    }
+
+
+def itinerary_patch(old, new, attribute='itinerary'):
+    """Return update_item arguments that turn list ``old`` into ``new``.
+
+    ``old`` is the list as last read (``None`` if the trip has no itinerary
+    yet). Returns ``None`` when the lists are equal. The arguments include a
+    ``ConditionExpression`` guarding against concurrent edits.
+    """
+    new = list(new)
+    if old is None or not old:
+        return _full_set(old, new, attribute) if new or old is None else None
+    old = list(old)
+
+    matcher = SequenceMatcher(None, [_entry_key(entry) for entry in old],
+                              [_entry_key(entry) for entry in new], autojunk=False)
+    builder = _Builder(attribute)
+    appended = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            continue
+        paired = min(i2 - i1, j2 - j1) if tag == 'replace' else 0
+        for offset in range(paired):
+            old_entry, new_entry = old[i1 + offset], new[j1 + offset]
+            if isinstance(old_entry, dict) and isinstance(new_entry, dict):
+                builder.edit(i1 + offset, old_entry, new_entry)
+            else:
+                builder.replace(i1 + offset, old_entry, new_entry)
+        for index in range(i1 + paired, i2):
+            builder.delete(index, old[index])
+        if j1 + paired < j2:
+            if i2 != len(old):
+                # an insert in the middle shifts every index after it
+                return _full_set(old, new, attribute)
+            appended.extend(new[j1 + paired:j2])
+    builder.append(len(old), appended)
+
+    if not builder.set and not builder.remove:
+        return None
+    arguments = builder.arguments(len(old))
+    if (len(arguments['UpdateExpression']) > MAX_EXPRESSION_LENGTH or
+            len(arguments['ConditionExpression']) > MAX_EXPRESSION_LENGTH):
+        return _full_set(old, new, attribute)
+    return arguments
+
+
+def _compressed_codec(table, attribute, *itineraries):
+    # the codec of a CompressedTable that stores any of the lists compressed
+    if not isinstance(table, CompressedTable) or attribute not in table.codec.attributes:
+        return None
+    for itinerary in itineraries:
+        if itinerary is not None and isinstance(table.codec.encode_value(itinerary), bytes):
+            return table.codec
+    return None
+
+
+def _compressed_set(codec, trip, new, attribute='itinerary'):
+    # set the whole list, which the table compresses; conditions can't look
+    # inside a compressed value, so guard on the write stamp when there is one
+    # (to the millisecond), rather than on bytes another zlib may not match
+    old = trip.get(attribute)
+    arguments = {
+        'UpdateExpression': 'SET #it = :itinerary',
+        'ExpressionAttributeNames': {'#it': attribute},
+        'ExpressionAttributeValues': {':itinerary': new},
+    }
+    if trip.get(UPDATED_AT):
+        arguments['ConditionExpression'] = '#ua = :seen'
+        arguments['ExpressionAttributeNames']['#ua'] = UPDATED_AT
+        arguments['ExpressionAttributeValues'][':seen'] = trip[UPDATED_AT]
+    elif old is None:
+        arguments['ConditionExpression'] = 'attribute_not_exists(#it)'
+    else:
+        # the stored value, as this codec would have written it
+        arguments['ConditionExpression'] = '#it = :old'
+        arguments['ExpressionAttributeValues'][':old'] = codec.encode_value(old)
+    return arguments
+
+
+def _stamped(arguments):
+    # add the write stamp to the SET clause of an update; returns the new
+    # arguments and the stamp
+    stamp = write_stamp()
+    arguments = dict(arguments)
+    arguments['ExpressionAttributeNames'] = dict(
+        arguments['ExpressionAttributeNames'], **{'#ua': UPDATED_AT, '#ud': UPDATED_DAY})
+    arguments['ExpressionAttributeValues'] = dict(
+        arguments['ExpressionAttributeValues'],
+        **{':ua': stamp[UPDATED_AT], ':ud': stamp[UPDATED_DAY]})
+    expression = arguments['UpdateExpression']
+    if expression.startswith('SET '):
+        expression = 'SET #ua = :ua, #ud = :ud, ' + expression[len('SET '):]
+    else:
+        expression = 'SET #ua = :ua, #ud = :ud ' + expression
+    arguments['UpdateExpression'] = expression
+    return arguments, stamp
+
+
+def patch_itinerary(table, trip, new_itinerary, listeners=()):
+    """Update the itinerary of ``trip`` (as last read) to ``new_itinerary``.
+
+    Sends only the differences (see ``itinerary_patch``) and notifies
+    ``listeners`` like the other write helpers. Raises the ClientError
+    ``ConditionalCheckFailedException`` if the itinerary is no longer the
+    one in ``trip``. Returns the update_item response, or ``None`` if there
+    was nothing to change.
+
+    Nothing is returned by DynamoDB, not even the new itinerary, so the
+    patch saves bandwidth both ways; the listeners get ``trip`` with the new
+    itinerary and write stamp. On a ``CompressedTable`` that stores the
+    itinerary compressed, the whole itinerary is set instead of a patch.
+    """
+    new_itinerary = list(new_itinerary)
+    old_itinerary = trip.get('itinerary')
+    codec = _compressed_codec(table, 'itinerary', old_itinerary, new_itinerary)
+    if codec is None:
+        arguments = itinerary_patch(old_itinerary, new_itinerary)
+    elif old_itinerary != new_itinerary:
+        arguments = _compressed_set(codec, trip, new_itinerary)
+    else:
+        arguments = None
+    if arguments is None:
+        return None
+    arguments, stamp = _stamped(arguments)
+    db_resp = table.update_item(
+        Key={'user_id': trip['user_id'], 'trip_id': trip['trip_id']},
+        **arguments
+    )
+    # the condition held, so ``trip`` is what the itinerary was before
+    _notify(listeners, trip, dict(trip, itinerary=new_itinerary, **stamp))
+    return db_resp
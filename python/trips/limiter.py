@@ -0,0 +1,185 @@
+"""Client-side capacity budgets for background scans and bulk writes.
+
+A full table scan or a bulk load can use up a table's provisioned capacity
+and get the user facing ``get_item`` calls throttled with it. A
+``CapacityLimiter`` is a token bucket filled in capacity units per second
+(RCUs for reads, WCUs for writes), meant to keep such jobs under a budget:
+
+- ``wait()`` blocks while the bucket is in debt
+- ``consume(units)`` takes the capacity a call really used, read from the
+  ``ConsumedCapacity`` DynamoDB returns with ``ReturnConsumedCapacity``
+- ``throttled()`` halves the rate when DynamoDB throttles anyway, and every
+  call that goes through adds a little back, up to the budget (additive
+  increase, multiplicative decrease)
+
+botocore retries throttled requests itself (see ``trips.session``), so most
+throttles never surface as exceptions. ``call()`` therefore also counts a
+response that needed retries (``RetryAttempts`` above 0) as throttled.
+
+The cost of a call is only known once it returns, so the bucket is allowed
+to go into debt, and the next call waits until it has been paid back.
+
+Budgets are set per job class with ``set_budget('scan', 50)`` and shared by
+every job of that class through ``get_limiter('scan')``. ``scan_pages``,
+``parallel_scan_pages``, ``write_batch`` and ``batch_put_trips`` take a
+``limiter`` argument.
+"""
+
+import threading
+import time
+
+# capacity units per second for each job class, when nothing else is set
+DEFAULT_BUDGETS = {
+    'scan': 100.0,       # scans and exports, in RCUs
+    'bulk-load': 100.0,  # batch loads, in WCUs
+}
+
+# read units per item for an eventually consistent read of an item up to 4 KB,
+# used when a response carries no ConsumedCapacity (like the local engine)
+EVENTUALLY_CONSISTENT_READ_UNITS = 0.5
+
+
+def consumed_units(response, default=0.0):
+    """Return the capacity units a response reports, summed over its tables.
+
+    Without ``ConsumedCapacity``, scan and query pages are estimated from
+    their ``ScannedCount``; anything else counts as ``default``.
+    """
+    consumed = response.get('ConsumedCapacity')
+    if consumed is None:
+        if 'ScannedCount' in response:
+            return response['ScannedCount'] * EVENTUALLY_CONSISTENT_READ_UNITS
+        return default
+    if isinstance(consumed, dict):
+        consumed = [consumed]
+    return sum(table.get('CapacityUnits', 0.0) for table in consumed)
+
+
+def is_throttling(error):
+    """Return True if ``error`` is DynamoDB pushing back on capacity."""
+    from botocore.exceptions import ClientError
+
+    return isinstance(error, ClientError) and error.response.get('Error', {}).get(
+        'Code') in ('ProvisionedThroughputExceededException', 'ThrottlingException',
+                    'RequestLimitExceeded')
+
+
+class CapacityLimiter:
+    """Token bucket of capacity units, adapting its rate to throttling.
+
+    ``rate`` is the budget in units per second and ``burst`` the most units
+    the bucket holds (one second's worth by default). After a throttle the
+    rate is multiplied by ``decrease``, never below ``min_rate``, and each
+    call that goes through adds ``increase`` units per second back.
+    Safe to share between threads.
+    """
+
+    def __init__(self, rate, burst=None, min_rate=None, increase=None,
+                 decrease=0.5, clock=time.monotonic, sleep=time.sleep):
+        self.max_rate = float(rate)
+        self.rate = self.max_rate
+        self.burst = float(burst if burst is not None else rate)
+        self.min_rate = min_rate if min_rate is not None else self.max_rate / 20
+        self.increase = increase if increase is not None else self.max_rate / 50
+        self.decrease = decrease
+        self.consumed = 0.0
+        self.throttles = 0
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = self.burst
+        self._last = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def wait(self):
+        """Block until the bucket is out of debt. Returns the seconds waited."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 0:
+                    return waited
+                delay = -self._tokens / self.rate
+            self._sleep(delay)
+            waited += delay
+
+    def consume(self, units, increase=True):
+        """Take ``units`` from the bucket after a successful call.
+
+        ``increase=False`` leaves the rate as it is, for calls that were
+        throttled before they went through.
+        """
+        with self._lock:
+            self._refill()
+            self._tokens -= units
+            self.consumed += units
+            if increase:
+                self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def throttled(self):
+        """Cut the rate after DynamoDB throttled a call."""
+        with self._lock:
+            self.throttles += 1
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            # start again from an empty bucket, so the next call waits
+            self._tokens = min(self._tokens, 0.0)
+
+    def call(self, operation, default_units=0.0, **kwargs):
+        """Call ``operation(**kwargs)`` within the budget and return its response.
+
+        Asks for ``ReturnConsumedCapacity`` unless the caller already did,
+        charges the bucket with what the response reports (``default_units``
+        if it reports nothing) and slows down when the call is throttled,
+        whether it failed or botocore retried it until it went through.
+        A call counts once, however many retries it took.
+        """
+        kwargs.setdefault('ReturnConsumedCapacity', 'TOTAL')
+        self.wait()
+        try:
+            response = operation(**kwargs)
+        except Exception as e:
+            if is_throttling(e):
+                self.throttled()
+            raise
+        retried = response.get('ResponseMetadata', {}).get('RetryAttempts', 0) > 0
+        if retried:
+            self.throttled()
+        self.consume(consumed_units(response, default_units), increase=not retried)
+        return response
+
+    def stats(self):
+        return {
+            'rate': round(self.rate, 2),
+            'max_rate': self.max_rate,
+            'consumed': round(self.consumed, 2),
+            'throttles': self.throttles,
+        }
+
+
+_limiters = {}
+_lock = threading.Lock()
+
+
+def set_budget(job_class, rate, burst=None, **options):
+    """Set the budget of ``job_class`` in capacity units per second.
+
+    Jobs that already hold the class's limiter keep the old one; ``get_limiter``
+    returns the new one from here on.
+    """
+    with _lock:
+        _limiters[job_class] = CapacityLimiter(rate, burst, **options)
+        return _limiters[job_class]
+
+
+def get_limiter(job_class):
+    """Return the limiter shared by every job of ``job_class``."""
+    with _lock:
+        if job_class not in _limiters:
+            if job_class not in DEFAULT_BUDGETS:
+                raise KeyError(f'no budget set for job class {job_class!r}')
+            _limiters[job_class] = CapacityLimiter(DEFAULT_BUDGETS[job_class])
+        return _limiters[job_class]
@@ -0,0 +1,1034 @@
+"""In-process DynamoDB engine for the trips tables, for tests and benchmarks.
+
+``LocalTable`` answers the same calls the examples make on a boto3 table
+resource (get_item, put_item, update_item, delete_item, query, scan,
+batch_writer), so code written against the real table runs unchanged.
+``LocalDynamoDB`` holds the tables and also offers a service client
+(``LocalClient``) that speaks DynamoDB JSON, including the batch calls.
+
+Storage follows the shape of the trips table. Each partition keeps its sort
+keys in a sorted list next to a dict of items, and each global secondary
+index keeps, per index partition, a sorted list of
+``(index sort key, table partition key, table sort key)`` entries. Key
+conditions (``=``, ``<``, ``<=``, ``>``, ``>=``, ``BETWEEN``,
+``begins_with``) are answered by bisecting those lists, so a query only
+touches the items it returns.
+
+What is supported:
+
+- key, filter and condition expressions, as boto3 condition objects or as
+  expression strings with ``#name`` and ``:value`` placeholders, including
+  ``contains``, ``begins_with``, ``attribute_exists``,
+  ``attribute_not_exists``, ``size``, ``IN``, ``AND``, ``OR`` and ``NOT``
+- ``SET`` (with ``list_append``, ``if_not_exists`` and ``+``/``-``) and
+  ``REMOVE`` update actions, on nested paths like ``itinerary[1].title``
+- ``ProjectionExpression``, ``Limit``, ``ExclusiveStartKey`` /
+  ``LastEvaluatedKey``, ``ScanIndexForward``, ``Segment``/``TotalSegments``
+- ``ReturnValues`` and ``ConditionExpression`` on writes; a failed condition
+  raises the same ``ClientError`` DynamoDB would
+
+Pages stop after ``page_items`` items (standing in for DynamoDB's 1 MB
+limit), so pagination is exercised even on small tables. Items are copied
+on the way in and out, as a round trip to DynamoDB would. ``latency`` adds a
+fixed delay to every call.
+
+To run the example scripts against it, set ``TRIPS_BACKEND=local`` (and
+optionally ``TRIPS_LOCAL_DATA`` to a JSON file with a list of trips); the
+``trips.session`` factory then hands out local tables and clients.
+"""
+
+import re
+import threading
+import time
+import zlib
+from bisect import bisect_left, bisect_right, insort
+from decimal import Decimal
+from types import SimpleNamespace
+
+from trips import INDEX_NAME, TABLE_NAME
+from trips.location_index import LOCATION_INDEX_TABLE_NAME
+from trips.replica import UPDATED_INDEX_NAME
+
+# key schemas of the tables the examples use: (partition key, sort key, indexes)
+TABLE_SCHEMAS = {
+    TABLE_NAME: ('user_id', 'trip_id', {
+        INDEX_NAME: ('user_id', 'start_date'),
+        UPDATED_INDEX_NAME: ('updated_day', 'updated_at'),
+    }),
+    LOCATION_INDEX_TABLE_NAME: ('location', 'trip_ref', {}),
+}
+
+# items per page, standing in for DynamoDB's 1 MB page limit
+PAGE_ITEMS = 1000
+
+
+def _client_error(code, message, operation):
+    from botocore.exceptions import ClientError
+
+    return ClientError({'Error': {'Code': code, 'Message': message}}, operation)
+
+
+def _copy(value):
+    # a faster deepcopy for the types DynamoDB items are made of
+    if isinstance(value, dict):
+        return {name: _copy(element) for name, element in value.items()}
+    if isinstance(value, list):
+        return [_copy(element) for element in value]
+    if isinstance(value, set):
+        return set(value)
+    return value
+
+
+# --- expressions ---------------------------------------------------------
+#
+# Key, filter and condition expressions are turned into small tuples:
+#   ('cmp', op, left, right)        ('between', operand, low, high)
+#   ('in', operand, [operands])     ('func', name, [operands])
+#   ('and', a, b)  ('or', a, b)  ('not', a)
+# where operands are ('path', [segments]), ('value', value) or
+# ('size', operand). Path segments are attribute names (str) or list
+# indexes (int).
+
+_TOKEN = re.compile(r'\s*(<>|<=|>=|[=<>(),.\[\]+\-]|[#:]?[A-Za-z0-9_]+)')
+
+_FUNCTIONS = {'attribute_exists', 'attribute_not_exists', 'attribute_type',
+              'begins_with', 'contains', 'size', 'list_append', 'if_not_exists'}
+
+
+def _tokenize(text):
+    tokens = []
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = _TOKEN.match(text, position)
+        if match is None:
+            raise ValueError(f'Invalid expression: {text!r}')
+        tokens.append(match.group(1))
+        position = match.end()
+    return tokens
+
+
+class _Parser:
+    """Recursive descent parser for expression strings."""
+
+    def __init__(self, text, names, values):
+        self.tokens = _tokenize(text)
+        self.position = 0
+        self.names = names or {}
+        self.values = values or {}
+
+    def peek(self, offset=0):
+        index = self.position + offset
+        return self.tokens[index] if index < len(self.tokens) else None
+
+    def take(self, expected=None):
+        token = self.peek()
+        if token is None or (expected and token.upper() != expected):
+            raise ValueError(f'Expected {expected or "more"} at {token!r}')
+        self.position += 1
+        return token
+
+    def done(self):
+        return self.position >= len(self.tokens)
+
+    # conditions
+
+    def condition(self):
+        node = self.conjunction()
+        while self.peek() and self.peek().upper() == 'OR':
+            self.take()
+            node = ('or', node, self.conjunction())
+        return node
+
+    def conjunction(self):
+        node = self.negation()
+        while self.peek() and self.peek().upper() == 'AND':
+            self.take()
+            node = ('and', node, self.negation())
+        return node
+
+    def negation(self):
+        if self.peek() and self.peek().upper() == 'NOT':
+            self.take()
+            return ('not', self.negation())
+        return self.comparison()
+
+    def comparison(self):
+        if self.peek() == '(':
+            self.take()
+            node = self.condition()
+            self.take(')')
+            return node
+        token = self.peek()
+        if token in _FUNCTIONS and token != 'size' and self.peek(1) == '(':
+            return self.function()
+        left = self.operand()
+        token = self.peek()
+        if token in ('=', '<>', '<', '<=', '>', '>='):
+            self.take()
+            return ('cmp', token, left, self.operand())
+        if token and token.upper() == 'BETWEEN':
+            self.take()
+            low = self.operand()
+            self.take('AND')
+            return ('between', left, low, self.operand())
+        if token and token.upper() == 'IN':
+            self.take()
+            self.take('(')
+            options = [self.operand()]
+            while self.peek() == ',':
+                self.take()
+                options.append(self.operand())
+            self.take(')')
+            return ('in', left, options)
+        raise ValueError(f'Expected a comparison at {token!r}')
+
+    def function(self):
+        name = self.take()
+        self.take('(')
+        arguments = [self.operand()]
+        while self.peek() == ',':
+            self.take()
+            arguments.append(self.operand())
+        self.take(')')
+        return ('func', name, arguments)
+
+    # operands
+
+    def operand(self):
+        token = self.peek()
+        if token is None:
+            raise ValueError('Unexpected end of expression')
+        if token == 'size' and self.peek(1) == '(':
+            self.take()
+            self.take('(')
+            node = ('size', self.operand())
+            self.take(')')
+            return node
+        if token.startswith(':'):
+            self.take()
+            if token not in self.values:
+                raise ValueError(f'Missing value for {token}')
+            return ('value', self.values[token])
+        return ('path', self.path())
+
+    def path(self):
+        segments = [self.name()]
+        while self.peek() in ('.', '['):
+            if self.take() == '.':
+                segments.append(self.name())
+            else:
+                segments.append(int(self.take()))
+                self.take(']')
+        return segments
+
+    def name(self):
+        token = self.take()
+        if token.startswith('#'):
+            if token not in self.names:
+                raise ValueError(f'Missing name for {token}')
+            return self.names[token]
+        return token
+
+    # update expressions
+
+    def update(self):
+        # return {'SET': [(path, value node)], 'REMOVE': [path]}
+        actions = {'SET': [], 'REMOVE': []}
+        while not self.done():
+            clause = self.take().upper()
+            if clause not in actions:
+                raise ValueError(f'Unsupported update clause: {clause}')
+            while True:
+                path = self.path()
+                if clause == 'SET':
+                    self.take('=')
+                    actions['SET'].append((path, self.set_value()))
+                else:
+                    actions['REMOVE'].append(path)
+                if self.peek() != ',':
+                    break
+                self.take()
+        return actions
+
+    def set_value(self):
+        node = self.set_term()
+        if self.peek() in ('+', '-'):
+            return ('arith', self.take(), node, self.set_term())
+        return node
+
+    def set_term(self):
+        if self.peek() in ('list_append', 'if_not_exists') and self.peek(1) == '(':
+            name = self.take()
+            self.take('(')
+            first = self.set_value() if name == 'list_append' else ('path', self.path())
+            self.take(',')
+            second = self.set_value()
+            self.take(')')
+            return ('func', name, [first, second])
+        return self.operand()
+
+    # projections
+
+    def paths(self):
+        paths = [self.path()]
+        while self.peek() == ',':
+            self.take()
+            paths.append(self.path())
+        return paths
+
+
+def _parse_path(name):
+    # 'itinerary[0].title' -> ['itinerary', 0, 'title'], for condition objects
+    return _Parser(name, {}, {}).path()
+
+
+def _from_condition(condition):
+    # convert a boto3 condition object into the tuple form
+    from boto3.dynamodb.conditions import AttributeBase, ConditionBase, Size
+
+    def operand(value):
+        if isinstance(value, Size):
+            return ('size', operand(value.get_expression()['values'][0]))
+        if isinstance(value, AttributeBase):
+            return ('path', _parse_path(value.name))
+        if isinstance(value, ConditionBase):
+            return _from_condition(value)
+        return ('value', value)
+
+    expression = condition.get_expression()
+    operator = expression['operator']
+    values = expression['values']
+    if operator in ('AND', 'OR'):
+        return (operator.lower(), operand(values[0]), operand(values[1]))
+    if operator == 'NOT':
+        return ('not', operand(values[0]))
+    if operator in ('=', '<>', '<', '<=', '>', '>='):
+        return ('cmp', operator, operand(values[0]), operand(values[1]))
+    if operator == 'BETWEEN':
+        return ('between', operand(values[0]), operand(values[1]), operand(values[2]))
+    if operator == 'IN':
+        return ('in', operand(values[0]), [operand(value) for value in values[1]])
+    return ('func', operator, [operand(value) for value in values])
+
+
+def parse_condition(expression, names=None, values=None):
+    """Return the tuple form of a condition string or boto3 condition object."""
+    if expression is None:
+        return None
+    if not isinstance(expression, str):
+        return _from_condition(expression)
+    parser = _Parser(expression, names, values)
+    node = parser.condition()
+    if not parser.done():
+        raise ValueError(f'Unexpected {parser.peek()!r} in {expression!r}')
+    return node
+
+
+_MISSING = object()
+
+
+def _resolve(item, path):
+    value = item
+    for segment in path:
+        if isinstance(segment, int):
+            if not isinstance(value, list) or segment >= len(value):
+                return _MISSING
+        elif not isinstance(value, dict) or segment not in value:
+            return _MISSING
+        value = value[segment]
+    return value
+
+
+def _operand(node, item):
+    kind = node[0]
+    if kind == 'value':
+        return node[1]
+    if kind == 'path':
+        return _resolve(item, node[1])
+    if kind == 'size':
+        value = _operand(node[1], item)
+        return _MISSING if value is _MISSING else len(value)
+    raise ValueError(f'Unsupported operand: {kind}')
+
+
+def _compare(op, left, right):
+    if left is _MISSING or right is _MISSING:
+        return op == '<>' and left is not right
+    try:
+        if op == '=':
+            return left == right
+        if op == '<>':
+            return left != right
+        if op == '<':
+            return left < right
+        if op == '<=':
+            return left <= right
+        if op == '>':
+            return left > right
+        return left >= right
+    except TypeError:
+        # values of different types never compare as ordered
+        return False
+
+
+def evaluate(node, item):
+    """Evaluate a condition in tuple form against an item."""
+    if node is None:
+        return True
+    kind = node[0]
+    if kind == 'and':
+        return evaluate(node[1], item) and evaluate(node[2], item)
+    if kind == 'or':
+        return evaluate(node[1], item) or evaluate(node[2], item)
+    if kind == 'not':
+        return not evaluate(node[1], item)
+    if kind == 'cmp':
+        return _compare(node[1], _operand(node[2], item), _operand(node[3], item))
+    if kind == 'between':
+        value = _operand(node[1], item)
+        return (_compare('>=', value, _operand(node[2], item)) and
+                _compare('<=', value, _operand(node[3], item)))
+    if kind == 'in':
+        value = _operand(node[1], item)
+        return value is not _MISSING and any(
+            value == _operand(option, item) for option in node[2])
+    if kind == 'func':
+        name, arguments = node[1], node[2]
+        if name == 'attribute_exists':
+            return _operand(arguments[0], item) is not _MISSING
+        if name == 'attribute_not_exists':
+            return _operand(arguments[0], item) is _MISSING
+        value = _operand(arguments[0], item)
+        argument = _operand(arguments[1], item)
+        if value is _MISSING or argument is _MISSING:
+            return False
+        if name == 'begins_with':
+            return isinstance(value, (str, bytes)) and value.startswith(argument)
+        if name == 'contains':
+            try:
+                return argument in value
+            except TypeError:
+                return False
+        if name == 'attribute_type':
+            return _type_tag(value) == argument
+    raise ValueError(f'Unsupported condition: {node!r}')
+
+
+def _type_tag(value):
+    from boto3.dynamodb.types import TypeSerializer
+
+    (tag, _), = TypeSerializer().serialize(value).items()
+    return tag
+
+
+# --- writes on nested paths ---------------------------------------------
+
+def _set_path(item, path, value):
+    target = item
+    for segment in path[:-1]:
+        target = target[segment]
+    last = path[-1]
+    if isinstance(last, int) and last >= len(target):
+        # DynamoDB appends when setting past the end of a list
+        target.append(value)
+    else:
+        target[last] = value
+
+
+def _remove_paths(item, paths):
+    # remove list elements from the highest index down, so indexes hold
+    def order(path):
+        return [(0, segment) if isinstance(segment, int) else (1, segment)
+                for segment in path]
+
+    for path in sorted(paths, key=order, reverse=True):
+        parent = _resolve(item, path[:-1])
+        if parent is _MISSING:
+            continue
+        last = path[-1]
+        if isinstance(last, int):
+            if isinstance(parent, list) and last < len(parent):
+                del parent[last]
+        elif isinstance(parent, dict):
+            parent.pop(last, None)
+
+
+def _set_value(node, item):
+    # evaluate the right hand side of a SET action against the old item
+    kind = node[0]
+    if kind == 'func' and node[1] == 'list_append':
+        return _copy(_set_value(node[2][0], item)) + _copy(_set_value(node[2][1], item))
+    if kind == 'func' and node[1] == 'if_not_exists':
+        existing = _resolve(item, node[2][0][1])
+        return existing if existing is not _MISSING else _set_value(node[2][1], item)
+    if kind == 'arith':
+        left = _set_value(node[2], item)
+        right = _set_value(node[3], item)
+        return left + right if node[1] == '+' else left - right
+    value = _operand(node, item)
+    if value is _MISSING:
+        raise ValueError('The provided expression refers to an attribute '
+                         'that does not exist in the item')
+    return _copy(value)
+
+
+def _apply_update(item, actions):
+    # values are computed from the item as it was before the update
+    values = [(path, _set_value(node, item)) for path, node in actions['SET']]
+    for path, value in values:
+        _set_path(item, path, value)
+    _remove_paths(item, actions['REMOVE'])
+
+
+def _project(item, paths):
+    if paths is None:
+        return item
+    projected = {}
+    for path in paths:
+        value = _resolve(item, path)
+        if value is _MISSING:
+            continue
+        # rebuild the nesting of the path; list indexes become positions
+        target = projected
+        for segment, next_segment in zip(path, path[1:]):
+            empty = [] if isinstance(next_segment, int) else {}
+            if isinstance(target, list):
+                target.append(empty)
+                target = target[-1]
+            else:
+                target = target.setdefault(segment, empty)
+        if isinstance(target, list):
+            target.append(_copy(value))
+        else:
+            target[path[-1]] = _copy(value)
+    return projected
+
+
+# --- tables --------------------------------------------------------------
+
+class _Partition:
+    # the items of one partition, with their sort keys kept sorted
+    __slots__ = ('keys', 'items')
+
+    def __init__(self):
+        self.keys = []
+        self.items = {}
+
+
+def _segment_of(partition_value, total_segments):
+    return zlib.crc32(str(partition_value).encode()) % total_segments
+
+
+class _BatchWriter:
+    # resource batch_writer() stand-in; writes go straight to the table
+    def __init__(self, table):
+        self.table = table
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def put_item(self, Item):
+        self.table.put_item(Item=Item)
+
+    def delete_item(self, Key):
+        self.table.delete_item(Key=Key)
+
+
+class LocalTable:
+    """An in-memory table with sorted partitions and global secondary indexes."""
+
+    def __init__(self, name=TABLE_NAME, partition_key=None, sort_key=None,
+                 indexes=None, latency=0.0, page_items=PAGE_ITEMS, client=None):
+        default = TABLE_SCHEMAS.get(name, TABLE_SCHEMAS[TABLE_NAME])
+        self.name = name
+        self.partition_key = partition_key or default[0]
+        self.sort_key = sort_key or default[1]
+        # index name -> (partition key, sort key)
+        self.indexes = default[2] if indexes is None else indexes
+        self.latency = latency
+        self.page_items = page_items
+        self.meta = SimpleNamespace(client=client)
+        self._partitions = {}
+        self._partition_keys = []
+        # index name -> index partition value -> sorted entries
+        self._index_partitions = {name: {} for name in self.indexes}
+        self._count = 0
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return self._count
+
+    def _wait(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _key_of(self, item, operation):
+        try:
+            return item[self.partition_key], item[self.sort_key]
+        except KeyError:
+            raise _client_error('ValidationException',
+                                'The provided key element does not match the schema',
+                                operation) from None
+
+    # storage
+
+    def _get(self, partition_value, sort_value):
+        partition = self._partitions.get(partition_value)
+        return partition.items.get(sort_value) if partition else None
+
+    def _store(self, item, old_item):
+        partition_value, sort_value = item[self.partition_key], item[self.sort_key]
+        partition = self._partitions.get(partition_value)
+        if partition is None:
+            partition = self._partitions[partition_value] = _Partition()
+            insort(self._partition_keys, partition_value)
+        if sort_value not in partition.items:
+            insort(partition.keys, sort_value)
+            self._count += 1
+        partition.items[sort_value] = item
+        self._reindex(old_item, item)
+
+    def _delete(self, partition_value, sort_value):
+        partition = self._partitions.get(partition_value)
+        old_item = partition.items.pop(sort_value, None) if partition else None
+        if old_item is None:
+            return None
+        del partition.keys[bisect_left(partition.keys, sort_value)]
+        self._count -= 1
+        if not partition.items:
+            del self._partitions[partition_value]
+            del self._partition_keys[bisect_left(self._partition_keys, partition_value)]
+        self._reindex(old_item, None)
+        return old_item
+
+    def _index_entry(self, index_name, item):
+        index_partition_key, index_sort_key = self.indexes[index_name]
+        if item is None or index_partition_key not in item or index_sort_key not in item:
+            return None, None
+        return item[index_partition_key], (
+            item[index_sort_key], item[self.partition_key], item[self.sort_key])
+
+    def _reindex(self, old_item, new_item):
+        for index_name, partitions in self._index_partitions.items():
+            old_partition, old_entry = self._index_entry(index_name, old_item)
+            new_partition, new_entry = self._index_entry(index_name, new_item)
+            if (old_partition, old_entry) == (new_partition, new_entry):
+                continue
+            if old_entry is not None:
+                entries = partitions[old_partition]
+                del entries[bisect_left(entries, old_entry)]
+                if not entries:
+                    del partitions[old_partition]
+            if new_entry is not None:
+                insort(partitions.setdefault(new_partition, []), new_entry)
+
+    # single item calls
+
+    def get_item(self, Key, ProjectionExpression=None, ExpressionAttributeNames=None,
+                 **kwargs):
+        self._wait()
+        key = self._key_of(Key, 'GetItem')
+        projection = _Parser(ProjectionExpression, ExpressionAttributeNames, {}).paths() \
+            if ProjectionExpression else None
+        with self._lock:
+            item = self._get(*key)
+            if item is None:
+                return {}
+            return {'Item': _copy(_project(item, projection))}
+
+    def _check(self, operation, old_item, condition, names, values):
+        node = parse_condition(condition, names, values)
+        if node is not None and not evaluate(node, old_item or {}):
+            raise _client_error('ConditionalCheckFailedException',
+                                'The conditional request failed', operation)
+
+    def put_item(self, Item, ReturnValues='NONE', ConditionExpression=None,
+                 ExpressionAttributeNames=None, ExpressionAttributeValues=None,
+                 **kwargs):
+        self._wait()
+        key = self._key_of(Item, 'PutItem')
+        item = _copy(Item)
+        with self._lock:
+            old_item = self._get(*key)
+            self._check('PutItem', old_item, ConditionExpression,
+                        ExpressionAttributeNames, ExpressionAttributeValues)
+            self._store(item, old_item)
+        return _returned(old_item, None, ReturnValues)
+
+    def update_item(self, Key, UpdateExpression, ConditionExpression=None,
+                    ExpressionAttributeNames=None, ExpressionAttributeValues=None,
+                    ReturnValues='NONE', **kwargs):
+        self._wait()
+        key = self._key_of(Key, 'UpdateItem')
+        actions = _Parser(UpdateExpression, ExpressionAttributeNames,
+                          ExpressionAttributeValues).update()
+        with self._lock:
+            old_item = self._get(*key)
+            self._check('UpdateItem', old_item, ConditionExpression,
+                        ExpressionAttributeNames, ExpressionAttributeValues)
+            item = _copy(old_item) if old_item else dict(Key)
+            try:
+                _apply_update(item, actions)
+            except (ValueError, KeyError, IndexError, TypeError) as e:
+                raise _client_error('ValidationException', str(e), 'UpdateItem') from None
+            self._store(item, old_item)
+        return _returned(old_item, item, ReturnValues)
+
+    def delete_item(self, Key, ReturnValues='NONE', ConditionExpression=None,
+                    ExpressionAttributeNames=None, ExpressionAttributeValues=None,
+                    **kwargs):
+        self._wait()
+        key = self._key_of(Key, 'DeleteItem')
+        with self._lock:
+            self._check('DeleteItem', self._get(*key), ConditionExpression,
+                        ExpressionAttributeNames, ExpressionAttributeValues)
+            old_item = self._delete(*key)
+        return _returned(old_item, None, ReturnValues)
+
+    def batch_writer(self, overwrite_by_pkeys=None):
+        return _BatchWriter(self)
+
+    # query
+
+    def _key_condition(self, node, partition_key, sort_key):
+        # split a key condition into the partition value and a sort key test
+        conditions = []
+
+        def flatten(node):
+            if node[0] == 'and':
+                flatten(node[1])
+                flatten(node[2])
+            else:
+                conditions.append(node)
+
+        flatten(node)
+        partition_value = _MISSING
+        sort_condition = None
+        for condition in conditions:
+            attribute = condition[2] if condition[0] == 'cmp' else \
+                (condition[1] if condition[0] == 'between' else condition[2][0])
+            if attribute[0] != 'path' or len(attribute[1]) != 1:
+                raise ValueError('Key conditions must name key attributes')
+            name = attribute[1][0]
+            if name == partition_key and condition[0] == 'cmp' and condition[1] == '=':
+                partition_value = condition[3][1]
+            elif name == sort_key and sort_condition is None:
+                sort_condition = condition
+            else:
+                raise ValueError(f'Unsupported key condition on {name}')
+        if partition_value is _MISSING:
+            raise ValueError(f'Query condition missed key schema element: {partition_key}')
+        return partition_value, sort_condition
+
+    @staticmethod
+    def _sort_range(keys, sort_condition, key_of=lambda key: key):
+        # return the (start, stop) slice of sorted keys matching the condition
+        if sort_condition is None:
+            return 0, len(keys)
+        kind = sort_condition[0]
+        low, high = 0, len(keys)
+
+        def left(value):
+            return bisect_left(keys, value, key=key_of)
+
+        def right(value):
+            return bisect_right(keys, value, key=key_of)
+
+        if kind == 'between':
+            return left(sort_condition[2][1]), right(sort_condition[3][1])
+        if kind == 'func' and sort_condition[1] == 'begins_with':
+            prefix = sort_condition[2][1][1]
+            start = left(prefix)
+            stop = start
+            while stop < len(keys) and key_of(keys[stop]).startswith(prefix):
+                stop += 1
+            return start, stop
+        op, value = sort_condition[1], sort_condition[3][1]
+        if op == '=':
+            return left(value), right(value)
+        if op == '<':
+            return low, left(value)
+        if op == '<=':
+            return low, right(value)
+        if op == '>':
+            return right(value), high
+        if op == '>=':
+            return left(value), high
+        raise ValueError(f'Unsupported sort key condition: {op}')
+
+    def query(self, KeyConditionExpression, IndexName=None, FilterExpression=None,
+              ProjectionExpression=None, ExpressionAttributeNames=None,
+              ExpressionAttributeValues=None, ExclusiveStartKey=None, Limit=None,
+              ScanIndexForward=True, Select=None, **kwargs):
+        self._wait()
+        names, values = ExpressionAttributeNames, ExpressionAttributeValues
+        try:
+            if IndexName is None:
+                partition_key, sort_key = self.partition_key, self.sort_key
+            elif IndexName in self.indexes:
+                partition_key, sort_key = self.indexes[IndexName]
+            else:
+                raise ValueError(f'The table does not have the specified index: {IndexName}')
+            partition_value, sort_condition = self._key_condition(
+                parse_condition(KeyConditionExpression, names, values),
+                partition_key, sort_key)
+            filter_node = parse_condition(FilterExpression, names, values)
+            projection = _Parser(ProjectionExpression, names, {}).paths() \
+                if ProjectionExpression else None
+        except ValueError as e:
+            raise _client_error('ValidationException', str(e), 'Query') from None
+
+        with self._lock:
+            if IndexName is None:
+                partition = self._partitions.get(partition_value)
+                keys = partition.keys if partition else []
+                start, stop = self._sort_range(keys, sort_condition)
+                if ExclusiveStartKey:
+                    position = bisect_right(keys, ExclusiveStartKey[sort_key]) \
+                        if ScanIndexForward else bisect_left(keys, ExclusiveStartKey[sort_key])
+                    start, stop = (max(start, position), stop) if ScanIndexForward \
+                        else (start, min(stop, position))
+                selected = keys[start:stop]
+                if not ScanIndexForward:
+                    selected = selected[::-1]
+                candidates = ((partition.items[key] for key in selected)
+                              if partition else iter(()))
+            else:
+                entries = self._index_partitions[IndexName].get(partition_value, [])
+                start, stop = self._sort_range(entries, sort_condition,
+                                               key_of=lambda entry: entry[0])
+                if ExclusiveStartKey:
+                    last = (ExclusiveStartKey[sort_key],
+                            ExclusiveStartKey[self.partition_key],
+                            ExclusiveStartKey[self.sort_key])
+                    position = bisect_right(entries, last) if ScanIndexForward \
+                        else bisect_left(entries, last)
+                    start, stop = (max(start, position), stop) if ScanIndexForward \
+                        else (start, min(stop, position))
+                selected = entries[start:stop]
+                if not ScanIndexForward:
+                    selected = selected[::-1]
+                candidates = (self._get(entry[1], entry[2]) for entry in selected)
+
+            return self._page(candidates, Limit, filter_node, projection, Select,
+                              index_keys=None if IndexName is None
+                              else (partition_key, sort_key))
+
+    # scan
+
+    def scan(self, FilterExpression=None, ProjectionExpression=None,
+             ExpressionAttributeNames=None, ExpressionAttributeValues=None,
+             ExclusiveStartKey=None, Limit=None, Segment=None, TotalSegments=None,
+             Select=None, **kwargs):
+        self._wait()
+        names, values = ExpressionAttributeNames, ExpressionAttributeValues
+        try:
+            filter_node = parse_condition(FilterExpression, names, values)
+            projection = _Parser(ProjectionExpression, names, {}).paths() \
+                if ProjectionExpression else None
+        except ValueError as e:
+            raise _client_error('ValidationException', str(e), 'Scan') from None
+
+        def candidates():
+            partition_keys = self._partition_keys
+            first = 0
+            if ExclusiveStartKey:
+                first = bisect_left(partition_keys, ExclusiveStartKey[self.partition_key])
+            for position in range(first, len(partition_keys)):
+                partition_value = partition_keys[position]
+                if TotalSegments and _segment_of(partition_value, TotalSegments) != Segment:
+                    continue
+                partition = self._partitions[partition_value]
+                keys = partition.keys
+                start = 0
+                if ExclusiveStartKey and partition_value == ExclusiveStartKey[self.partition_key]:
+                    start = bisect_right(keys, ExclusiveStartKey[self.sort_key])
+                for key in keys[start:]:
+                    yield partition.items[key]
+
+        with self._lock:
+            return self._page(candidates(), Limit, filter_node, projection, Select)
+
+    def _page(self, candidates, limit, filter_node, projection, select,
+              index_keys=None):
+        # read up to a page of candidates, and build the response
+        page_size = min(limit, self.page_items) if limit else self.page_items
+        items = []
+        scanned = 0
+        last_item = None
+        more = False
+        for item in candidates:
+            if scanned == page_size:
+                more = True
+                break
+            scanned += 1
+            last_item = item
+            if evaluate(filter_node, item):
+                items.append(item)
+        db_resp = {'Count': len(items), 'ScannedCount': scanned}
+        if select != 'COUNT':
+            db_resp['Items'] = [_copy(_project(item, projection)) for item in items]
+        if more:
+            last_key = {self.partition_key: last_item[self.partition_key],
+                        self.sort_key: last_item[self.sort_key]}
+            if index_keys:
+                for name in index_keys:
+                    last_key[name] = last_item[name]
+            db_resp['LastEvaluatedKey'] = last_key
+        return db_resp
+
+    # data loading
+
+    def load(self, items):
+        """Put many items at once, e.g. to seed the table."""
+        with self._lock:
+            for item in items:
+                key = self._key_of(item, 'PutItem')
+                self._store(_copy(item), self._get(*key))
+
+    def describe(self):
+        key_schema = [{'AttributeName': self.partition_key, 'KeyType': 'HASH'},
+                      {'AttributeName': self.sort_key, 'KeyType': 'RANGE'}]
+        return {
+            'TableName': self.name,
+            'TableStatus': 'ACTIVE',
+            'ItemCount': self._count,
+            'KeySchema': key_schema,
+            'GlobalSecondaryIndexes': [
+                {'IndexName': name,
+                 'KeySchema': [{'AttributeName': keys[0], 'KeyType': 'HASH'},
+                               {'AttributeName': keys[1], 'KeyType': 'RANGE'}]}
+                for name, keys in self.indexes.items()
+            ],
+        }
+
+
+def _returned(old_item, new_item, return_values):
+    if return_values in ('ALL_OLD', 'UPDATED_OLD') and old_item is not None:
+        return {'Attributes': _copy(old_item)}
+    if return_values in ('ALL_NEW', 'UPDATED_NEW') and new_item is not None:
+        return {'Attributes': _copy(new_item)}
+    return {}
+
+
+# --- resource and service client -----------------------------------------
+
+class LocalDynamoDB:
+    """A set of local tables, with resource-style and client-style access.
+
+    ``Table(name)`` works like ``boto3.resource('dynamodb').Table(name)``,
+    creating the table on first use (the trips table and location index get
+    their real key schemas), and ``client`` like
+    ``boto3.client('dynamodb')``.
+    """
+
+    def __init__(self, latency=0.0, page_items=PAGE_ITEMS):
+        self.latency = latency
+        self.page_items = page_items
+        self.tables = {}
+        self.client = LocalClient(self)
+        self._lock = threading.Lock()
+
+    def Table(self, name):
+        with self._lock:
+            table = self.tables.get(name)
+            if table is None:
+                table = self.tables[name] = LocalTable(
+                    name, latency=self.latency, page_items=self.page_items,
+                    client=self.client)
+            return table
+
+
+class LocalClient:
+    """Service client stand-in: DynamoDB JSON in and out, on local tables."""
+
+    def __init__(self, dynamodb):
+        from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+
+        self.dynamodb = dynamodb
+        self.meta = SimpleNamespace(events=None)
+        self._serializer = TypeSerializer()
+        self._deserializer = TypeDeserializer()
+
+    def _from_json(self, item):
+        return {name: self._deserializer.deserialize(value)
+                for name, value in item.items()} if item is not None else None
+
+    def _to_json(self, item):
+        return {name: self._serializer.serialize(value) for name, value in item.items()}
+
+    def _params(self, params):
+        # convert the placeholder values, keys and items of a call
+        params = dict(params)
+        for name in ('Key', 'Item', 'ExpressionAttributeValues', 'ExclusiveStartKey'):
+            if name in params:
+                params[name] = self._from_json(params[name])
+        return params
+
+    def _response(self, db_resp):
+        db_resp = dict(db_resp)
+        for name in ('Item', 'Attributes', 'LastEvaluatedKey'):
+            if name in db_resp:
+                db_resp[name] = self._to_json(db_resp[name])
+        if 'Items' in db_resp:
+            db_resp['Items'] = [self._to_json(item) for item in db_resp['Items']]
+        return db_resp
+
+    def _call(self, method, TableName, **params):
+        table = self.dynamodb.Table(TableName)
+        return self._response(getattr(table, method)(**self._params(params)))
+
+    def get_item(self, **params):
+        return self._call('get_item', **params)
+
+    def put_item(self, **params):
+        return self._call('put_item', **params)
+
+    def update_item(self, **params):
+        return self._call('update_item', **params)
+
+    def delete_item(self, **params):
+        return self._call('delete_item', **params)
+
+    def query(self, **params):
+        return self._call('query', **params)
+
+    def scan(self, **params):
+        return self._call('scan', **params)
+
+    def batch_write_item(self, RequestItems, **kwargs):
+        for table_name, requests in RequestItems.items():
+            table = self.dynamodb.Table(table_name)
+            for request in requests:
+                if 'PutRequest' in request:
+                    table.put_item(Item=self._from_json(request['PutRequest']['Item']))
+                else:
+                    table.delete_item(Key=self._from_json(request['DeleteRequest']['Key']))
+        return {'UnprocessedItems': {}}
+
+    def batch_get_item(self, RequestItems, **kwargs):
+        responses = {}
+        for table_name, request in RequestItems.items():
+            params = {name: value for name, value in request.items() if name != 'Keys'}
+            responses[table_name] = [
+                db_resp['Item'] for db_resp in
+                (self.get_item(TableName=table_name, Key=key, **params)
+                 for key in request['Keys'])
+                if 'Item' in db_resp
+            ]
+        return {'Responses': responses, 'UnprocessedKeys': {}}
+
+    def describe_table(self, TableName, **kwargs):
+        return {'Table': self.dynamodb.Table(TableName).describe()}
+
+
+def load_json(path):
+    """Read a JSON list of items, with numbers as Decimal like boto3 returns."""
+    import json
+
+    with open(path) as f:
+        return json.load(f, parse_float=Decimal, parse_int=Decimal)
@@ -0,0 +1,93 @@
+"""Inverted index from location to trips.
+
+Finding "trips to Iceland" on the trips table takes a full scan with
+``contains(locations, :location)``, which consumes RCUs for every item in the
+table. The location index is a second table with one item per (location,
+trip) pair:
+
+- **Partition key:** *location*
+- **Sort key:** *trip_ref* (``"<user_id>#<trip_id>"``)
+
+Each entry also carries the trip's user_id, trip_id, dates and locations, so
+a query on the index can answer a location lookup on its own, and its cost
+grows with the number of matching trips rather than the size of the table.
+
+``LocationIndex`` is a write listener (see ``trips.writes``), so passing it to
+``put_trip``/``update_trip`` keeps the index in step with the trips table.
+"""
+
+# name of the index table
+LOCATION_INDEX_TABLE_NAME = 'travel_planner_trip_locations'
+
+# trip attributes copied onto each index entry
+ENTRY_ATTRIBUTES = ('user_id', 'trip_id', 'start_date', 'end_date', 'locations')
+
+
+def trip_ref(user_id, trip_id):
+    """Return the index sort key for a trip."""
+    return f'{user_id}#{trip_id}'
+
+
+def index_entries(trip):
+    """Return the index entries for ``trip``, keyed by location."""
+    if not trip:
+        return {}
+    entry = {name: trip[name] for name in ENTRY_ATTRIBUTES if name in trip}
+    ref = trip_ref(trip['user_id'], trip['trip_id'])
+    return {
+        location: dict(entry, location=location, trip_ref=ref)
+        for location in trip.get('locations', [])
+    }
+
+
+class LocationIndex:
+    """Maintains and queries the location index table."""
+
+    def __init__(self, index_table):
+        self.index_table = index_table
+
+    def trip_changed(self, old_trip, new_trip):
+        """Bring the index entries of a trip in line with its new state.
+
+        Entries for locations the trip no longer has are deleted, and entries
+        that are new or whose copied attributes changed are written. A trip
+        whose locations and dates did not change costs no writes at all.
+        """
+        old_entries = index_entries(old_trip)
+        new_entries = index_entries(new_trip)
+        stale = [entry for location, entry in old_entries.items()
+                 if location not in new_entries]
+        changed = [entry for location, entry in new_entries.items()
+                   if old_entries.get(location) != entry]
+        if not stale and not changed:
+            return
+
+        with self.index_table.batch_writer() as batch:
+            for entry in stale:
+                batch.delete_item(Key={
+                    'location': entry['location'],
+                    'trip_ref': entry['trip_ref']
+                })
+            for entry in changed:
+                batch.put_item(Item=entry)
+
+    def query(self, location, **query_kwargs):
+        """Yield the index entries for ``location``, following pagination."""
+        from boto3.dynamodb.conditions import Key
+
+        query_kwargs['KeyConditionExpression'] = Key('location').eq(location)
+        while True:
+            db_resp = self.index_table.query(**query_kwargs)
+            yield from db_resp['Items']
+            last_key = db_resp.get('LastEvaluatedKey')
+            if not last_key:
+                return
+            query_kwargs['ExclusiveStartKey'] = last_key
+
+    def backfill(self, trips):
+        """Write index entries for existing trips, e.g. from ``scan_items``."""
+        pkeys = ['location', 'trip_ref']
+        with self.index_table.batch_writer(overwrite_by_pkeys=pkeys) as batch:
+            for trip in trips:
+                for entry in index_entries(trip).values():
+                    batch.put_item(Item=entry)
@@ -0,0 +1,103 @@
+"""Date range queries over many users, merged into one sorted stream.
+
+The ``trips_userid_startdate`` index answers "trips of one user starting
+between two dates" with a single query, already sorted by ``start_date``.
+A group calendar needs the same range for several users, in one list.
+
+``query_users_by_date`` queries every user's partition at the same time on
+a thread pool, and merges the per-user streams with ``heapq.merge``, which
+only ever looks at the next trip of each user. Pages are fetched lazily:
+each user's first page up front, and each next page as soon as the
+current one starts being read, at most one page ahead. Taking only the
+first trips of the result (``limit``, or ``islice``) never reads the rest
+of the pages.
+"""
+
+import heapq
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from trips import INDEX_NAME, TABLE_NAME
+from trips.projection import with_projection
+
+
+def _sort_key(item):
+    # start_date, then user; DynamoDB returns a user's trips with the same
+    # start_date in no guaranteed order, so trip_id can't break ties
+    return item['start_date'], item['user_id']
+
+
+def _query(executor, table_factory, query_kwargs):
+    return executor.submit(lambda: table_factory().query(**query_kwargs))
+
+
+def _user_items(executor, table_factory, query_kwargs, future):
+    # yield one user's trips from the page in ``future`` onwards, keeping
+    # the next page in flight while the current one is read
+    try:
+        while future is not None:
+            page = future.result()
+            last_key = page.get('LastEvaluatedKey')
+            if last_key:
+                query_kwargs = dict(query_kwargs, ExclusiveStartKey=last_key)
+                future = _query(executor, table_factory, query_kwargs)
+            else:
+                future = None
+            yield from page.get('Items', [])
+    finally:
+        if future is not None:
+            future.cancel()
+
+
+def query_users_by_date(user_ids, from_date, to_date, limit=None, page_size=100,
+                        max_workers=8, newest_first=False, fields=None,
+                        table_name=TABLE_NAME, index_name=INDEX_NAME,
+                        table_factory=None):
+    """Yield the trips of ``user_ids`` starting between two dates, sorted by start_date.
+
+    Trips starting on the same day are ordered by ``user_id``; one user's
+    trips on the same day come in the order the index returned them.
+
+    ``limit`` stops after that many trips; each user's query then asks for
+    no more than ``limit`` items per page, since no one user can contribute
+    more. ``page_size`` is the ``Limit`` of each query otherwise. With
+    ``newest_first`` the trips come latest start date first. ``fields``
+    limits the attributes returned (the key attributes are always
+    included, as the merge sorts on them). ``table_factory`` builds the
+    table object for each query, and defaults to ``trips.session.get_table``,
+    which gives every worker thread its own resource client.
+    """
+    from boto3.dynamodb.conditions import Key
+
+    if table_factory is None:
+        from trips.session import get_table
+        table_factory = lambda: get_table(table_name)
+    if fields is not None:
+        fields = list(dict.fromkeys(['user_id', 'trip_id', 'start_date', *fields]))
+    if limit is not None:
+        page_size = min(page_size, limit)
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    streams = []
+    try:
+        for user_id in dict.fromkeys(user_ids):
+            query_kwargs = with_projection(
+                fields,
+                IndexName=index_name,
+                KeyConditionExpression=(
+                    Key('user_id').eq(user_id) &
+                    Key('start_date').between(from_date, to_date)
+                ),
+                ScanIndexForward=not newest_first,
+                Limit=page_size,
+            )
+            # every user's first page is requested before the merge starts
+            future = _query(executor, table_factory, query_kwargs)
+            streams.append(_user_items(executor, table_factory, query_kwargs, future))
+        merged = heapq.merge(*streams, key=_sort_key, reverse=newest_first)
+        yield from islice(merged, limit)
+    finally:
+        # the caller may stop early; drop the pages nobody will read
+        for stream in streams:
+            stream.close()
+        executor.shutdown(wait=False)
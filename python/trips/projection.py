@@ -0,0 +1,63 @@
+"""ProjectionExpression building from the fields a caller needs.
+
+By default get, query and scan return whole items, including the potentially
+large itinerary, even when the caller only looks at a couple of attributes.
+A ProjectionExpression makes DynamoDB return just the listed attributes,
+which cuts response size, transfer and parsing time (the read capacity
+consumed stays the same, as it is based on the full item size).
+
+Every attribute name goes through an ExpressionAttributeNames placeholder,
+so reserved words such as ``location``, ``date`` or ``name`` need no special
+care. Names may be document paths, like ``itinerary[0].title``.
+"""
+
+import re
+
+# fields the example scripts print for each trip
+SUMMARY_FIELDS = ('user_id', 'trip_id', 'start_date', 'end_date', 'locations')
+
+# a path segment: an attribute name followed by any number of [index] parts
+_SEGMENT = re.compile(r'^([^\[\]]+)((?:\[\d+\])*)$')
+
+
+def projection(fields, prefix='#p'):
+    """Return ProjectionExpression and ExpressionAttributeNames for ``fields``.
+
+    The result can be passed straight to get_item, query or scan as keyword
+    arguments. Placeholders start with ``prefix``, so they don't collide with
+    the ``#n``/``#a`` ones boto3 and ``trips.writes`` use.
+    """
+    names = {}
+    placeholders = {}
+    paths = []
+    for field in dict.fromkeys(fields):
+        path = []
+        for segment in field.split('.'):
+            match = _SEGMENT.match(segment)
+            if match is None:
+                raise ValueError(f'Invalid attribute path: {field!r}')
+            name, indexes = match.groups()
+            if name not in placeholders:
+                placeholders[name] = f'{prefix}{len(placeholders)}'
+                names[placeholders[name]] = name
+            path.append(placeholders[name] + indexes)
+        paths.append('.'.join(path))
+    return {
+        'ProjectionExpression': ', '.join(paths),
+        'ExpressionAttributeNames': names,
+    }
+
+
+def with_projection(fields, **kwargs):
+    """Add a projection of ``fields`` to get/query/scan keyword arguments.
+
+    Any ExpressionAttributeNames already in ``kwargs`` (for a filter, say)
+    are kept. With ``fields`` None, ``kwargs`` is returned unchanged.
+    """
+    if fields is None:
+        return kwargs
+    projected = projection(fields)
+    names = dict(kwargs.get('ExpressionAttributeNames', {}))
+    names.update(projected['ExpressionAttributeNames'])
+    return dict(kwargs, ProjectionExpression=projected['ProjectionExpression'],
+                ExpressionAttributeNames=names)
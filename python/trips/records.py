@@ -0,0 +1,148 @@
+"""Compact in-memory representations of trips.
+
+A plain dict per trip costs several hundred bytes before counting its
+values, and the same user ids, dates and locations are repeated across many
+items. For large result sets:
+
+- ``Trip`` is a record with ``__slots__`` (no per-instance dict) whose
+  repeated strings are interned, so equal values share one object.
+- ``TripResultSet`` goes further and stores each attribute as its own column
+  (parallel lists), so a trip costs one reference per attribute.
+
+Both convert back to plain dicts lazily, only when asked.
+"""
+
+import sys
+
+# attributes with their own slot / column; anything else goes in 'extra'
+TRIP_ATTRIBUTES = (
+    'user_id', 'trip_id', 'start_date', 'start_time', 'end_date', 'end_time',
+    'locations', 'itinerary',
+)
+
+# string attributes whose values repeat across trips
+_INTERNED = ('user_id', 'start_date', 'start_time', 'end_date', 'end_time')
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def _compact(item):
+    # return the attribute values of an item, interned, plus any extras
+    values = [item.get(name) for name in TRIP_ATTRIBUTES]
+    for i, name in enumerate(TRIP_ATTRIBUTES):
+        if name in _INTERNED:
+            values[i] = _intern(values[i])
+    locations = values[6]
+    if locations is not None:
+        values[6] = tuple(_intern(location) for location in locations)
+    extra = {name: value for name, value in item.items()
+             if name not in TRIP_ATTRIBUTES} or None
+    return values, extra
+
+
+def _to_dict(values, extra):
+    item = {name: value for name, value in zip(TRIP_ATTRIBUTES, values)
+            if value is not None}
+    if 'locations' in item:
+        item['locations'] = list(item['locations'])
+    if extra:
+        item.update(extra)
+    return item
+
+
+class Trip:
+    """A trip item as a slotted record."""
+
+    __slots__ = TRIP_ATTRIBUTES + ('extra',)
+
+    def __init__(self, user_id, trip_id, start_date=None, start_time=None,
+                 end_date=None, end_time=None, locations=(), itinerary=None,
+                 extra=None):
+        self.user_id = _intern(user_id)
+        self.trip_id = trip_id
+        self.start_date = _intern(start_date)
+        self.start_time = _intern(start_time)
+        self.end_date = _intern(end_date)
+        self.end_time = _intern(end_time)
+        self.locations = tuple(_intern(location) for location in locations)
+        self.itinerary = itinerary
+        self.extra = extra
+
+    @classmethod
+    def from_item(cls, item):
+        """Build a Trip from a plain Python item."""
+        values, extra = _compact(item)
+        trip = cls.__new__(cls)
+        for name, value in zip(TRIP_ATTRIBUTES, values):
+            setattr(trip, name, value)
+        trip.extra = extra
+        return trip
+
+    def to_dict(self):
+        """Return the trip as a plain Python item."""
+        return _to_dict([getattr(self, name) for name in TRIP_ATTRIBUTES],
+                        self.extra)
+
+    def __repr__(self):
+        return f'Trip({self.user_id!r}, {self.trip_id!r})'
+
+    def __eq__(self, other):
+        if not isinstance(other, Trip):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+
+class TripResultSet:
+    """Trips stored column by column, one list per attribute."""
+
+    def __init__(self):
+        self.columns = {name: [] for name in TRIP_ATTRIBUTES + ('extra',)}
+
+    @classmethod
+    def from_items(cls, items):
+        """Materialize any iterable of items, e.g. ``scan_items(...)``."""
+        result_set = cls()
+        result_set.extend(items)
+        return result_set
+
+    def append(self, item):
+        values, extra = _compact(item)
+        columns = self.columns
+        for name, value in zip(TRIP_ATTRIBUTES, values):
+            columns[name].append(value)
+        columns['extra'].append(extra)
+
+    def extend(self, items):
+        for item in items:
+            self.append(item)
+
+    def __len__(self):
+        return len(self.columns['trip_id'])
+
+    def column(self, name):
+        """Return the list of values of one attribute, None where missing."""
+        return self.columns[name]
+
+    def _row(self, i):
+        return ([self.columns[name][i] for name in TRIP_ATTRIBUTES],
+                self.columns['extra'][i])
+
+    def __getitem__(self, i):
+        """Return row ``i`` as a Trip."""
+        values, extra = self._row(i)
+        trip = Trip.__new__(Trip)
+        for name, value in zip(TRIP_ATTRIBUTES, values):
+            setattr(trip, name, value)
+        trip.extra = extra
+        return trip
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def dicts(self):
+        """Yield each row as a plain Python item, one at a time."""
+        for i in range(len(self)):
+            yield _to_dict(*self._row(i))
@@ -0,0 +1,309 @@
+"""A local SQLite read replica of the trips table, kept current with deltas.
+
+Reporting jobs run the same scans and queries over and over. A
+``TripReplica`` keeps a copy of the table in an SQLite file instead, indexed
+on ``user_id``/``trip_id``, ``start_date`` and location, and memory mapped,
+so those reads run locally and cost no read capacity at all:
+
+- ``bulk_load(table)`` fills it once, with a (parallel) scan
+- ``sync(table)`` then copies only the trips written since the last load or
+  sync, found through the ``updated_at`` and ``updated_day`` attributes the
+  write helpers stamp on every write (see ``trips.writes``)
+
+The cheap way to find them is the ``trips_updatedday_updatedat`` global
+secondary index (partition key ``updated_day``, sort key ``updated_at``):
+each sync then queries one index partition per day since the last sync.
+``sync`` checks with ``describe_table`` that the index exists, and
+otherwise falls back to a scan filtered on ``updated_at``, which reads (and
+is billed for) the whole table on every sync. The ``SyncStats`` it returns
+show which way was used, the items read and the read capacity consumed.
+
+The trips table does not have the index out of the box. Create it once
+with::
+
+    aws dynamodb update-table --table-name travel_planner_trips \
+        --attribute-definitions AttributeName=updated_day,AttributeType=S \
+            AttributeName=updated_at,AttributeType=S \
+        --global-secondary-index-updates '[{"Create": {
+            "IndexName": "trips_updatedday_updatedat",
+            "KeySchema": [{"AttributeName": "updated_day", "KeyType": "HASH"},
+                          {"AttributeName": "updated_at", "KeyType": "RANGE"}],
+            "Projection": {"ProjectionType": "ALL"}}}]'
+
+(add ``"ProvisionedThroughput"`` to the ``Create`` block on a provisioned
+table). Every write of a day lands in the same index partition, so very
+write-heavy tables should shard ``updated_day`` before relying on the index.
+
+Each sync starts from ``overlap`` seconds before the previous one, to allow
+for clock differences between writers and for the index being eventually
+consistent; rows are only replaced by newer versions, so seeing a trip
+twice is harmless. Writes that skip the helpers, and deletes, leave no
+stamp behind: run ``bulk_load`` again to pick those up.
+
+Attributes compressed by ``trips.codec`` are stored decompressed. Other
+binary values are stored as base64 text, and read back as text.
+"""
+
+import base64
+import json
+import sqlite3
+import threading
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+from trips.codec import AttributeCodec
+from trips.limiter import consumed_units
+from trips.writes import UPDATED_AT, UPDATED_DAY, write_stamp
+
+UPDATED_INDEX_NAME = 'trips_updatedday_updatedat'
+
+# seconds each sync reaches back before the previous one
+SYNC_OVERLAP = 300
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS trips (
+    user_id TEXT NOT NULL,
+    trip_id TEXT NOT NULL,
+    start_date TEXT,
+    end_date TEXT,
+    updated_at TEXT,
+    item TEXT NOT NULL,
+    PRIMARY KEY (user_id, trip_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS trips_user_start_date ON trips (user_id, start_date);
+CREATE INDEX IF NOT EXISTS trips_start_date ON trips (start_date);
+CREATE TABLE IF NOT EXISTS trip_locations (
+    location TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    trip_id TEXT NOT NULL,
+    PRIMARY KEY (location, user_id, trip_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS sync_state (
+    name TEXT PRIMARY KEY,
+    value TEXT
+);
+'''
+
+# keep the newer copy of a trip when the same trip arrives twice
+_UPSERT = '''
+INSERT INTO trips (user_id, trip_id, start_date, end_date, updated_at, item)
+VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (user_id, trip_id) DO UPDATE SET
+    start_date = excluded.start_date,
+    end_date = excluded.end_date,
+    updated_at = excluded.updated_at,
+    item = excluded.item
+WHERE trips.updated_at IS NULL OR excluded.updated_at >= trips.updated_at
+'''
+
+
+class SyncStats(namedtuple('SyncStats', 'items scanned capacity_units index_name')):
+    """Outcome of a ``sync``: trips copied, items read and the RCUs they cost.
+
+    ``index_name`` is None when the changes were found with a scan.
+    """
+
+
+def _has_index(table, index_name):
+    # an active index that projects every attribute, per describe_table
+    description = table.meta.client.describe_table(TableName=table.name)['Table']
+    for index in description.get('GlobalSecondaryIndexes', []):
+        if index['IndexName'] == index_name:
+            return (index.get('IndexStatus', 'ACTIVE') == 'ACTIVE' and
+                    index.get('Projection', {}).get('ProjectionType', 'ALL') == 'ALL')
+    return False
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, (set, frozenset)):
+        return sorted(value, key=str)
+    if isinstance(value, bytes):
+        return base64.b64encode(value).decode()
+    if type(value).__name__ == 'Binary':
+        return base64.b64encode(value.value).decode()
+    raise TypeError(f'Cannot store {type(value).__name__} in the replica')
+
+
+def _from_row(row):
+    # numbers come back as Decimal, like boto3 returns them
+    return json.loads(row[0], parse_float=Decimal, parse_int=Decimal)
+
+
+def _since(updated_at, seconds):
+    # the updated_at stamp ``seconds`` before another one
+    moment = datetime.strptime(updated_at, '%Y-%m-%dT%H:%M:%S.%fZ')
+    return write_stamp((moment - timedelta(seconds=seconds)).replace(
+        tzinfo=timezone.utc))[UPDATED_AT]
+
+
+class TripReplica:
+    """SQLite copy of the trips table at ``path`` (``':memory:'`` for no file).
+
+    ``mmap_size`` bytes of the file are memory mapped for reads. One replica
+    object can be shared between threads; writes are serialized. ``codec``
+    decompresses the attributes it covers, and defaults to an
+    ``AttributeCodec`` for ``COMPRESSED_ATTRIBUTES``.
+    """
+
+    def __init__(self, path, mmap_size=256 * 1024 * 1024, overlap=SYNC_OVERLAP,
+                 codec=None):
+        self.path = path
+        self.overlap = overlap
+        self.codec = codec or AttributeCodec()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._db.execute('PRAGMA journal_mode = WAL')
+            self._db.execute('PRAGMA synchronous = NORMAL')
+            self._db.execute(f'PRAGMA mmap_size = {int(mmap_size)}')
+            self._db.executescript(_SCHEMA)
+
+    def close(self):
+        self._db.close()
+
+    # loading
+
+    def _store(self, items):
+        # upsert items and their locations; returns how many were stored
+        rows = []
+        trip_keys = []
+        for item in items:
+            item = self.codec.decode_item(item)
+            key = (item['user_id'], item['trip_id'])
+            trip_keys.append(key)
+            rows.append(key + (item.get('start_date'), item.get('end_date'),
+                               item.get(UPDATED_AT),
+                               json.dumps(item, default=_json_default)))
+        with self._lock, self._db:
+            self._db.executemany(
+                'DELETE FROM trip_locations WHERE user_id = ? AND trip_id = ?', trip_keys)
+            self._db.executemany(_UPSERT, rows)
+            # locations follow whichever copy of the trip was kept
+            self._db.executemany(
+                'INSERT OR IGNORE INTO trip_locations SELECT value, user_id, trip_id '
+                'FROM trips, json_each(trips.item, \'$.locations\') '
+                'WHERE user_id = ? AND trip_id = ?', trip_keys)
+        return len(rows)
+
+    def _set_state(self, name, value):
+        with self._lock, self._db:
+            self._db.execute('INSERT OR REPLACE INTO sync_state VALUES (?, ?)',
+                             (name, value))
+
+    def state(self, name):
+        with self._lock:
+            row = self._db.execute('SELECT value FROM sync_state WHERE name = ?',
+                                   (name,)).fetchone()
+        return row[0] if row else None
+
+    def bulk_load(self, table, total_segments=1, limiter=None):
+        """Copy every trip of ``table`` (a resource table); returns the count.
+
+        Trips already in the replica are replaced. With ``total_segments``
+        above 1 the scan runs in parallel, on tables from
+        ``trips.session.get_table``.
+        """
+        from trips.scan import parallel_scan_pages, scan_pages
+
+        started = write_stamp()[UPDATED_AT]
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM trips')
+            self._db.execute('DELETE FROM trip_locations')
+        if total_segments > 1:
+            pages = parallel_scan_pages(table.name, total_segments, limiter=limiter)
+        else:
+            pages = scan_pages(table, limiter=limiter)
+        count = sum(self._store(page.get('Items', [])) for page in pages)
+        # anything written during the scan is picked up by the next sync
+        self._set_state('synced_at', started)
+        return count
+
+    def _changes(self, table, since, index_name):
+        from boto3.dynamodb.conditions import Attr, Key
+
+        from trips.scan import scan_pages
+
+        if index_name is None:
+            yield from scan_pages(table, FilterExpression=Attr(UPDATED_AT).gt(since),
+                                  ReturnConsumedCapacity='TOTAL')
+            return
+        day = datetime.strptime(since[:10], '%Y-%m-%d').date()
+        today = datetime.now(timezone.utc).date()
+        while day <= today:
+            query_kwargs = {
+                'IndexName': index_name,
+                'KeyConditionExpression': (
+                    Key(UPDATED_DAY).eq(day.isoformat()) & Key(UPDATED_AT).gt(since)),
+                'ReturnConsumedCapacity': 'TOTAL',
+            }
+            while True:
+                page = table.query(**query_kwargs)
+                yield page
+                if not page.get('LastEvaluatedKey'):
+                    break
+                query_kwargs['ExclusiveStartKey'] = page['LastEvaluatedKey']
+            day += timedelta(days=1)
+
+    def sync(self, table, index_name=UPDATED_INDEX_NAME):
+        """Copy the trips written since the last load or sync; returns ``SyncStats``.
+
+        The trips are found with queries on the ``updated_day``/``updated_at``
+        index ``index_name`` if the table has it, active and projecting all
+        attributes (the trips are copied from the index pages), and with a
+        filtered scan otherwise. ``index_name=None`` always scans.
+        """
+        synced_at = self.state('synced_at')
+        if synced_at is None:
+            raise RuntimeError('bulk_load the replica before syncing it')
+        if index_name is not None and not _has_index(table, index_name):
+            index_name = None
+        started = write_stamp()[UPDATED_AT]
+        since = _since(synced_at, self.overlap)
+        items = scanned = 0
+        capacity_units = 0.0
+        for page in self._changes(table, since, index_name):
+            items += self._store(page.get('Items', []))
+            scanned += page.get('ScannedCount', 0)
+            capacity_units += consumed_units(page)
+        self._set_state('synced_at', started)
+        return SyncStats(items, scanned, float(capacity_units), index_name)
+
+    # reads
+
+    def execute(self, sql, parameters=()):
+        """Run any SQL on the replica and return all rows."""
+        with self._lock:
+            return self._db.execute(sql, parameters).fetchall()
+
+    def count(self):
+        return self.execute('SELECT count(*) FROM trips')[0][0]
+
+    def get_trip(self, user_id, trip_id):
+        """Return the trip item, or None."""
+        rows = self.execute('SELECT item FROM trips WHERE user_id = ? AND trip_id = ?',
+                            (user_id, trip_id))
+        return _from_row(rows[0]) if rows else None
+
+    def query_trips(self, user_id, from_date=None, to_date=None):
+        """Return the trips of a user, by start date, optionally within a range."""
+        sql = 'SELECT item FROM trips WHERE user_id = ?'
+        parameters = [user_id]
+        if from_date is not None:
+            sql += ' AND start_date >= ?'
+            parameters.append(from_date)
+        if to_date is not None:
+            sql += ' AND start_date <= ?'
+            parameters.append(to_date)
+        rows = self.execute(sql + ' ORDER BY start_date, trip_id', parameters)
+        return [_from_row(row) for row in rows]
+
+    def trips_by_location(self, location):
+        """Return every trip to ``location``, by start date."""
+        rows = self.execute(
+            'SELECT trips.item FROM trip_locations JOIN trips USING (user_id, trip_id) '
+            'WHERE trip_locations.location = ? ORDER BY trips.start_date, user_id, trip_id',
+            (location,))
+        return [_from_row(row) for row in rows]
@@ -0,0 +1,37 @@
+"""Retry helpers shared by the scan, batch and write helpers.
+
+Backoff uses "full jitter": each delay is a random value between zero and an
+exponentially growing cap, which keeps many workers from retrying in lockstep.
+"""
+
+import random
+import time
+
+# error codes worth retrying: throttling and transient server side failures
+RETRYABLE_ERROR_CODES = {
+    'ProvisionedThroughputExceededException',
+    'ThrottlingException',
+    'RequestLimitExceeded',
+    'InternalServerError',
+    'ServiceUnavailable',
+}
+
+
+def is_retryable(error):
+    """Return True if ``error`` is a throttling or transient failure."""
+    from botocore.exceptions import BotoCoreError, ClientError
+
+    if isinstance(error, ClientError):
+        return error.response.get('Error', {}).get('Code') in RETRYABLE_ERROR_CODES
+    # connection resets, timeouts and the like
+    return isinstance(error, BotoCoreError)
+
+
+def backoff_delay(attempt, base_delay=0.05, max_delay=5.0):
+    """Return a jittered delay in seconds for retry number ``attempt`` (0-based)."""
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+def sleep_backoff(attempt, base_delay=0.05, max_delay=5.0):
+    """Sleep for the jittered delay of retry number ``attempt``."""
+    time.sleep(backoff_delay(attempt, base_delay, max_delay))
@@ -0,0 +1,168 @@
+"""Paginated scans over the trips table.
+
+A single ``scan`` call stops after 1 MB of data and returns a
+``LastEvaluatedKey``. The generators here keep following that key until the
+whole table has been read, handing back one page at a time so memory stays
+flat no matter how large the table grows.
+
+``parallel_scan_items`` splits the table into DynamoDB scan segments
+(``Segment``/``TotalSegments``) and reads them at the same time on a thread
+pool, merging the results into a single stream.
+"""
+
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from trips import TABLE_NAME
+from trips.retry import is_retryable, sleep_backoff
+from trips.session import get_table
+
+
+def _scanner(table, limiter):
+    # table.scan, metered by the capacity limiter when there is one
+    return partial(limiter.call, table.scan) if limiter else table.scan
+
+
+def scan_pages(table, prefetch=True, limiter=None, **scan_kwargs):
+    """Yield every scan response page, following ``LastEvaluatedKey``.
+
+    ``scan_kwargs`` are passed to ``table.scan`` unchanged (FilterExpression,
+    ExpressionAttributeValues, Limit, ...). With ``prefetch`` on, the next
+    page is requested in a background thread while the caller is still
+    working on the current one, so at most two pages are held at once.
+    A ``limiter`` (see ``trips.limiter``) keeps the scan within its budget
+    of read capacity units.
+    """
+    scan = _scanner(table, limiter)
+    if not prefetch:
+        while True:
+            page = scan(**scan_kwargs)
+            last_key = page.get('LastEvaluatedKey')
+            yield page
+            if not last_key:
+                return
+            scan_kwargs = dict(scan_kwargs, ExclusiveStartKey=last_key)
+
+    executor = ThreadPoolExecutor(max_workers=1)
+    future = executor.submit(scan, **scan_kwargs)
+    try:
+        while future is not None:
+            page = future.result()
+            last_key = page.get('LastEvaluatedKey')
+            if last_key:
+                # start fetching the next page before handing this one out
+                scan_kwargs = dict(scan_kwargs, ExclusiveStartKey=last_key)
+                future = executor.submit(scan, **scan_kwargs)
+            else:
+                future = None
+            yield page
+    finally:
+        # the caller may stop early; don't wait for a page nobody will read
+        if future is not None:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+
+def scan_items(table, prefetch=True, limiter=None, **scan_kwargs):
+    """Yield the items of every scan page, one at a time."""
+    for page in scan_pages(table, prefetch=prefetch, limiter=limiter, **scan_kwargs):
+        yield from page.get('Items', [])
+
+
+# marks the end of one segment on the results queue
+_SEGMENT_DONE = object()
+
+
+def _scan_segment(table, segment, total_segments, results, stop,
+                  max_attempts, limiter, scan_kwargs):
+    # read one segment to the end, retrying failed pages from where they stopped
+    scan = _scanner(table, limiter)
+    scan_kwargs = dict(scan_kwargs, Segment=segment, TotalSegments=total_segments)
+    attempt = 0
+    while not stop.is_set():
+        try:
+            page = scan(**scan_kwargs)
+        except Exception as e:
+            attempt += 1
+            if attempt >= max_attempts or not is_retryable(e):
+                raise
+            sleep_backoff(attempt)
+            continue
+        attempt = 0
+        _put(results, page, stop)
+        last_key = page.get('LastEvaluatedKey')
+        if not last_key:
+            return
+        scan_kwargs['ExclusiveStartKey'] = last_key
+
+
+def _put(results, value, stop):
+    # a bounded queue keeps fast segments from piling up pages in memory,
+    # but never block forever once the consumer has gone away
+    while not stop.is_set():
+        try:
+            results.put(value, timeout=0.1)
+            return
+        except queue.Full:
+            pass
+
+
+def parallel_scan_pages(table_name=TABLE_NAME, total_segments=4,
+                        max_workers=None, max_attempts=5, table_factory=None,
+                        limiter=None, **scan_kwargs):
+    """Scan ``total_segments`` segments at once and yield their pages as they arrive.
+
+    Pages from different segments are interleaved, so there is no ordering
+    across the table. Each segment retries throttled or failed pages on its
+    own with jittered backoff, up to ``max_attempts`` tries per page; an error
+    that is not retryable, or that outlasts the retries, is raised to the
+    caller. ``table_factory`` builds the table object used by each segment
+    and defaults to ``trips.session.get_table``, which gives every worker
+    thread its own resource client from the shared session. All segments
+    share ``limiter``, when given, so the whole scan stays within one budget.
+    """
+    if table_factory is None:
+        table_factory = lambda: get_table(table_name)
+    max_workers = max_workers or total_segments
+
+    results = queue.Queue(maxsize=2 * max_workers)
+    stop = threading.Event()
+
+    def run(segment):
+        try:
+            _scan_segment(table_factory(), segment, total_segments, results,
+                          stop, max_attempts, limiter, scan_kwargs)
+        except Exception as e:
+            _put(results, e, stop)
+        finally:
+            _put(results, _SEGMENT_DONE, stop)
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    for segment in range(total_segments):
+        executor.submit(run, segment)
+    try:
+        remaining = total_segments
+        while remaining:
+            value = results.get()
+            if value is _SEGMENT_DONE:
+                remaining -= 1
+            elif isinstance(value, Exception):
+                raise value
+            else:
+                yield value
+    finally:
+        # stop the other segments if the caller stops early or one failed
+        stop.set()
+        executor.shutdown(wait=False)
+
+
+def parallel_scan_items(table_name=TABLE_NAME, total_segments=4,
+                        max_workers=None, max_attempts=5, table_factory=None,
+                        limiter=None, **scan_kwargs):
+    """Yield the items of a parallel scan, one at a time, in arrival order."""
+    pages = parallel_scan_pages(table_name, total_segments, max_workers,
+                                max_attempts, table_factory, limiter, **scan_kwargs)
+    for page in pages:
+        yield from page.get('Items', [])
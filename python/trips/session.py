@@ -0,0 +1,189 @@
+"""Process-wide DynamoDB session, client and resource factory.
+
+Creating a boto3 client resolves credentials and endpoints, and each new
+client starts with an empty connection pool, so every first request pays a
+TLS handshake. The functions here hand out one shared session and service
+client per process, configured with a larger connection pool, TCP
+keep-alive and explicit timeouts.
+
+- ``get_client()`` returns the shared service client, which is safe to use
+  from any thread.
+- ``get_resource()``/``get_table()`` return a resource client per thread,
+  since resource objects are not thread safe. Each thread builds its own
+  once and reuses it. That includes its own botocore client, and so its
+  own connection pool.
+- After ``os.fork()`` the child process starts from scratch, so worker
+  processes never share sockets with their parent.
+- ``warm_up()`` opens pooled connections ahead of the first real traffic,
+  on the shared client and on the calling thread's resource client. Worker
+  threads can warm their own with ``warm_up_thread``, e.g. as a
+  ``ThreadPoolExecutor`` initializer.
+
+Call ``configure()`` before first use to change the region, profile or
+client settings.
+
+With the ``TRIPS_BACKEND`` environment variable set to ``local``, the
+factory hands out tables and a client from the in-process engine in
+``trips.local`` instead, seeded from the JSON list of trips named by
+``TRIPS_LOCAL_DATA`` if set. The example scripts then run offline, unchanged.
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from trips import TABLE_NAME
+
+# client settings used unless configure() overrides them
+DEFAULT_CONFIG = {
+    'max_pool_connections': 50,
+    'connect_timeout': 2,
+    'read_timeout': 10,
+    'tcp_keepalive': True,
+    'retries': {'max_attempts': 5, 'mode': 'standard'},
+}
+
+_lock = threading.Lock()
+_settings = {'session': {}, 'config': dict(DEFAULT_CONFIG)}
+_shared = {}
+_thread_local = threading.local()
+
+
+def configure(region_name=None, profile_name=None, **config):
+    """Set the session and client settings, and drop any existing clients.
+
+    ``config`` entries override ``DEFAULT_CONFIG`` and are passed to
+    ``botocore.config.Config``.
+    """
+    with _lock:
+        session = {}
+        if region_name:
+            session['region_name'] = region_name
+        if profile_name:
+            session['profile_name'] = profile_name
+        _settings['session'] = session
+        _settings['config'] = dict(DEFAULT_CONFIG, **config)
+    reset()
+
+
+def reset():
+    """Drop the shared session and clients; they are rebuilt on next use."""
+    global _thread_local
+    _shared.clear()
+    _thread_local = threading.local()
+
+
+def _after_fork():
+    global _lock
+    # another thread of the parent may have held the lock at the fork
+    _lock = threading.Lock()
+    reset()
+
+
+if hasattr(os, 'register_at_fork'):
+    # never reuse the parent's connections in a forked worker
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+def _local():
+    # the process-wide local engine, when TRIPS_BACKEND=local
+    if os.environ.get('TRIPS_BACKEND') != 'local':
+        return None
+    dynamodb = _shared.get('local')
+    if dynamodb is None:
+        with _lock:
+            dynamodb = _shared.get('local')
+            if dynamodb is None:
+                from trips.local import LocalDynamoDB, load_json
+
+                dynamodb = LocalDynamoDB()
+                if os.environ.get('TRIPS_LOCAL_DATA'):
+                    dynamodb.Table(TABLE_NAME).load(
+                        load_json(os.environ['TRIPS_LOCAL_DATA']))
+                _shared['local'] = dynamodb
+    return dynamodb
+
+
+def get_session():
+    """Return the process-wide boto3 session."""
+    session = _shared.get('session')
+    if session is None:
+        with _lock:
+            session = _shared.get('session')
+            if session is None:
+                import boto3
+
+                session = boto3.session.Session(**_settings['session'])
+                _shared['session'] = session
+    return session
+
+
+def _config():
+    from botocore.config import Config
+
+    return Config(**_settings['config'])
+
+
+def get_client():
+    """Return the process-wide DynamoDB service client."""
+    local = _local()
+    if local is not None:
+        return local.client
+    client = _shared.get('client')
+    if client is None:
+        session = get_session()
+        with _lock:
+            client = _shared.get('client')
+            if client is None:
+                client = session.client('dynamodb', config=_config())
+                _shared['client'] = client
+    return client
+
+
+def get_resource():
+    """Return the DynamoDB resource client of the calling thread."""
+    local = _local()
+    if local is not None:
+        return local
+    resource = getattr(_thread_local, 'resource', None)
+    if resource is None:
+        session = get_session()
+        # creating clients from one session is not thread safe
+        with _lock:
+            resource = session.resource('dynamodb', config=_config())
+        _thread_local.resource = resource
+    return resource
+
+
+def get_table(table_name=TABLE_NAME):
+    """Return a table object from the calling thread's resource client."""
+    return get_resource().Table(table_name)
+
+
+def warm_up_thread(table_name=TABLE_NAME):
+    """Open a connection on the calling thread's resource client.
+
+    A resource client is only used by its own thread, one call at a time,
+    so one connection is all it needs. Returns the table description.
+    """
+    client = get_table(table_name).meta.client
+    return client.describe_table(TableName=table_name)['Table']
+
+
+def warm_up(connections=None, table_name=TABLE_NAME):
+    """Open pooled connections before traffic arrives.
+
+    Sends ``connections`` concurrent DescribeTable calls on the shared
+    client (by default one per pooled connection), so each one sets up a
+    connection that later calls reuse, then warms the calling thread's
+    resource client, which ``get_table`` and the example scripts use.
+    Returns the table description.
+    """
+    client = get_client()
+    connections = connections or _settings['config']['max_pool_connections']
+    with ThreadPoolExecutor(max_workers=connections) as executor:
+        futures = [executor.submit(client.describe_table, TableName=table_name)
+                   for _ in range(connections)]
+        for future in futures:
+            future.result()
+    return warm_up_thread(table_name)
@@ -0,0 +1,81 @@
+"""Put and update helpers that tell interested parties about each change.
+
+Other helpers (the location index, caches, ...) keep derived data in step
+with the trips table. Rather than every script remembering to update each of
+them, the write helpers take a list of *listeners*: objects with a
+``trip_changed(old_trip, new_trip)`` method, called after every successful
+write with the item as it was before (``None`` if it did not exist) and as
+it is now.
+
+Every write also stamps the trip with ``updated_at`` (an ISO 8601 UTC time,
+to the millisecond) and ``updated_day`` (its date), so copies of the table
+can pick up what changed since they last looked (see ``trips.replica``).
+"""
+
+from datetime import datetime, timezone
+
+# attributes stamped on every write
+UPDATED_AT = 'updated_at'
+UPDATED_DAY = 'updated_day'
+
+
+def write_stamp(now=None):
+    """Return the ``updated_at`` and ``updated_day`` attributes for a write."""
+    now = now or datetime.now(timezone.utc)
+    updated_at = now.strftime('%Y-%m-%dT%H:%M:%S.') + f'{now.microsecond // 1000:03d}Z'
+    return {UPDATED_AT: updated_at, UPDATED_DAY: updated_at[:10]}
+
+
+def _notify(listeners, old_trip, new_trip):
+    for listener in listeners:
+        listener.trip_changed(old_trip, new_trip)
+
+
+def put_trip(table, trip, listeners=()):
+    """Insert or fully replace ``trip`` and notify ``listeners``.
+
+    Returns the put_item response.
+    """
+    trip = dict(trip, **write_stamp())
+    db_resp = table.put_item(Item=trip, ReturnValues='ALL_OLD')
+    _notify(listeners, db_resp.get('Attributes'), trip)
+    return db_resp
+
+
+def update_expression(updates):
+    """Build SET update_item arguments for a dict of attribute values.
+
+    Attribute names go through ExpressionAttributeNames placeholders, so
+    reserved words like ``location`` or ``date`` are safe to use.
+    """
+    names = {}
+    values = {}
+    actions = []
+    for i, (attribute, value) in enumerate(updates.items()):
+        names[f'#a{i}'] = attribute
+        values[f':v{i}'] = value
+        actions.append(f'#a{i} = :v{i}')
+    return {
+        'UpdateExpression': 'SET ' + ', '.join(actions),
+        'ExpressionAttributeNames': names,
+        'ExpressionAttributeValues': values,
+    }
+
+
+def update_trip(table, user_id, trip_id, updates, listeners=()):
+    """Set the attributes in ``updates`` on a trip and notify ``listeners``.
+
+    The trip is created if it does not exist yet, as update_item does.
+    Returns the update_item response.
+    """
+    key = {'user_id': user_id, 'trip_id': trip_id}
+    updates = dict(updates, **write_stamp())
+    db_resp = table.update_item(
+        Key=key,
+        ReturnValues='ALL_OLD',
+        **update_expression(updates)
+    )
+    old_trip = db_resp.get('Attributes')
+    new_trip = dict(old_trip or key, **updates)
+    _notify(listeners, old_trip, new_trip)
+    return db_resp
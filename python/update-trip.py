@@ -20,6 +20,22 @@ from boto3.dynamodb.conditions import Key
 import json
 
 
+# In[ ]:
+
+
+# import the shared trips helpers, which live in the python folder
+import sys
+sys.path.append('../python')
+
+from trips.cache import TripCache, UserTripsCache
+from trips.coalesce import UpdateCoalescer
+from trips.codec import CompressedTable, compression_report
+from trips.itinerary import patch_itinerary
+from trips.location_index import LocationIndex
+from trips.session import get_resource
+from trips.writes import update_trip
+
+
 # # 2) Create DynamoDB client object
 # The Python SDK supports two clients:
 # - The low level DynamoDB **service client**
@@ -27,11 +43,14 @@ import json
 # 
 # **For this example I'll be using the resource client**, which makes for simpler looking calls.
 
+# ### Use the shared client factory
+# Creating a client resolves credentials and endpoints, and every new client opens new connections to DynamoDB. The ***get_resource*** and ***get_client*** helpers create the clients **once per process** (the resource client once per thread, as it is not thread safe), with a larger **connection pool**, **keep-alive** and explicit **timeouts**, so later calls reuse warm connections.
+
 # In[ ]:
 
 
-# Creating the DynamoDB Client
-ddb = boto3.resource('dynamodb')
+# Creating the DynamoDB resource Client
+ddb = get_resource()
 
 
 # # 3) Use DynamoDB client to perform a query
@@ -50,6 +69,32 @@ except Exception as e:
     print("Error obtaining resource: ", e)
 
 
+# ### Get the location index table
+# Alongside the trips table, we keep a ***location index*** table with one item per location of each trip. It lets us find every trip to a location with a query instead of a full table scan (see *query-trips-by-location*). Writing the trip through the ***update_trip*** helper, with the index as a **listener**, keeps the index in sync with the trips table.
+
+# In[ ]:
+
+
+try:
+    # get a reference to the location index table, and wrap it in the index helper
+    location_index = LocationIndex(ddb.Table('travel_planner_trip_locations'))
+# catch exceptions
+except Exception as e:
+    print("Error obtaining resource: ", e)
+
+
+# ### Create the trip caches
+# Readers can keep recently read trips in an in-memory ***TripCache*** (see *get-trip*), and recently queried trip lists of each user in a ***UserTripsCache*** (see *query-trips*). Passing the caches as listeners to ***update_trip*** refreshes the cached trip, and drops the cached trip list of its user, whenever this process writes a trip, so reads stay correct. In an application, the reads and writes would share the same cache objects.
+
+# In[ ]:
+
+
+# cache of recently read trips
+trip_cache = TripCache(max_size=1024, ttl=300)
+# cache of recently queried trip lists, per user
+user_trips_cache = UserTripsCache(max_items=10000, ttl=60)
+
+
 # ## Update a trip to add an itinerary
 # An **update** operation updates an attribute on an item.
 # 
@@ -109,19 +154,16 @@ itinerary = [
 
 
 try:
-    # Update an item in the table
-    db_resp = trips_table.update_item(
+    # Update an item in the table, and the location index entries if needed
+    db_resp = update_trip(
+        trips_table,
         # Define the primary key of the item to update
-        Key={
-            "user_id": user_id,
-            "trip_id": trip_id
-        },
-        # Define the update expression
-        UpdateExpression="SET itinerary = :itinerary",
-        # Define the expression attribute values
-        ExpressionAttributeValues={
-            ":itinerary": itinerary
-        }
+        user_id,
+        trip_id,
+        # Define the attributes to set; the helper builds the update expression
+        # ("SET #a0 = :v0") and its attribute names and values for us
+        {"itinerary": itinerary},
+        listeners=[location_index, trip_cache, user_trips_cache]
     )
 
 except ClientError as e:
@@ -141,6 +183,120 @@ print("Full response:\n",
       json.dumps(db_resp, indent=4))
 
 
+# ## Add one activity with an itinerary patch
+# Setting ***itinerary*** again sends **the whole list** with every change, even to add a single activity. The ***patch_itinerary*** helper compares the itinerary we last read with the one we want, and only sends the differences:
+# - activities added at the end use ***list_append***
+# - changed fields use ***SET itinerary[i].field***
+# - removed activities use ***REMOVE itinerary[i]***
+# 
+# The update also carries a **condition** on the old values, so if someone else changed the itinerary since we read it, the update fails instead of mixing both edits. We can then read the trip again and retry.
+
+# ### Add an activity to the itinerary we just wrote
+# The patch starts from the trip as we last read it. The cache already holds the trip we just updated, so this costs no read.
+
+# In[ ]:
+
+
+# the trip as it is now
+trip = trip_cache.get_trip(trips_table, user_id, trip_id)
+
+# its itinerary, plus one more activity
+new_itinerary = trip["itinerary"] + [
+    {
+        "date": "2026/10/19",
+        "from_time": "12:00",
+        "to_time": "13:00",
+        "title": "Lunch at Piecasso",
+        "location": "Stowe",
+        "description": "Stop for pizza in Stowe on the way home."
+    }
+]
+
+
+# ### Perform the patch
+
+# In[ ]:
+
+
+try:
+    # only the new activity is sent, with list_append, and nothing comes back
+    patch_itinerary(
+        trips_table,
+        trip,
+        new_itinerary,
+        listeners=[location_index, trip_cache, user_trips_cache]
+    )
+
+    # the listeners got the patched trip
+    trip = trip_cache.get_trip(trips_table, user_id, trip_id)
+    print("Itinerary now has", len(trip["itinerary"]), "activities")
+
+except Exception as e:
+    print("Error on patch: ")
+    print(e)
+
+
+# ## Compress long itineraries
+# DynamoDB charges reads by **4 KB** and writes by **1 KB** of item size, and an item can't grow past **400 KB**. Itineraries with long descriptions quickly make up most of a trip's size. Free text compresses well, so a ***CompressedTable*** stores the ***itinerary*** attribute, descriptions and all, **zlib compressed** in a binary attribute once they grow past 1 KB, and decompresses them again on ***get_item***, ***query*** and ***scan***.
+# 
+# DynamoDB can't look inside a compressed attribute, so conditions and filters on the itinerary's contents only work on trips stored uncompressed, and ***patch_itinerary*** sets a compressed itinerary as a whole instead of patching it.
+
+# ### Estimate the savings
+# The ***compression_report*** helper estimates the item size as DynamoDB bills it, and the read and write capacity units, with and without compression. Here, for a trip with ten times as many activities.
+
+# In[ ]:
+
+
+long_trip = {
+    "user_id": user_id,
+    "trip_id": trip_id,
+    "itinerary": new_itinerary * 10
+}
+
+print("Compression:\n", json.dumps(compression_report(long_trip), indent=4))
+
+
+# ### Read through the compressed table
+# Wrapping the table is all it takes; trips stored uncompressed read back unchanged.
+
+# In[ ]:
+
+
+try:
+    compressed_table = CompressedTable(trips_table)
+
+    db_resp = compressed_table.get_item(Key={"user_id": user_id, "trip_id": trip_id})
+    print("Itinerary has", len(db_resp['Item']['itinerary']), "activities")
+
+except Exception as e:
+    print("Error on get: ")
+    print(e)
+
+
+# ## Coalesce a burst of small edits
+# A planner UI often sends **several small edits** to the same trip within a second or two, like renaming it and changing its dates, and each one would be its own ***update_item*** call. An ***UpdateCoalescer*** collects the updates of each trip for a short **window**, merges them (the latest value of each attribute wins), and writes each trip **once**, with the same ***update_trip*** helper and listeners.
+# 
+# **Durability:** ***update()*** returns **before** anything is written. Until the coalescer flushes, after the window, when too many trips are pending, or on ***flush()*** and ***close()***, the edits only exist in the memory of this process, and are **lost if it crashes**. Writes that must be stored when the call returns should use ***update_trip*** directly.
+
+# In[ ]:
+
+
+try:
+    # collect edits for half a second before writing them
+    with UpdateCoalescer(trips_table, window=0.5,
+                         listeners=[location_index, trip_cache, user_trips_cache]) as coalescer:
+        coalescer.update(user_id, trip_id, {"title": "Fall in Vermont"})
+        coalescer.update(user_id, trip_id, {"end_date": "2026/10/20"})
+        coalescer.update(user_id, trip_id, {"title": "Fall foliage in Vermont"})
+
+    # closing the coalescer wrote the pending edits, in a single update
+    print("Coalescer:", coalescer.stats())
+
+except Exception as e:
+    print("Error on coalesced update: ")
+    print(e)
+
+
 # In[ ]:
 
 